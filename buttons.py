@@ -0,0 +1,187 @@
+import _thread
+from array import array
+
+from hal import ticks_ms, ticks_add, ticks_diff, sleep_ms
+
+
+class buttonInput:
+    def __init__(self, pins: dict, repeating=(), debounceMs: int = 20, repeatDelayMs: int = 500,
+                 repeatIntervalsMs=(200, 100, 50), accelerateEvery: int = 5, pressedLevel: int = 0,
+                 edgesSize: int = 32):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class reads the push buttons using the pin interrupts (rising and falling edges) instead of polling them
+        the interrupt handler only saves the edge (button index, level, time) in a preallocated ring (no allocation),
+        and wakes the loop thread waiting in wait()
+        every button has its own debounce state machine (processed in poll by the loop thread):
+            released  => the first edge to the pressed level fires a press immediately (short presses aren't missed)
+            pressed   => the first edge to the released level releases the button
+            after any change the button's edges are ignored for debounceMs (the contacts bouncing), then the pin level
+            is read again so a change lost during the bouncing (or a dropped edge) is still handled
+        a held repeating button fires again after repeatDelayMs, then every repeatIntervalsMs[n] where n increases
+        every accelerateEvery repeats (ex: 200 ms => 100 ms => 50 ms), so holding the button speeds up
+        the loop sleeps (blocked on a lock) while no button is changing or held, and wakes only on the events or the
+        debounce and repeat deadlines (made with ticks_add and compared with ticks_diff, so they work across the
+        ticks wrap around)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param pins: dict of the input pins by their button names (ex: {'increment': Pin(34, Pin.IN)})
+        :param repeating: tuple of the button names repeating while held
+        :param debounceMs: the time in milli-seconds the edges are ignored after every change
+        :param repeatDelayMs: the time in milli-seconds a button is held before it starts repeating
+        :param repeatIntervalsMs: the repeat intervals in milli-seconds (from the slowest to the fastest)
+        :param accelerateEvery: the number of repeats before moving to the next (faster) interval
+        :param pressedLevel: the pin level of the pressed button (0 for the pull up buttons)
+        :param edgesSize: the max number of edges saved between two polls (the extra edges are dropped)
+        """
+        self.names = list(pins)
+        self.pins = [pins[name] for name in self.names]
+        self.repeating = [name in repeating for name in self.names]
+        self.debounceMs = debounceMs
+        self.repeatDelayMs = repeatDelayMs
+        self.repeatIntervalsMs = repeatIntervalsMs
+        self.accelerateEvery = accelerateEvery
+        self.pressedLevel = pressedLevel
+        count = len(self.names)
+        self.pressed = [False] * count      # used to save the debounced state of every button
+        self.settleAt = [None] * count      # used to save the time the bouncing ends (None => not bouncing)
+        self.repeatAt = [None] * count      # used to save the time of the next repeat (None => not repeating)
+        self.repeats = [0] * count          # used to save the number of repeats of the current hold
+        self.edgeButtons = array('B', bytes(edgesSize))     # the ring of the edges saved by the interrupt handler
+        self.edgeLevels = array('B', bytes(edgesSize))
+        self.edgeTimes = array('l', [0] * edgesSize)
+        self.edgeHead = 0   # used to save the position of the next edge to be written (by the interrupt handler)
+        self.edgeTail = 0   # used to save the position of the next edge to be read (by poll)
+        self.droppedEdges = 0
+        self.ready = _thread.allocate_lock()    # released by the interrupt handler to wake the loop thread
+        self.ready.acquire()
+
+    def attach(self):
+        """
+        registering the interrupt handler of every pin (on the rising and the falling edges)
+        :return: None
+        """
+        for index, pin in enumerate(self.pins):
+            pin.irq(trigger=pin.IRQ_FALLING | pin.IRQ_RISING, handler=self.handler(index))
+
+    def handler(self, index: int):
+        """
+        :param index: the button index
+        :return: the interrupt handler of the button pin
+        """
+        def edgeHandler(pin):
+            self.edge(index, pin.value(), ticks_ms())
+        return edgeHandler
+
+    def edge(self, index: int, level: int, now: int):
+        """
+        saving the edge in the ring (called by the interrupt handler, so it doesn't allocate) and waking the loop
+        :param index: the button index
+        :param level: the pin level after the edge
+        :param now: the edge time in milli-seconds
+        :return: None
+        """
+        head = self.edgeHead
+        following = (head + 1) % len(self.edgeTimes)
+        if following == self.edgeTail:  # the ring is full, the level is read again after the bouncing
+            self.droppedEdges += 1
+        else:
+            self.edgeButtons[head] = index
+            self.edgeLevels[head] = level
+            self.edgeTimes[head] = now
+            self.edgeHead = following
+        self.wake()
+
+    def wake(self):
+        """
+        waking the loop thread waiting in wait() (also used when the active app changes)
+        :return: None
+        """
+        try:
+            self.ready.release()
+        except RuntimeError:  # the loop is already woken up
+            pass
+
+    def poll(self, now: int = None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        running the state machine of every button:
+            handling the saved edges in their order (by their times)
+            reading the pin level of the buttons finished bouncing
+            firing the repeats of the held buttons
+        =--------------------------------------------------------------------------------------------------------------=
+        :param now: the current time in milli-seconds (None => ticks_ms())
+        :return: list of the fired button names in their order (a held button appears once for every repeat)
+        """
+        now = ticks_ms() if now is None else now
+        events = []
+        while self.edgeTail != self.edgeHead:
+            tail = self.edgeTail
+            self.change(self.edgeButtons[tail], self.edgeLevels[tail] == self.pressedLevel, self.edgeTimes[tail],
+                        events)
+            self.edgeTail = (tail + 1) % len(self.edgeTimes)
+        for index in range(len(self.names)):
+            settleAt = self.settleAt[index]
+            if settleAt is not None and ticks_diff(now, settleAt) >= 0:
+                self.settleAt[index] = None
+                self.change(index, self.pins[index].value() == self.pressedLevel, settleAt, events)
+            repeatAt = self.repeatAt[index]
+            while repeatAt is not None and ticks_diff(now, repeatAt) >= 0:
+                events.append(self.names[index])
+                self.repeats[index] += 1
+                step = min(self.repeats[index] // self.accelerateEvery, len(self.repeatIntervalsMs) - 1)
+                repeatAt = ticks_add(repeatAt, self.repeatIntervalsMs[step])
+                self.repeatAt[index] = repeatAt
+        return events
+
+    def change(self, index: int, pressed: bool, now: int, events: list):
+        """
+        moving the button to the pressed or the released state (the edges while bouncing are ignored)
+        :param index: the button index
+        :param pressed: True if the pin is at the pressed level
+        :param now: the change time in milli-seconds
+        :param events: the list the fired button names are appended to
+        :return: None
+        """
+        if self.settleAt[index] is not None and ticks_diff(now, self.settleAt[index]) < 0:
+            return  # bouncing, the level is read again when the bouncing ends
+        if pressed == self.pressed[index]:
+            return
+        self.pressed[index] = pressed
+        self.settleAt[index] = ticks_add(now, self.debounceMs)
+        self.repeats[index] = 0
+        self.repeatAt[index] = None
+        if pressed:
+            events.append(self.names[index])
+            if self.repeating[index]:
+                self.repeatAt[index] = ticks_add(now, self.repeatDelayMs)
+
+    def isPressed(self, name: str):
+        """
+        :param name: the button name
+        :return: True if the button is pressed (debounced)
+        """
+        return self.pressed[self.names.index(name)]
+
+    def deadline(self, now: int):
+        """
+        :param now: the current time in milli-seconds
+        :return: the time in milli-seconds until the next debounce or repeat deadline (None => nothing is waiting)
+        """
+        waits = [ticks_diff(at, now) for at in self.settleAt + self.repeatAt if at is not None]
+        return max(0, min(waits)) if waits else None
+
+    def wait(self):
+        """
+        blocking the loop thread until an edge is saved (or wake() is called), or until the next deadline
+        (sleeping at most debounceMs while waiting for a deadline, so the edges of the other buttons aren't delayed)
+        :return: list of the fired button names (same as poll)
+        """
+        delay = self.deadline(ticks_ms())
+        if delay is None:
+            self.ready.acquire()
+        else:
+            sleep_ms(min(delay, self.debounceMs))
+            self.ready.acquire(0)
+        return self.poll()
@@ -0,0 +1,124 @@
+import _thread
+
+from hal import ticks_us, ticks_diff
+
+
+class displayWriter:
+    def __init__(self, lcd, maxDepth: int = 4, metrics=None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class writes the messages to the lcd from its own thread, so the control loop never waits for the lcd
+        the messages are saved in a bounded coalescing queue, keyed by their screen (ex: counter, door, status):
+            posting to a screen already in the queue replaces its message (coalesced), only the latest is written
+            the screens are written in the order of their last post (the last posted message is shown last)
+            posting a new screen to a full queue drops the oldest screen (dropped)
+        the writer thread sleeps on a lock until a message is posted (no polling, no busy waiting)
+        the metrics (queue depth, posted, coalesced, dropped, written frames, write times) are counted all the time,
+        and every lcd write time is observed by the metrics registry if it's passed (lcd_write_seconds histogram)
+        a failed lcd write (OSError) is counted (failed) without a write time, and the lcd shadow framebuffer is reset
+        so the next message is sent in full (the cells shown after a failed transaction aren't known)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param lcd: the lcd (LCD16X1) written by the writer thread using writeFrame
+        :param maxDepth: the max number of screens waiting in the queue
+        :param metrics: the metrics registry (metrics.metricsRegistry) updated by the writer thread (None => no metrics)
+        """
+        self.lcd = lcd
+        self.maxDepth = maxDepth
+        self.messages = dict()      # used to save the latest message of every waiting screen
+        self.order = []             # used to save the waiting screens in the order of their last post
+        self.lock = _thread.allocate_lock()     # used to guard (messages, order, metrics) between the threads
+        self.ready = _thread.allocate_lock()    # released by post to wake the writer thread
+        self.ready.acquire()
+        self.posted = 0             # the number of posted messages
+        self.coalesced = 0          # the number of messages replaced by a newer message of the same screen
+        self.dropped = 0            # the number of messages dropped because the queue was full
+        self.written = 0            # the number of frames written to the lcd
+        self.failed = 0             # the number of frames failed to be written (OSError)
+        self.maxDepthSeen = 0       # the max queue depth reached
+        self.lastWriteUs = 0        # the time of the last lcd write in micro-seconds
+        self.maxWriteUs = 0         # the max time of an lcd write in micro-seconds
+        self.metricsRegistry = metrics
+        self.writeMetric = metrics.histogram('lcd_write_seconds', 'the time of one lcd frame write (i2c transaction)') \
+            if metrics else None
+
+    def post(self, screen: str, message: str):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function queues the message to be written to the lcd and returns immediately
+        if the screen is waiting then its message is replaced (coalesced) and it's moved to the queue end
+        if the queue is full then the oldest screen is dropped
+        then waking the writer thread
+        =--------------------------------------------------------------------------------------------------------------=
+        :param screen: the screen name of the message
+        :param message: the string to be shown
+        :return: None
+        """
+        with self.lock:
+            self.posted += 1
+            if screen in self.messages:
+                self.coalesced += 1
+                self.order.remove(screen)
+            elif len(self.order) == self.maxDepth:
+                self.dropped += 1
+                del self.messages[self.order.pop(0)]
+            self.messages[screen] = message
+            self.order.append(screen)
+            self.maxDepthSeen = max(self.maxDepthSeen, len(self.order))
+        try:
+            self.ready.release()
+        except RuntimeError:  # the writer is already woken up
+            pass
+
+    def next(self):
+        """
+        :return: the message of the oldest waiting screen (removed from the queue) or None if the queue is empty
+        """
+        with self.lock:
+            if not self.order:
+                return None
+            return self.messages.pop(self.order.pop(0))
+
+    def writePending(self):
+        """
+        writing all the waiting messages to the lcd (in the order of their screens)
+        :return: None
+        """
+        message = self.next()
+        while message is not None:
+            start = ticks_us()
+            try:
+                self.lcd.writeFrame(message)
+            except OSError:  # the lcd is disconnected, the next message may succeed
+                self.lcd.frame[:] = b'\xff' * 16
+                with self.lock:
+                    self.failed += 1
+                message = self.next()
+                continue
+            elapsed = ticks_diff(ticks_us(), start)
+            with self.lock:
+                self.written += 1
+                self.lastWriteUs = elapsed
+                self.maxWriteUs = max(self.maxWriteUs, elapsed)
+            self.metricsRegistry.observe(self.writeMetric, elapsed) if self.metricsRegistry else None
+            message = self.next()
+
+    def run(self):
+        """
+        the writer thread function, sleeping until a message is posted then writing the waiting messages
+        :return: None
+        """
+        while True:
+            self.ready.acquire()
+            self.writePending()
+
+    def metrics(self):
+        """
+        :return: dict of the writer metrics (depth, maxDepth, posted, coalesced, dropped, written, failed,
+                 lastWriteUs, maxWriteUs)
+        """
+        with self.lock:
+            return dict(depth=len(self.order), maxDepth=self.maxDepthSeen, posted=self.posted,
+                        coalesced=self.coalesced, dropped=self.dropped, written=self.written, failed=self.failed,
+                        lastWriteUs=self.lastWriteUs, maxWriteUs=self.maxWriteUs)
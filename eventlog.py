@@ -0,0 +1,226 @@
+import _thread
+from array import array
+
+from hal import time
+
+SOURCES = ('buttons', 'mainApp', 'doorApp', 'sensor')  # the event sources by their codes
+COUNTER_SOURCES = (0, 1)    # the codes of the sources changing the counter (buttons, mainApp)
+OCCUPANCY_SOURCE = 2        # the code of the source changing the clients number (doorApp)
+
+
+class rollingAggregate:
+    def __init__(self, slots: int, period: int):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class saves the aggregates of the events of the last (slots) periods (ex: 60 minutes, 24 hours)
+        every slot has the key (time // period) of its period, when an event comes in a new period its slot is reused
+        (the aggregates of the slot's old period are dropped), so the memory is fixed and every event updates only one
+        slot (no scanning)
+        every slot saves:
+            entries  => the clients entered (the positive doorApp deltas)
+            exits    => the clients left (the negative doorApp deltas)
+            changes  => the counter changes (buttons and mainApp events)
+            peak     => the max clients number in the period
+        =--------------------------------------------------------------------------------------------------------------=
+        :param slots: the number of the saved periods
+        :param period: the period length in seconds
+        """
+        self.period = period
+        self.keys = array('l', [-1] * slots)
+        self.entries = array('H', [0] * slots)
+        self.exits = array('H', [0] * slots)
+        self.changes = array('H', [0] * slots)
+        self.peaks = array('h', [0] * slots)
+
+    def slot(self, now: int, occupancy: int):
+        """
+        :param now: the time in seconds
+        :param occupancy: the clients number before the event (the peak of a new period starts from it)
+        :return: the slot index of the period of the time (reset if it was saved for an older period)
+        """
+        key = now // self.period
+        index = key % len(self.keys)
+        if self.keys[index] != key:
+            self.keys[index] = key
+            self.entries[index] = self.exits[index] = self.changes[index] = 0
+            self.peaks[index] = occupancy
+        return index
+
+    def add(self, now: int, source: int, delta: int, value: int, occupancy: int):
+        index = self.slot(now, occupancy)
+        if source == OCCUPANCY_SOURCE:
+            if delta > 0:
+                self.entries[index] = min(0xFFFF, self.entries[index] + delta)
+            elif delta < 0:
+                self.exits[index] = min(0xFFFF, self.exits[index] - delta)
+            self.peaks[index] = max(self.peaks[index], value)
+        elif source in COUNTER_SOURCES:
+            self.changes[index] = min(0xFFFF, self.changes[index] + 1)
+
+    def peak(self, now: int, occupancy: int):
+        """
+        :return: the peak clients number of the current period (one slot read)
+        """
+        index = (now // self.period) % len(self.keys)
+        return max(self.peaks[index], occupancy) if self.keys[index] == now // self.period else occupancy
+
+    def rows(self, now: int):
+        """
+        :return: generator of (period start time, entries, exits, changes, peak) of the saved periods (oldest first)
+        """
+        key = now // self.period
+        for past in range(len(self.keys) - 1, -1, -1):
+            index = (key - past) % len(self.keys)
+            if self.keys[index] == key - past:
+                yield (key - past) * self.period, self.entries[index], self.exits[index], self.changes[index], \
+                    self.peaks[index]
+
+
+class eventLog:
+    def __init__(self, size: int = 256, minutes: int = 60, hours: int = 24, occupancy: int = 0):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class records the changes of the counter and the clients number in a fixed size ring of events
+        every event is (time in seconds, source code, delta, value after the change) saved in 4 arrays (no objects
+        per event), the oldest event is overwritten when the ring is full
+        every event also updates the per minute and the per hour aggregates (rollingAggregate) incrementally
+        the peak clients number of the current minute or hour (or since boot) is read from the aggregates, so it
+        doesn't scan the events
+        the history is exported by generators of rows (json or csv), so it's streamed in chunks (rowReader)
+        the log starts from the clients number restored at boot (occupancy), it's the peak since boot and the peak of
+        the current minute and hour until the clients number changes
+        =--------------------------------------------------------------------------------------------------------------=
+        :param size: the max number of saved events
+        :param minutes: the number of saved per minute aggregates
+        :param hours: the number of saved per hour aggregates
+        :param occupancy: the clients number when the log is created (restored from the journal)
+        """
+        self.times = array('l', [0] * size)
+        self.sources = array('B', [0] * size)
+        self.deltas = array('h', [0] * size)
+        self.values = array('h', [0] * size)
+        self.total = 0          # used to save the number of recorded events (the next event sequence)
+        self.occupancy = occupancy      # used to save the current clients number
+        self.maxOccupancy = occupancy   # used to save the peak clients number since boot
+        self.minutes = rollingAggregate(minutes, 60)
+        self.hours = rollingAggregate(hours, 3600)
+        if occupancy:   # starting the current periods (their peaks) from the restored clients number
+            now = int(time())
+            self.minutes.slot(now, occupancy)
+            self.hours.slot(now, occupancy)
+        self.lock = _thread.allocate_lock()     # used to guard the recording as both threads record events
+
+    def record(self, source: str, delta: int, value: int, now: int = None):
+        """
+        :param source: the source name (one of SOURCES)
+        :param delta: the change (ex: +1 increment, -1 exit)
+        :param value: the counter or the clients number after the change
+        :param now: the event time in seconds (None => now)
+        :return: None
+        """
+        now = int(time()) if now is None else now
+        code = SOURCES.index(source)
+        with self.lock:
+            index = self.total % len(self.times)
+            self.times[index] = now
+            self.sources[index] = code
+            self.deltas[index] = delta
+            self.values[index] = value
+            self.total += 1
+            self.minutes.add(now, code, delta, value, self.occupancy)
+            self.hours.add(now, code, delta, value, self.occupancy)
+            if code == OCCUPANCY_SOURCE:
+                self.occupancy = value
+                self.maxOccupancy = max(self.maxOccupancy, value)
+
+    def peak(self, period: str = 'hour', now: int = None):
+        """
+        :param period: 'minute' or 'hour' (the current minute or hour), or 'all' (since boot)
+        :param now: the time in seconds (None => now)
+        :return: the peak clients number of the period
+        """
+        if period == 'all':
+            return self.maxOccupancy
+        now = int(time()) if now is None else now
+        return (self.minutes if period == 'minute' else self.hours).peak(now, self.occupancy)
+
+    def events(self, since: int = 0):
+        """
+        :param since: the min event time in seconds
+        :return: generator of (time, source name, delta, value) of the saved events (oldest first)
+        """
+        sequence = max(0, self.total - len(self.times))
+        while sequence < self.total:
+            if sequence < self.total - len(self.times):  # overwritten while streaming, skipping to the oldest event
+                sequence = self.total - len(self.times)
+            index = sequence % len(self.times)
+            sequence += 1
+            if self.times[index] >= since:
+                yield self.times[index], SOURCES[self.sources[index]], self.deltas[index], self.values[index]
+
+    def eventRows(self, format: str = 'json', since: int = 0):
+        """
+        :param format: 'json' or 'csv'
+        :param since: the min event time in seconds
+        :return: generator of the text rows of the events
+        """
+        if format == 'csv':
+            yield 'time,source,delta,value\n'
+            for event in self.events(since):
+                yield '%s,%s,%s,%s\n' % event
+            return
+        separator = '['
+        for event in self.events(since):
+            yield '%s{"time":%s,"source":"%s","delta":%s,"value":%s}' % ((separator,) + event)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+    def statsRows(self, format: str = 'json', period: str = 'minute', now: int = None):
+        """
+        :param format: 'json' or 'csv'
+        :param period: 'minute' or 'hour' aggregates
+        :param now: the time in seconds (None => now)
+        :return: generator of the text rows of the aggregates (and the peaks in json)
+        """
+        now = int(time()) if now is None else now
+        aggregate = self.minutes if period == 'minute' else self.hours
+        if format == 'csv':
+            yield 'start,entries,exits,changes,peak\n'
+            for row in aggregate.rows(now):
+                yield '%s,%s,%s,%s,%s\n' % row
+            return
+        yield '{"occupancy":%s,"peakMinute":%s,"peakHour":%s,"peakAll":%s,"period":"%s","rows":[' \
+            % (self.occupancy, self.peak('minute', now), self.peak('hour', now), self.maxOccupancy, period)
+        separator = ''
+        for row in aggregate.rows(now):
+            yield '%s{"start":%s,"entries":%s,"exits":%s,"changes":%s,"peak":%s}' % ((separator,) + row)
+            separator = ','
+        yield ']}'
+
+
+class rowReader:
+    def __init__(self, rows):
+        """
+        file like reader of a rows generator, so the rows are streamed by the server (clientConnection.sendstream)
+        and formatted only when the output buffer is empty (the full text is never built)
+        :param rows: generator of the text rows
+        """
+        self.rows = rows
+
+    def read(self, size: int = 512):
+        """
+        :return: the encoded next rows (about size bytes, at least one row), b'' at the end
+        """
+        chunk = []
+        length = 0
+        for row in self.rows:
+            chunk.append(row)
+            length += len(row)
+            if length >= size:
+                break
+        return ''.join(chunk).encode()
+
+    def close(self):
+        self.rows = iter(())
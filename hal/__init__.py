@@ -0,0 +1,20 @@
+# the hardware abstraction layer, the firmware imports the hardware from here (not from machine, network)
+#   mcu => the micropython backend (machine.Pin, machine.I2C, network.WLAN access point)
+#   sim => the CPython backend (simulated pins driven by scripts, recording i2c bus, virtual ultrasonics,
+#          loopback network), used to run and benchmark the firmware on a development machine (python -m hal)
+# the time functions and the modules named differently on micropython (utime, ustruct, uselect, ...) are imported
+# from here too, so the firmware modules don't repeat the micropython / CPython fallbacks
+# the backend is chosen by the running implementation (not by a failing import), so a broken or missing module of
+# the mcu firmware raises its ImportError instead of starting the simulation on the board
+import sys
+
+if sys.implementation.name == 'micropython':
+    from hal.mcu import Pin, I2C, Timer, schedule, AUTH_WPA2_PSK, startAccessPoint, uniqueId
+    from hal.mcu import sleep_ms, sleep_us, ticks_ms, ticks_us, ticks_add, ticks_diff, time
+    from hal.mcu import ustruct, uselect, usocket, uerrno, crc32, b2a_base64, sha1
+    BACKEND = 'mcu'
+else:  # running on CPython (development machine)
+    from hal.sim import Pin, I2C, Timer, schedule, AUTH_WPA2_PSK, startAccessPoint, uniqueId
+    from hal.sim import sleep_ms, sleep_us, ticks_ms, ticks_us, ticks_add, ticks_diff, time
+    from hal.sim import ustruct, uselect, usocket, uerrno, crc32, b2a_base64, sha1
+    BACKEND = 'sim'
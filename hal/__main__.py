@@ -0,0 +1,46 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+booting the whole firmware (main.py) on CPython with the simulated hardware (hal.sim):
+    the push buttons are pull up input pins, released until the script presses them
+    the lcd writes to the recording i2c bus
+    every door ultrasonic is a virtual HC-SR04 (the object is away at 100 cm until the script moves it)
+    the web server listens on the loopback interface (the access point isn't created)
+the optional json script (hal.sim.runScript) is played after the boot, ex: [[500, "press", 34, 80],
+[1000, "distance", 18, 10], [3000, "distance", 18, 100]]
+the simulation runs until it's interrupted (ctrl+c), then the bus, the pins and the pings counts are printed
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python -m hal [port] [script.json]
+"""
+import os
+import sys
+from time import sleep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # the firmware opens its pages and journal files from its directory
+
+from hal.sim import Pin, virtualUltrasonic, playScript  # noqa: E402
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    import main  # noqa: E402 (creating the pins, the lcd and the state as on the mcu)
+
+    for trig, echo in main.doorPins:
+        virtualUltrasonic(trig, echo)
+    main.start(port)
+    print('simulation serving on http://127.0.0.1:%s/' % port)
+    if len(sys.argv) > 2:
+        playScript(sys.argv[2])
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        pass
+    if main.lcd:
+        bus = main.lcd.i2CProtocol
+        print('i2c: %d transactions, %d bytes, %.1f ms of bus time'
+              % (bus.transactions, bus.bytes, bus.busTimeUs() / 1000))
+    print('pins: %s' % ', '.join('%s=%s changes' % (number, pin.changes) for number, pin in sorted(Pin.pins.items())))
+    print('ultrasonic pings: %s' % ', '.join('%s=%s' % (trig, sensor.pings)
+                                              for trig, sensor in virtualUltrasonic.sensors.items()))
@@ -0,0 +1,50 @@
+from machine import Pin, I2C, Timer, unique_id
+from micropython import schedule
+from utime import sleep_ms, sleep_us, ticks_ms, ticks_us, ticks_add, ticks_diff, time
+from ubinascii import crc32, b2a_base64
+from uhashlib import sha1
+import ustruct
+import uselect
+import usocket
+import uerrno
+import network
+
+AUTH_WPA2_PSK = network.AUTH_WPA2_PSK
+
+
+def startAccessPoint(essid: str, password: str, authMode=AUTH_WPA2_PSK, maxClients: int = 1,
+                     timeoutMs: int = 5000):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    setting the wifi interface of the mcu to be access point (AP_IF) and activating it
+    waiting until the interface is active, checking every 10 ms and sleeping between the checks (not spinning, so the
+    other threads run meanwhile), at most timeoutMs (the server is started anyway, it's bound to all the interfaces)
+    =------------------------------------------------------------------------------------------------------------------=
+    :param essid:       the access point name
+    :param password:    the access point password
+    :param authMode:    the access point auth mode common auth modes {OPEN, WEP, WPA_WPA2_PSK, WPA2_PSK}
+    :param maxClients:  the max number of clients can be connected to the interface at the same time
+    :param timeoutMs:   the max time in milli-seconds of waiting for the interface
+    :return: the host the server is bound to ('' => all the interfaces)
+    """
+    ap = network.WLAN(network.AP_IF)  # setting the wlan interface to be access point (AP_IF)
+    ap.config(essid=essid,
+              password=password,
+              authmode=authMode,
+              max_clients=maxClients)  # configuring access point parameters (name, password, auth, clients no.)
+    ap.active(True)  # activating the wireless interface of esp32
+
+    waited = 0
+    while not ap.active() and waited < timeoutMs:  # waiting until the access point starts
+        sleep_ms(10)
+        waited += 10
+    return ''
+
+
+def uniqueId():
+    """
+    :return: the node id of the unit (1 ... 65535, the last 2 bytes of the mcu unique id, used by the peer sync)
+    """
+    chip = unique_id()
+    return ((chip[-2] << 8) | chip[-1]) or 1
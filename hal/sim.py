@@ -0,0 +1,261 @@
+import _thread
+import json
+import os
+import struct as ustruct
+import select as uselect
+import socket as usocket
+import errno as uerrno
+from binascii import crc32, b2a_base64
+from hashlib import sha1
+from time import monotonic, sleep, time
+
+AUTH_WPA2_PSK = 3
+US_PER_CM = 2 * 10 ** 6 / (340 * 100)  # the sound moves the distance twice (back and forth)
+ECHO_DELAY_US = 450     # the time from the trigger pulse end to the echo rising edge (the sensor sending its burst)
+
+
+def sleep_ms(duration):
+    sleep(duration / 1000)
+
+
+def sleep_us(duration):
+    sleep(duration / 1000000)
+
+
+def ticks_ms():
+    return int(monotonic() * 1000)
+
+
+def ticks_us():
+    return int(monotonic() * 1000000)
+
+
+def ticks_add(ticks, delta):
+    """
+    the CPython ticks don't wrap around (unlike utime ticks), so adding to them is the addition
+    """
+    return ticks + delta
+
+
+def ticks_diff(new, old):
+    """
+    the CPython ticks don't wrap around (unlike utime ticks), so their difference is the subtraction
+    """
+    return new - old
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+    pins = dict()       # used to save the created pins by their numbers (the scripts drive them by number)
+    wiring = dict()     # used to save the functions called when the firmware sets an output pin (by pin number)
+
+    def __init__(self, number: int, mode: int = -1, pull: int = -1, value: int = None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        simulated gpio pin with the machine.Pin interface used by the firmware (value, irq)
+        an input pin is driven from outside (drive), by a script (playScript) or a virtual device (virtualUltrasonic),
+        its interrupt handler is called on the matching edges (in the driving thread, as the irq interrupts the mcu)
+        an output pin set by the firmware calls its wired function (Pin.wiring, ex: the trigger of the ultrasonic)
+        the pull up input reads 1 until it's driven (a released push button)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param number: the gpio number
+        :param mode: Pin.IN or Pin.OUT
+        :param pull: Pin.PULL_UP or Pin.PULL_DOWN
+        :param value: the initial level
+        """
+        self.number = number
+        self.mode = mode
+        self.level = value if value is not None else int(pull == Pin.PULL_UP)
+        self.trigger = 0        # used to save the irq edges (IRQ_RISING | IRQ_FALLING)
+        self.handler = None     # used to save the irq handler
+        self.changes = 0        # the number of level changes
+        Pin.pins[number] = self
+
+    def value(self, level: int = None):
+        if level is None:
+            return self.level
+        level = 1 if level else 0
+        if level != self.level:
+            self.level = level
+            self.changes += 1
+            wired = Pin.wiring.get(self.number)
+            if wired:
+                wired(self)
+
+    def irq(self, handler=None, trigger: int = IRQ_FALLING | IRQ_RISING, hard: bool = False):
+        self.handler = handler
+        self.trigger = trigger
+
+    def drive(self, level: int):
+        """
+        setting the level of the pin from outside, calling its interrupt handler if the edge matches its trigger
+        :param level: the new level
+        :return: None
+        """
+        level = 1 if level else 0
+        if level == self.level:
+            return
+        self.level = level
+        self.changes += 1
+        if self.handler and self.trigger & (Pin.IRQ_RISING if level else Pin.IRQ_FALLING):
+            self.handler(self)
+
+
+class I2C:
+    def __init__(self, id: int = -1, scl=None, sda=None, freq: int = 400000, size: int = 64):
+        """
+        recording i2c bus, every transaction is counted and the last (size) transactions are saved
+        :param freq: the bus frequency (used to estimate the bus time)
+        :param size: the number of saved transactions
+        """
+        self.freq = freq
+        self.size = size
+        self.transactions = 0   # the number of write transactions
+        self.bytes = 0          # the number of bytes on the bus (with the address byte of every transaction)
+        self.log = []           # used to save the last (address, data) transactions
+
+    def writeto(self, address: int, data, stop: bool = True):
+        self.transactions += 1
+        self.bytes += len(data) + 1
+        self.log.append((address, bytes(data)))
+        if len(self.log) > self.size:
+            self.log.pop(0)
+        return len(data)
+
+    def scan(self):
+        return [0x27]
+
+    def busTimeUs(self):
+        return self.bytes * 9 * 10 ** 6 / self.freq  # 8 bits + ack for every byte
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id: int = -1):
+        """
+        simulated machine.Timer (one shot only), the callback is called by a thread after the period (as the soft timer
+        callback runs out of the interrupted code)
+        """
+        self.started = 0    # used to save the number of the started periods (deinit and init cancel the last one)
+
+    def init(self, mode: int = ONE_SHOT, period: int = 0, callback=None):
+        self.started += 1
+        _thread.start_new_thread(self.fire, (self.started, period, callback))
+
+    def fire(self, started: int, period: int, callback):
+        sleep(period / 1000)
+        if started == self.started:
+            callback(self)
+
+    def deinit(self):
+        self.started += 1
+
+
+def schedule(function, argument):
+    """
+    micropython.schedule, the function is called at once (the simulated interrupt handlers run in the driving thread)
+    """
+    function(argument)
+
+
+class virtualUltrasonic:
+    sensors = dict()    # used to save the virtual sensors by their trigger pin number
+
+    def __init__(self, trig: int, echo: int, distance: float = 100, maxCm: float = 400):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        virtual HC-SR04 wired to the trigger and echo pins (created before or after the firmware creates the pins)
+        the trigger pulse end (falling edge) starts a thread driving the echo pin high after ECHO_DELAY_US and low
+        after the time the sound takes to the object at (distance) and back, no echo if the object is over maxCm
+        =--------------------------------------------------------------------------------------------------------------=
+        :param trig: the trigger pin number
+        :param echo: the echo pin number
+        :param distance: the object distance in cm (changed by the scripts)
+        :param maxCm: the max distance with an echo
+        """
+        self.echo = echo
+        self.distance = distance
+        self.maxCm = maxCm
+        self.pings = 0      # the number of the received pings
+        Pin.wiring[trig] = self.triggered
+        virtualUltrasonic.sensors[trig] = self
+
+    def triggered(self, pin: Pin):
+        if pin.level or self.distance > self.maxCm:
+            return
+        self.pings += 1
+        _thread.start_new_thread(self.echoPulse, (Pin.pins[self.echo], int(self.distance * US_PER_CM)))
+
+    @staticmethod
+    def echoPulse(echo: Pin, durationUs: int):
+        sleep(ECHO_DELAY_US / 10 ** 6)
+        echo.drive(1)
+        sleep(durationUs / 10 ** 6)
+        echo.drive(0)
+
+
+def startAccessPoint(essid: str, password: str, authMode=AUTH_WPA2_PSK, maxClients: int = 1,
+                     timeoutMs: int = 5000):
+    """
+    the loopback network in place of the access point (nothing to start)
+    :return: the host the server is bound to (the loopback interface)
+    """
+    return '127.0.0.1'
+
+
+def uniqueId():
+    """
+    :return: the node id of the simulated unit (1 ... 65535, from the process id, so every process is one node)
+    """
+    return os.getpid() % 65535 + 1
+
+
+def runScript(steps):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    playing the scripted inputs at their times (milli-seconds from the script start), every step is a list:
+        [time, 'pin', number, level]        => driving the input pin to the level
+        [time, 'press', number, holdMs]     => pressing the push button (pull up input) for holdMs (the next steps
+                                               wait for its release)
+        [time, 'distance', trig, cm]        => moving the object of the virtual ultrasonic (by its trigger pin)
+    =------------------------------------------------------------------------------------------------------------------=
+    :param steps: list of the steps (sorted or not)
+    :return: None
+    """
+    steps = sorted(steps, key=lambda step: step[0])
+    started = monotonic()
+    for step in steps:
+        delay = step[0] / 1000 - (monotonic() - started)
+        if delay > 0:
+            sleep(delay)
+        kind = step[1]
+        if kind == 'pin':
+            Pin.pins[step[2]].drive(step[3])
+        elif kind == 'press':
+            Pin.pins[step[2]].drive(0)
+            sleep(step[3] / 1000)
+            Pin.pins[step[2]].drive(1)
+        elif kind == 'distance':
+            virtualUltrasonic.sensors[step[2]].distance = step[3]
+
+
+def playScript(path: str):
+    """
+    playing the json script file (runScript) in its own thread
+    :param path: the script file path
+    :return: None
+    """
+    with open(path) as reader:
+        steps = json.load(reader)
+    _thread.start_new_thread(runScript, (steps,))
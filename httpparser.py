@@ -0,0 +1,290 @@
+HEADER_END = b'\r\n\r\n'
+LINE_END = b'\r\n'
+HEX_DIGITS = b'0123456789abcdefABCDEF'
+# the decoded methods and versions of the request line (a method not in METHODS is checked and decoded)
+METHODS = dict((method, method.decode()) for method in (b'GET', b'POST', b'HEAD', b'PUT', b'DELETE', b'OPTIONS'))
+VERSIONS = {b'HTTP/1.0': 'HTTP/1.0', b'HTTP/1.1': 'HTTP/1.1'}
+HEADER_KEYS = dict()    # used to save the searched keys ('\r\n' + lower case name + ':') by the header names
+
+
+class parseError(ValueError):
+    def __init__(self, statusCode: int, statusMsg: str):
+        """
+        raised by the parser for a request that can't (or mustn't) be parsed, the server answers it with the status
+        :param statusCode: the http status code (400 bad request, 413 payload too large, 431 headers too large, ...)
+        :param statusMsg: the http status msg
+        """
+        super().__init__(statusCode, statusMsg)
+        self.statusCode = statusCode
+        self.statusMsg = statusMsg
+
+
+class requestHeaders:
+    def __init__(self, head: bytes = b'', lineEnd: int = -1):
+        """
+        the headers of one request, they are kept as the bytes of the request line and the headers (copied out of the
+        buffer once, as it's reused by the next request), a header is searched (in a lower cased copy made at the
+        first search) and decoded only when it's asked for, so the headers nobody reads cost nothing
+        a repeated header has the value of its last line
+        :param head: the request line and the headers (without the header end)
+        :param lineEnd: the position of the request line end (-1 => no headers)
+        """
+        self.head = head
+        self.lineEnd = lineEnd
+        self.lowered = None     # used to save the lower cased head (made at the first search)
+
+    def raw(self, name: str):
+        """
+        :param name: the lower case header name
+        :return: the raw value (bytes, not stripped) or None if the request doesn't have the header
+        """
+        if self.lineEnd < 0:
+            return None
+        if self.lowered is None:
+            self.lowered = self.head.lower()
+        key = HEADER_KEYS.get(name)
+        if key is None:
+            key = HEADER_KEYS[name] = LINE_END + name.encode() + b':'
+        start = self.lowered.rfind(key, self.lineEnd)
+        if start < 0:
+            return None
+        start += len(key)
+        end = self.head.find(LINE_END, start)
+        return self.head[start:] if end < 0 else self.head[start:end]
+
+    def get(self, name: str, default=None):
+        """
+        :param name: the lower case header name
+        :return: the stripped header value, default if the request doesn't have it
+        """
+        value = self.raw(name)
+        return default if value is None else value.decode('utf-8', 'ignore').strip()
+
+
+class httpRequest:
+    def __init__(self, method: str, path: str, query: str, version: str, headers: requestHeaders, body: bytes):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class saves one parsed request
+        the path and the query are split and url-decoded (the path is not lower cased or stripped)
+        the get data (query) and the post data (form body) are decoded only when they are asked for
+        =--------------------------------------------------------------------------------------------------------------=
+        :param method: the request type (GET, POST, HEAD, ...etc)
+        :param path: the requested path without the query string (ex: /mainApp/currentNumber)
+        :param query: the query string without '?' (ex: wait=12)
+        :param version: the http version (HTTP/1.0, HTTP/1.1)
+        :param headers: the used headers (requestHeaders, get(lower case name) => stripped value)
+        :param body: the request body (Content-Length bytes)
+        """
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def getData(self):
+        """
+        :return: dict of the url-decoded get data (ex: /?cmd=inc => {'cmd': 'inc'})
+        """
+        return parseForm(self.query.encode()) if self.query else {}
+
+    def postData(self):
+        """
+        :return: dict of the url-decoded form data sent in the body of post request
+        """
+        return parseForm(self.body) if self.method == 'POST' and self.body else {}
+
+
+class requestParser:
+    def __init__(self, bufferSize: int = 2048, maxBodySize: int = 512, maxHeaders: int = 32):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class is an incremental http request parser working on a fixed size bytearray (one per connection)
+        the socket receives directly into the free part of the buffer (recv_into/readinto), so nothing is appended
+        or decoded as a whole, the parser keeps the position it scanned to, so every received part is scanned once
+        the request line and the headers are copied out of the buffer once (one bytes object) and the request keeps
+        it (requestHeaders), so no header line is sliced or decoded by a python loop, only the colon of every line is
+        checked, and a header is searched only when it's asked for (the server reads 2 to 4 headers of a request)
+        the empty lines (CRLF) before the request line are skipped (RFC 9112 section 2.2, some clients send one after
+        a post body)
+        the request can arrive in any number of parts (the body may arrive after the headers in another segment), the
+        request line and the headers are parsed once (when their end is found) and kept while the body is received
+        the limits are enforced while parsing:
+            the headers must fit in the buffer => 431 request header fields too large
+            the body must be <= maxBodySize and fit in the buffer with the headers => 413 payload too large
+            the number of headers must be <= maxHeaders => 431 request header fields too large
+            a broken request line or header => 400 bad request
+            a chunked body => 411 length required (only Content-Length bodies are supported)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param bufferSize: the buffer size in bytes (the max size of the headers + body)
+        :param maxBodySize: the max size of the body in bytes
+        :param maxHeaders: the max number of headers
+        """
+        self.buffer = bytearray(bufferSize)     # used to save the received bytes
+        self.view = memoryview(self.buffer)     # used to receive into the free part of the buffer without copying
+        self.maxBodySize = maxBodySize
+        self.maxHeaders = maxHeaders
+        self.filled = 0     # used to save the number of received bytes in the buffer
+        self.scanned = 0    # used to save the position the header end was searched to
+        self.pending = None     # used to save the parsed request line, headers, body start and length while the body
+                                # is received (None => the headers of the current request aren't parsed yet)
+
+    def free(self):
+        """
+        :return: memoryview of the free part of the buffer to receive into
+        """
+        return self.view[self.filled:]
+
+    def received(self, count: int):
+        self.filled += count
+
+    def parse(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        searching for the end of headers from the last scanned position (not from the buffer start every time)
+        if the headers are complete then parsing the request line and the headers (once, they're kept in pending)
+        then checking if the body (Content-Length) is complete
+        if the request is complete it's removed from the buffer (the pipelined bytes after it are moved to the start)
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: httpRequest if a full request is received else None
+        """
+        if self.pending is None:
+            if self.filled and self.buffer[0] == 0x0D:  # the empty lines before the request line are skipped
+                start = 0
+                while start + 2 <= self.filled and self.buffer[start:start + 2] == LINE_END:
+                    start += 2
+                if start:
+                    self.consume(start)
+                    return self.parse()
+            headerEnd = self.buffer.find(HEADER_END, max(0, self.scanned - 3), self.filled)
+            if headerEnd < 0:
+                self.scanned = self.filled
+                if self.filled == len(self.buffer):
+                    raise parseError(431, 'Request Header Fields Too Large')
+                return None
+            self.scanned = headerEnd
+
+            head = bytes(self.view[:headerEnd])
+            lineEnd = head.find(LINE_END)
+            method, path, query, version = parseRequestLine(head if lineEnd < 0 else head[:lineEnd])
+            headers = self.parseHeaders(head, lineEnd)
+
+            if b'chunked' in (headers.raw('transfer-encoding') or b''):
+                raise parseError(411, 'Length Required')
+            length = headers.raw('content-length')
+            if length is None:
+                length = 0
+            elif length.strip().isdigit():
+                length = int(length)
+            else:
+                raise parseError(400, 'Bad Request')
+            bodyStart = headerEnd + 4
+            if length > self.maxBodySize or bodyStart + length > len(self.buffer):
+                raise parseError(413, 'Payload Too Large')
+            self.pending = (method, path, query, version, headers, bodyStart, length)
+
+        method, path, query, version, headers, bodyStart, length = self.pending
+        if self.filled < bodyStart + length:
+            return None
+
+        body = bytes(self.view[bodyStart:bodyStart + length]) if length else b''
+        self.consume(bodyStart + length)
+        return httpRequest(method, path, query, version, headers, body)
+
+    def parseHeaders(self, head: bytes, lineEnd: int):
+        """
+        checking the header lines (every line has a name before its colon, and their number is <= maxHeaders)
+        :param head: the request line and the headers (without the header end)
+        :param lineEnd: the position of the request line end (-1 => no headers)
+        :return: requestHeaders of the request (searched and decoded when they are asked for)
+        """
+        if lineEnd >= 0:
+            lines = head[lineEnd + 2:].split(LINE_END)
+            if len(lines) > self.maxHeaders:
+                raise parseError(431, 'Request Header Fields Too Large')
+            for line in lines:
+                if line.find(b':') < 1:
+                    raise parseError(400, 'Bad Request')
+        return requestHeaders(head, lineEnd)
+
+    def consume(self, end: int):
+        """
+        removing the parsed request from the buffer, the remaining (pipelined) bytes are moved to the start
+        :param end: the position after the parsed request
+        :return: None
+        """
+        remaining = self.filled - end
+        if remaining:
+            self.buffer[:remaining] = self.buffer[end:self.filled]
+        self.filled = remaining
+        self.scanned = 0
+        self.pending = None
+
+    def reset(self):
+        self.filled = 0
+        self.scanned = 0
+        self.pending = None
+
+
+def parseRequestLine(line: bytes):
+    """
+    :param line: the request line (ex: GET /mainApp/currentNumber?wait=12 HTTP/1.1)
+    :return: (method, path, query, version) the path and the query are url-decoded
+    """
+    parts = line.split(b' ')
+    if len(parts) != 3:
+        raise parseError(400, 'Bad Request')
+    method = METHODS.get(parts[0])
+    if method is None and parts[0].isalpha() and parts[0].isupper():
+        method = parts[0].decode()
+    version = VERSIONS.get(parts[2])
+    if method is None or version is None or not parts[1].startswith(b'/'):
+        raise parseError(400, 'Bad Request')
+    path, _, query = parts[1].partition(b'?')
+    path = unquote(path) if b'%' in path else path.decode('utf-8', 'ignore')
+    return method, path, query.decode('utf-8', 'ignore') if query else '', version
+
+
+def parseForm(data: bytes):
+    """
+    :param data: the url-encoded form (ex: choice=increment&number=5)
+    :return: dict of the url-decoded names and values (a name without '=' has empty value)
+    """
+    form = dict()
+    if b'%' not in data and b'+' not in data:  # nothing to unquote, the form is decoded once
+        for field in data.decode('utf-8', 'ignore').split('&'):
+            if field:
+                name, _, value = field.partition('=')
+                form[name] = value
+        return form
+    for field in data.split(b'&'):
+        if field:
+            name, _, value = field.partition(b'=')
+            form[unquote(name, True)] = unquote(value, True)
+    return form
+
+
+def unquote(data: bytes, plusSpace: bool = False):
+    """
+    :param data: the url-encoded bytes (%XX escapes, and '+' as space in forms)
+    :param plusSpace: True to decode '+' as space (form encoding)
+    :return: the decoded str
+    """
+    if b'%' not in data and not (plusSpace and b'+' in data):
+        return data.decode('utf-8', 'ignore')
+    result = bytearray()
+    index = 0
+    while index < len(data):
+        char = data[index]
+        if char == 0x25 and index + 2 < len(data) and HEX_DIGITS.find(data[index + 1:index + 2]) >= 0 \
+                and HEX_DIGITS.find(data[index + 2:index + 3]) >= 0:  # '%XX' escape
+            result.append(int(data[index + 1:index + 3], 16))
+            index += 3
+            continue
+        result.append(0x20 if plusSpace and char == 0x2B else char)
+        index += 1
+    return bytes(result).decode('utf-8', 'ignore')
@@ -0,0 +1,175 @@
+from hal import ustruct as struct, crc32, sleep_ms
+
+RECORD_MAGIC = 0xA5
+INT32_RANGE = (-2 ** 31, 2 ** 31 - 1)  # the range of a saved field (int32)
+
+
+class stateJournal:
+    def __init__(self, fields, prefix: str = 'journal', files: int = 4, recordsPerFile: int = 128,
+                 delayMs: int = 2000, bounds: dict = None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class saves the state fields to the flash in an append-only journal, so they survive the reboots
+        every record is fixed size and holds all the fields (a full snapshot, so only the last valid record matters):
+            magic (1 byte) + padding (3 bytes) + sequence (uint32) + fields (int32 each) + crc32 of the previous bytes
+        the records are appended to the current file, when it's full the journal moves to the next file (rotating over
+        the files, so the writes are spread on them) and the next file is started again (truncated), that's the
+        compaction, the old records are dropped as the last record has the full state
+        restoring reads only the last records of every file (backwards until a valid one), a record torn by a power
+        cut fails its crc and is skipped, so the state is the last fully written record
+        the writer thread (run) waits for a state change, then waits delayMs more collecting the changes (button
+        presses) and writes only one record of the latest state, so the flash isn't written on every press
+        every field is clamped to its bounds (the range the app accepts, else int32) when it's written and restored,
+        so an out of range value can't fail the packing or come back at every boot, and a failed write is counted
+        (errors) without stopping the writer thread, the file of a failed write is closed and the next record starts
+        the next file, so no record is appended after the torn bytes, and the file holding the last record is skipped
+        when starting the next file, so failing writes in a row can't truncate the only valid record
+        =--------------------------------------------------------------------------------------------------------------=
+        :param fields: tuple of the saved field names (int values)
+        :param prefix: the file names prefix (the files are prefix0.bin, prefix1.bin, ...)
+        :param files: the number of the rotated files
+        :param recordsPerFile: the number of records in one file before moving to the next file
+        :param delayMs: the time in milli-seconds the changes are collected before writing one record
+        :param bounds: dict of the (min, max) of the fields (the missing fields are bounded to int32)
+        """
+        self.fields = fields
+        self.names = ['%s%s.bin' % (prefix, index) for index in range(files)]
+        self.recordsPerFile = recordsPerFile
+        self.delayMs = delayMs
+        self.bounds = dict((name, (bounds or {}).get(name, INT32_RANGE)) for name in fields)
+        self.format = '<BxxxI%di' % len(fields)
+        self.recordSize = struct.calcsize(self.format) + 4  # + the crc32
+        self.current = 0        # used to save the index of the file records are appended to
+        self.count = 0          # used to save the number of records in the current file
+        self.sequence = 0       # used to save the sequence of the last written record
+        self.writer = None      # used to save the opened current file
+        self.saved = None       # used to save the values of the last record (the same values aren't written again)
+        self.savedFile = None   # used to save the index of the file holding the last record (never truncated)
+        self.records = 0        # the number of written records
+        self.bytes = 0          # the number of written bytes
+        self.rotations = 0      # the number of started files
+        self.errors = 0         # the number of failed writes
+
+    def pack(self, sequence: int, values: dict):
+        """
+        :return: the record bytes of the values
+        """
+        record = struct.pack(self.format, RECORD_MAGIC, sequence, *[values[name] for name in self.fields])
+        return record + struct.pack('<I', crc32(record) & 0xFFFFFFFF)
+
+    def unpack(self, record: bytes):
+        """
+        :return: (sequence, dict of the values) or None if the record is not valid (torn or empty)
+        """
+        if len(record) != self.recordSize or record[0] != RECORD_MAGIC or \
+                struct.unpack('<I', record[-4:])[0] != crc32(record[:-4]) & 0xFFFFFFFF:
+            return None
+        fields = struct.unpack(self.format, record[:-4])
+        return fields[1], self.clamp(dict(zip(self.fields, fields[2:])))
+
+    def clamp(self, values: dict):
+        """
+        :param values: dict of the field values (the other keys are ignored)
+        :return: dict of the field values clamped to their bounds
+        """
+        return dict((name, min(max(values[name], self.bounds[name][0]), self.bounds[name][1])) for name in self.fields)
+
+    def lastRecord(self, name: str):
+        """
+        reading the records of the file backwards until a valid record
+        :param name: the file name
+        :return: (sequence, values, the number of the whole records, True if the file ends with the valid record)
+                 or None
+        """
+        try:
+            reader = open(name, 'rb')
+        except OSError:
+            return None
+        with reader:
+            size = reader.seek(0, 2)
+            count = size // self.recordSize
+            for index in range(count - 1, -1, -1):
+                reader.seek(index * self.recordSize)
+                record = self.unpack(reader.read(self.recordSize))
+                if record:
+                    return record[0], record[1], count, size == (index + 1) * self.recordSize
+        return None
+
+    def restore(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        finding the valid record with the greatest sequence in all the files, its file becomes the current file
+        if the current file has a torn (or invalid) record at its end, the journal moves to the next file (so the
+        next records are not appended after the torn bytes)
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: dict of the restored values or None if there's no valid record
+        """
+        latest = None
+        for index, name in enumerate(self.names):
+            record = self.lastRecord(name)
+            if record and (latest is None or record[0] > latest[1][0]):
+                latest = (index, record)
+        if latest is None:
+            return None
+        index, (sequence, values, count, clean) = latest
+        self.sequence = sequence
+        self.saved = values
+        self.savedFile = index
+        self.current = index
+        self.count = count if clean else self.recordsPerFile  # a torn end starts the next file
+        return values
+
+    def append(self, values: dict):
+        """
+        writing one record of the values (moving to the next file if the current file is full)
+        nothing is written if the values are the same as the last record
+        :param values: dict of the field values (the other keys are ignored)
+        :return: None
+        """
+        values = self.clamp(values)
+        if values == self.saved:
+            return
+        if self.writer is None or self.count >= self.recordsPerFile:
+            if self.writer:
+                self.writer.close()
+                self.writer = None
+            if self.count >= self.recordsPerFile:
+                self.current = (self.current + 1) % len(self.names)
+                if self.current == self.savedFile and len(self.names) > 1:  # the current file had a failed write
+                    self.current = (self.current + 1) % len(self.names)
+                self.count = 0
+            self.writer = open(self.names[self.current], 'wb' if self.count == 0 else 'ab')
+            self.rotations += self.count == 0
+        self.sequence += 1  # not taken back on a failure (a gap is harmless, a reused sequence isn't)
+        record = self.pack(self.sequence, values)
+        try:
+            self.writer.write(record)
+            self.writer.flush()
+        except (OSError, ValueError):  # the record may be torn, the next record starts the next file (as restore)
+            writer, self.writer = self.writer, None
+            self.count = self.recordsPerFile
+            writer.close()
+            raise
+        self.saved = values
+        self.savedFile = self.current
+        self.count += 1
+        self.records += 1
+        self.bytes += len(record)
+
+    def run(self, state):
+        """
+        the writer thread function, writing one record after every batch of state changes
+        :param state: the state (state.appState) saved by the journal
+        :return: None
+        """
+        version = state.version
+        while True:
+            version = state.wait(version)
+            sleep_ms(self.delayMs)  # collecting the changes made in the delay
+            version, values = state.snapshot()
+            try:
+                self.append(values)
+            except (OSError, ValueError):  # the flash is full or failing, the next change tries again
+                self.errors += 1
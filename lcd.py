@@ -1,7 +1,9 @@
+from hal import sleep_ms, sleep_us
+
+
 class LCD16X1:
-    from utime import sleep_ms, sleep_us
 
-    def __init__(self, i2CProtocol: I2C, address: int):
+    def __init__(self, i2CProtocol: 'I2C', address: int):
         # using PCF8574
         # from P0 to P7 is the output data
         # p0(0x0[0, 1])  -> register select{1: for data, 0: for command}
@@ -10,10 +12,13 @@ class LCD16X1:
         # p3(0x0[0, 8])  -> enable/disable gate of transistor responsible for backlight control
         # p4, p5, p6, p7 -> command/data pins
         # enable pulse width 450 ns, trailing edge minimum of 10 ns
+        # execution time (HD44780 datasheet) 37 us for all instructions and data, 1.52 ms for clear and return home
 
         self.i2CProtocol = i2CProtocol
         self.address = address
         self.dataByte = bytearray(1)
+        self.frame = bytearray(b' ' * 16)   # the shadow framebuffer (the characters shown now in the 16 cells)
+        self.packet = bytearray(18 * 4)     # used to pack one frame update (16 data + 2 cursor commands, 4 bytes each)
         self.RS = 0x00
         self.EN = 0x04
         self.RW = 0x02
@@ -34,7 +39,7 @@ class LCD16X1:
         =--------------------------------------------------------------------------------------------------------------=
         :return: None
         """
-        self.sleep_ms(20)
+        sleep_ms(20)
         self.lcdSendCMD(0x28)   # 0x28 2 line, 5*7 matrix character
         self.lcdSendCMD(0x0F)   # 0x0C making the underline cursor off
         self.lcdSendCMD(0x06)   # 0x06 auto-increment for the cursor (shift to right)
@@ -49,6 +54,7 @@ class LCD16X1:
         Setting Register Select To 0, W/R to LOW to send command to cgram
         send packet to lcd containing highest 4 bits of the command
         send packet to lcd containing lowest  4 bits of the command
+        waiting the command execution time (1.52 ms for clear and return home, 37 us for the others)
         =--------------------------------------------------------------------------------------------------------------=
         :param CMD: 8-bit instruction you want to send to lcd
         :return: None
@@ -57,6 +63,10 @@ class LCD16X1:
         self.RS = 0x00                      # setting register select to 0
         self.lcdMakePacket(CMD)             # sending the highest 4 bits
         self.lcdMakePacket(CMD << 0x04)     # to send the lowest 4 bits
+        if CMD <= 0x03:                     # clear display (0x01), return home (0x02, 0x03)
+            sleep_us(1520)
+        else:
+            sleep_us(37)
 
     def lcdSendData(self, data):
         """
@@ -66,6 +76,7 @@ class LCD16X1:
         Setting Register Select To 0, to send data to dram
         sending packet to lcd containing highest 4 bits of the data
         sending packet to lcd containing lowest  4 bits of the data
+        waiting the data write execution time (37 us)
         =--------------------------------------------------------------------------------------------------------------=
         :param data: 8-bit data required to be send to the lcd using i2c
         :return: None
@@ -74,6 +85,7 @@ class LCD16X1:
         self.RS = 0x01                      # setting the register select to 1
         self.lcdMakePacket(data)            # sending the highest 4 bits
         self.lcdMakePacket(data << 0x04)    # sending the lowest 4 bits
+        sleep_us(37)
 
     def lcdMakePacket(self, data):
         """
@@ -90,9 +102,8 @@ class LCD16X1:
         """
         data = (data & 0xF0) | self.BK | self.RS | self.RW
         self.lcdSendByte(data | self.EN)
-        self.sleep_us(1)
+        sleep_us(1)
         self.lcdSendByte(data)
-        self.sleep_ms(2)
 
     def lcdSendByte(self, data):
         """
@@ -102,13 +113,12 @@ class LCD16X1:
         load the data and encode it to byte
                 (dataByte[0] will convert automatically the data to bytes by taking it's decimal value)
         write the data to the i2c data line, for lcd address 0x27 (39d)
-        sleep 2 ms (to make sure that any command is executed fully [max time of command is 1.47 ms])
+        (the execution time is waited by lcdSendCMD, lcdSendData after the full byte not after every nibble)
         :param data: the required data that will be packed and send to lcd
         :return: None
         """
         self.dataByte[0] = data
         self.i2CProtocol.writeto(self.address, self.dataByte)
-        self.sleep_ms(2)
 
     def writeChar(self, char: chr, xPos=0):
         """
@@ -127,6 +137,8 @@ class LCD16X1:
         if xPos <= 16:
             self.lcdSendCMD(0x80 + xPos if 0 <= xPos < 8 else 0) if xPos < 0x08 else self.lcdSendCMD(0xC0 + xPos - 0x08)
             self.lcdSendData(ord(char))
+            if 0 <= xPos < 16:
+                self.frame[xPos] = ord(char)
 
     def writeString(self, string: str):
         """
@@ -141,8 +153,69 @@ class LCD16X1:
         :return: None
         """
         self.lcdSendCMD(0x01)
+        self.frame[:] = b' ' * 16
         for i in enumerate(string):
             if i[1] == '\n':
                 self.lcdSendCMD(0x01)
+                self.frame[:] = b' ' * 16
                 continue
             self.writeChar(i[1], i[0])
+
+    def packByte(self, index: int, byte: int, RS: int):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function packs one command (RS = 0) or data (RS = 1) byte to the frame packet as 4 i2c bytes
+        (highest 4 bits with enable, highest 4 bits without enable, lowest 4 bits with enable, lowest without enable)
+        the enable pulse width and the execution time are covered by the i2c bus time when sent in one transaction:
+            one i2c byte takes >= 22.5 us at 400 KHz (the PCF8574 max), so the enable pulse is > 450 ns
+            the next byte is latched after 2 i2c bytes (>= 45 us) which is > the 37 us execution time
+        =--------------------------------------------------------------------------------------------------------------=
+        :param index: the position in the packet to write at
+        :param byte: the command or data byte
+        :param RS: register select {1: for data, 0: for command}
+        :return: the position after the packed byte
+        """
+        for nibble in (byte & 0xF0, (byte << 0x04) & 0xF0):
+            nibble |= self.BK | RS      # W/R is LOW (write mode)
+            self.packet[index] = nibble | self.EN
+            self.packet[index + 1] = nibble
+            index += 2
+        return index
+
+    def writeFrame(self, string: str):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function writes the string to the lcd using the shadow framebuffer (without clearing the display)
+        the string is padded with spaces to 16 cells (the characters after '\n' or the 16th cell are not shown)
+        comparing every cell with the shadow framebuffer, only the changed cells are sent
+        the cursor command is sent only if the changed cell is not the next cell of the last written one
+            (the lcd auto-increments the cursor, but cell 8 is at 0xC0 not after cell 7)
+        all the commands and data of the update are packed and sent in one i2c transaction
+        so no slow clear command and no millisecond sleeps, an unchanged string sends nothing
+        if the i2c transaction fails the shown cells aren't known, so the shadow framebuffer is invalidated (0xFF in
+        every cell) and the error is raised, the next frame is then sent in full
+        =--------------------------------------------------------------------------------------------------------------=
+        :param string: the required string you want to show
+        :return: None
+        """
+        end = string.find('\n')
+        end = min(len(string) if end < 0 else end, 16)
+        length = 0
+        cursor = -1     # the cell the lcd cursor points at (-1 => not known)
+        for xPos in range(16):
+            char = ord(string[xPos]) if xPos < end else 0x20
+            if self.frame[xPos] == char:
+                continue
+            if cursor != xPos:
+                length = self.packByte(length, 0x80 + xPos if xPos < 0x08 else 0xC0 + xPos - 0x08, 0x00)
+            length = self.packByte(length, char, 0x01)
+            self.frame[xPos] = char
+            cursor = xPos + 1 if xPos != 0x07 else -1
+        if length:
+            try:
+                self.i2CProtocol.writeto(self.address, memoryview(self.packet)[:length])
+            except OSError:
+                self.frame[:] = b'\xff' * 16
+                raise
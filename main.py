@@ -1,20 +1,85 @@
-from machine import Pin, I2C
-from utime import sleep_ms
+from hal import sleep_ms, ticks_ms, ticks_us, ticks_diff, ustruct
+from hal import Pin, I2C, AUTH_WPA2_PSK, startAccessPoint, uniqueId
+
+bootStarted = ticks_ms()  # used to measure the boot stages from the start of main
+bootStages = []  # used to save (stage, milli-seconds since bootStarted) of the boot stages (bootReport)
 
 from lcd import LCD16X1
-from ultrasonic import ultraSonic
+from display import displayWriter
+from buttons import buttonInput
+from ultrasonic import ultraSonic, pingScheduler
 from gc import collect, enable
+try:
+    from gc import mem_free, mem_alloc
+except ImportError:  # CPython has no heap counters
+    mem_free = mem_alloc = None
 
 import _thread
-import network
-import socket
 
+from webserver import webServer, prebuildResponse, fileExists, chunkedStream
+from template import pageTemplate
+from httpparser import httpRequest
+from router import router
+from state import appState
+from journal import stateJournal
+from eventlog import eventLog, rowReader
+from websocket import webSocket, CLOSE_POLICY
+from metrics import metricsRegistry, BYTES_BOUNDS
+from peersync import venueCounter, peerSync
+
+
+
+def bootStage(name: str):
+    """
+    saving the time of the finished boot stage
+    :param name: the stage name
+    :return: None
+    """
+    bootStages.append((name, ticks_diff(ticks_ms(), bootStarted)))
+
+
+def bootReport():
+    """
+    :return: the text of the boot stages (the time of every stage since the boot and its duration)
+    """
+    lines = ['%-28s %8s %8s' % ('stage', 'at ms', 'took ms')]
+    last = 0
+    for name, at in bootStages:
+        lines.append('%-28s %8s %8s' % (name, at, at - last))
+        last = at
+    return '\n'.join(lines)
+
+
+bootStage('imports')
 enable()  # to enable the automatic garbage collection
 collect()  # to collect the 0 reference variables (free up ram)
 
+# the hot paths (server, loop, lcd, gc) are measured in preallocated counters and histograms, served as prometheus
+# text (/metrics) and printed as one log line every METRICS_LOG_MS, METRICS_ENABLED = False switches them off
+# (no registry is created and the hot paths only check that it's None)
+METRICS_ENABLED = True
+METRICS_LOG_MS = 60000
+metrics = metricsRegistry() if METRICS_ENABLED else None
+if metrics:
+    mainAppMetric = metrics.histogram('loop_mainapp_seconds', 'the time of one main app cycle (without the wait)')
+    doorAppMetric = metrics.histogram('loop_doorapp_seconds', 'the time of one door app cycle (without the sleep)')
+    gcMetric = metrics.histogram('gc_collect_seconds', 'the time of one garbage collection')
+    gcFreedMetric = metrics.histogram('gc_freed_bytes', 'the heap bytes freed by one garbage collection',
+                                      BYTES_BOUNDS, 1)
+    if mem_free:
+        metrics.gauge('heap_free_bytes', 'the free heap', mem_free)
+        metrics.gauge('heap_alloc_bytes', 'the allocated heap', mem_alloc)
+
 wifiName = 'esp32'  # the esp access point name
 wifiPassword = 'Th3@Professional'  # the esp access point password
-activeApp = ''  # used to save the current working app, allowed values ('mainApp', 'doorApp')
+
+# the units of one venue share its clients number (peersync.py), every unit sends its own clients number to its peers
+# (the (host, port) of the other units on a shared network) and the door app admits the clients by the venue clients
+# number, PEERS = () => the unit is alone (no venue counter, no sync thread)
+NODE_ID = uniqueId()  # the node id of the unit in the venue
+PEER_PORT = 10090  # the udp port of the peer sync
+PEERS = ()  # used to save the (host, port) of the other units, ex: (('192.168.1.21', 10090), ('192.168.1.22', 10090))
+venue: venueCounter = None  # used to save the venue counter (created at start if the unit has peers)
 
 pins = {
     'increment': Pin(34, Pin.IN, Pin.PULL_UP),
@@ -22,55 +87,101 @@ pins = {
     'reset': Pin(36, Pin.IN, Pin.PULL_UP),
     'internalLed': Pin(2, Pin.OUT, value=1)
 }  # used to save the GPIO pins and set if they are input (in pull up mode){34, 35, 36} or output (with value = 1){2}
-data = dict()  # used to save the value will be read from GPIO input pins
+# used to read the push buttons by their interrupts (debounced), holding increment or decrement repeats (faster and faster)
+buttons = buttonInput(dict((name, pins[name]) for name in ('increment', 'decrement', 'reset')),
+                      repeating=('increment', 'decrement'))
 
-serverSocket: socket.socket = None  # used to save the web socket
-mainAppHtml: str = ''  # used to save the read html text from mainAppIndex.html
-doorAppHtml: str = ''  # used to save the read html text from doorAppIndex.html
-indexHtml: str = ''  # used to save the read html text from index.html
-settingsHtml: str = ''  # used to save the read html text from settings.html
-styleSheet: str = ''  # used to save the read css text from styleSheet.css
+serverSocket: webServer = None  # used to save the web server
+mainAppHtml: pageTemplate = None  # used to save the compiled template of mainAppIndex.html (loaded at first use)
+doorAppHtml: pageTemplate = None  # used to save the compiled template of doorAppIndex.html (loaded at first use)
+# used to save the prebuilt responses (etag, headers, not modified, path) of the static pages (built at first use,
+# None for a missing '.gz' file)
+responseCache = dict()
+# used to save (version, values, json text, json response, binary response, not modified, json items) of the state
+# api, rebuilt only when the state version changes (so all the polling clients share one serialization)
+stateCache = (-1, None, '', b'', b'', b'', ())
+publishLock = _thread.allocate_lock()  # used to publish the state from one thread at a time (in the version order)
+publishedVersion = -1  # used to save the state version published last (an older version isn't published after it)
 
 lcd = None
+display = None  # used to write to the lcd from its own thread (the loop thread only posts the messages)
 try:
     i2c = I2C(-1, scl=Pin(22), sda=Pin(21),
-              freq=int(240E6))  # activating i2c serial protocol at pins(21, 22) with freq 240 MH
+              freq=100000)  # activating i2c serial protocol at pins(21, 22) with freq 100 KHz (the PCF8574 max)
     lcd = LCD16X1(i2c, 0x27)  # used to bind with lcd using i2c having slave address 0x27 (39d)
+    display = displayWriter(lcd, metrics=metrics)  # the latest message of every screen (counter, door, status) is kept
+    metrics.collector('lcd', display.metrics) if metrics else None
 except Exception as e:
     pass
 
 # ================================================MAIN PROJECT VARIABLES================================================
-currentNumber = 0  # used to save the current number value
 oldNumber = -1  # used to save the last current number value (they are not equal to make lcd print the value at first run)
 # ======================================================================================================================
 
 # ================================================Door Project Variables================================================
-uSonic1 = ultraSonic(18, 19)  # used to bind with ultrasonic at pins 18, 19
-currentDistanceUSonic1 = 100  # used to save the distance read from ultrasonic
+doorPins = ((18, 19),)  # used to save the (trigger, echo) pins of the ultrasonic of every door (one pair per door)
+doorSensors = [ultraSonic(trig, echo) for trig, echo in doorPins]  # used to bind with the ultrasonic of every door
+doorScheduler = pingScheduler(doorSensors)  # used to ping the doors ultrasonics in turn (so they don't hear each other)
+metrics.gauge('door_loop_wakeups', 'the wakeups of the door app loop (echo ends and timer bounds)',
+              lambda: doorScheduler.wakeups) if metrics else None
+doorDistances = [100] * len(doorSensors)  # used to save the distance read from the ultrasonic of every door
+doorRequests = [0x00] * len(doorSensors)  # used to save the request of every door (0x00 idle, 0x01 request)
 doorStates = ('idle', 'request', 'rejected')  # used to send status for the front-end by indexing
-doorRequest = 0x00  # 0x00 to close the door, 0x01 to open the door, 0x02 stop accepting
 lastDoorRequest = 0x03  # used to save the last door request (they are not equal to make lcd print the status at first run)
-clientsNumber = 0  # used to save the current clients number
-maxClientsNumber = 3  # used to save the max clients allowed to enter the place
+# the rejected door state (0x02, a refused enter or exit) is replaced by the next door reading after REJECTED_MS (the
+# period of the old door loop, so the pages see it as they did when the loop read the door every 250 ms)
+REJECTED_MS = 250
+rejectedAt = 0  # used to save the time (ticks_ms) the last enter or exit was rejected
 # ======================================================================================================================
 
-# the context manager will define readers that will read html file and will close file descriptors after exiting from context
-# open(filename, open_option) used to make file descriptor to r/w specific file
-with open('mainAppIndex.html', 'r') as mainAppReader, open('index.html', 'r') as indexHtmlReader, \
-        open('doorAppIndex.html', 'r') as doorAppReader, open('settings.html', 'r') as settingsHtmlReader, \
-        open('styleSheet.css', 'r') as styleSheetReader:
-    mainAppHtml = mainAppReader.read()  # reading 'mainAppIndex.html' and saving it mainAppHtml
-    indexHtml = indexHtmlReader.read()
-    doorAppHtml = doorAppReader.read()
-    settingsHtml = settingsHtmlReader.read()
-    styleSheet = styleSheetReader.read()
+bootStage('hardware')
+
+# the state shared by the loop thread and the server thread, every change is made under its lock:
+#   activeApp        => the current working app, allowed values ('mainApp', 'doorApp', '')
+#   currentNumber    => the current number value (main app)
+#   clientsNumber    => the current clients number (shared by all the doors)
+#   maxClientsNumber => the max clients allowed to enter the place
+#   doorRequest      => 0x00 to close the door, 0x01 to open the door (any door requests), 0x02 stop accepting
+MAX_CLIENTS_LIMIT = 9999  # the max of the max clients number (4 digits on the lcd, fits the uint16 of STATE_FORMAT)
+state = appState(activeApp='', currentNumber=0, clientsNumber=0, maxClientsNumber=3, doorRequest=0x00)
+metrics.gauge('state_listener_errors', 'the exceptions raised by the state listeners',
+              lambda: state.listenerErrors) if metrics else None
+# the counts are saved to the flash journal (journal0.bin ... journal3.bin) by the journal thread, at most one record
+# every 2 seconds while they change, and they are restored from it at boot (so a power cut doesn't reset them)
+# the restored values are clamped to the ranges the app accepts (the lcd 4 digits, MAX_CLIENTS_LIMIT)
+journal = stateJournal(('currentNumber', 'clientsNumber', 'maxClientsNumber'),
+                       bounds=dict(currentNumber=(-999, 9999), clientsNumber=(0, MAX_CLIENTS_LIMIT),
+                                   maxClientsNumber=(0, MAX_CLIENTS_LIMIT)))
+state.set(**(journal.restore() or {}))
+# the changes of the counter and the clients number (time, source, delta, value) are recorded in a fixed size ring
+# with per minute and per hour aggregates (entries, exits, counter changes, peak clients number), starting from the
+# restored clients number
+history = eventLog(occupancy=state.clientsNumber)
+# the binary state api (/api/state?format=bin) is 12 bytes (little endian):
+#   version (uint32), active app code (uint8, index in APPS), door request (uint8), current number (int16),
+#   clients number (uint16), max clients number (uint16)
+APPS = ('', 'mainApp', 'doorApp')
+STATE_FORMAT = '<IBBhHH'
+
+bootStage('state restored')
+
+# the static pages are not loaded in ram, only their prebuilt headers (with their etag) are saved, and the files are
+# streamed from flash for every response, the headers are built at the first request of the page (not at boot).
+# the build step compresses them to '.gz' files which are sent to the clients that accept gzip encoding
+# the html pages must be revalidated (no-cache) as requesting them changes the active app,
+# the stylesheet is cached by the browser for one day
+STATIC_PAGES = {
+    'index': ('index.html', 'text/html', 'no-cache'),
+    'settings': ('settings.html', 'text/html', 'no-cache'),
+    'styleSheet': ('styleSheet.css', 'text/css', 'max-age=86400')
+}  # used to save (file name, content type, cache control) of the static pages by their selectors
 
 
-def generateAp(essid: str, password: str, authMode=network.AUTH_WPA2_PSK, maxClients: int = 1):
+def generateAp(essid: str, password: str, authMode=AUTH_WPA2_PSK, maxClients: int = 1):
     """
     =------------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
-        setting and configuring the wifi interface of mcu
+        setting and configuring the wifi interface of mcu (hal.startAccessPoint, the loopback network in simulation)
         activating the AP
         turning off the led after activating the AP.
     =------------------------------------------------------------------------------------------------------------------=
@@ -80,215 +191,559 @@ def generateAp(essid: str, password: str, authMode=network.AUTH_WPA2_PSK, maxCli
         :param password:    the access point password
         :param authMode:    the access point auth mode common auth modes {OPEN, WEP, WPA_WPA2_PSK, WPA2_PSK}
         :param maxClients:  the max number of clients can be connected to the interface at the same time
+        :return: the host the server is bound to
+    """
+    host = startAccessPoint(essid, password, authMode, maxClients)
+    pins['internalLed'].value(0)  # setting GPIO 2 to low after setting the server and access point
+    return host
+
+
+def createServer(host: str = '', port: int = 80):
+    """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        creating the event driven web server (webserver.webServer) at port 80 (web surfing port) by default
+                if the waiting connections no. <= 5 then it will be accepted [listen(5)] else it will be rejected
+        the server doesn't block on any client, every connection has its own read and write buffers
+        the connections are kept alive for the js polling, an idle connection is closed after 5 seconds
+        and every connection is closed after 100 requests (so no client keeps a connection slot forever)
+        every fully received request is dispatched by routes to its handler (pipelined requests are handled in order)
+        the server wakes up (loopback udp wake socket) when the loop thread publishes a new state, so the event stream
+        and long poll clients get the changes without busy waiting
+        the first request is dispatched by firstRequest (saving its boot stage), then by routes directly
+        =--------------------------------------------------------------------------------------------------------------=
+        :var serverSocket:  global variable, webServer (used to access the created server)
+        :param host: the host the server is bound to ('' => all the interfaces)
+        :param port: the server port
         :return: None
     """
+    global serverSocket
 
-    ap = network.WLAN(network.AP_IF)  # setting the wlan interface to be access point (AP_IF)
-    ap.config(essid=essid,
-              password=password,
-              authmode=authMode,
-              max_clients=maxClients)  # configuring access point parameters (name, password, auth, clients no.)
-    ap.active(True)  # activating the wireless interface of esp32
+    serverSocket = webServer((host, port), firstRequest, backlog=5, idleTimeout=5000, maxRequests=100, wakePort=10080,
+                             metrics=metrics)
+    publishState()  # publishing the initial values for the event stream and long poll clients
+    bootStage('server listening')
+    serverSocket.serveForever()
 
-    while not ap.active():  # empty loop to hang the system up until the access point starts
-        pass
 
-    pins['internalLed'].value(0)  # setting GPIO 2 to low after setting the server and access point
+def firstRequest(socketConnection, request: httpRequest):
+    serverSocket.handler = routes.dispatch  # the next requests are dispatched directly
+    routes.dispatch(socketConnection, request)
+    bootStage('first request')
+
 
+def isMainApp():
+    return state.activeApp == 'mainApp'
 
-def createServer():
+
+def isDoorApp():
+    return state.activeApp == 'doorApp'
+
+
+def pageNotFound(socketConnection, request: httpRequest):
+    # returning back to the client page not found request with http status code 404
+    sendResponse(socketConnection, 'Page not found', 404, 'NOT FOUND')
+
+
+# ========================================================ROUTES========================================================
+#                                             *allowed formats*
+# accepting (post, get) requests
+# accepted urls ('/', '/index.html', 'mainApp/', 'mainApp/index.html', 'doorApp/', 'doorApp/index.html',
+#                'doorApp/request', 'mainApp/currentNumber', 'stylesheet.css')
+# paths => '/', '/index.html' the main page of web server (localhost) to redirect you to one app
+#       => 'mainApp', 'mainApp/index.html' the main page of main app (counting system)
+#       => 'mainApp/currentNumber' returns the value of current number of the system to be used by js.
+#          with '?wait=value' it's a long poll request answered only when the current number != value
+#       => 'mainApp/events' server sent events stream of the current number (sent only when it changes)
+#       => 'mainApp/socket' websocket receiving the commands (increment, decrement, reset) as text messages and
+#          pushing the state changes (json of the changed fields with the version, the full state at first)
+#       => 'doorApp', 'doorApp/index.html' the main page of door app (corona system)
+#       => 'doorApp/request' returns the current door status and current clients number(close, enter[exit], reject)
+#          to be used by js.
+#          with '?wait=value' it's a long poll request answered only when the door status != value
+#       => 'doorApp/events' server sent events stream of the door status (sent only when it changes)
+#       => 'doorApp/socket' websocket receiving the commands (enter, exit, reset), pushing the state changes
+#       => 'doorApp/settings' the settings page of door app (max clients number)
+#       => 'stylesheet.css' the css stylesheet of all pages
+#       => 'api/events' the recorded events (?format=json|csv, ?since=time in seconds), streamed in chunks
+#       => 'api/stats' the per minute (or ?period=hour) aggregates and the peak clients numbers (?format=json|csv)
+#       => 'api/state' the whole state with its version (?format=json|bin), answered from stateCache with its etag
+#          with '?wait=version' it's a long poll request answered only when the state version != version
+#       => 'api/state/events' server sent events stream of the json state (sent only when it changes)
+#       => 'api/boot' the boot stages times (bootReport)
+#       => 'api/venue' the merged venue state of all the units (only if the unit has PEERS)
+#       => 'metrics' the prometheus text of the metrics (only if METRICS_ENABLED)
+# every path is registered in routes with its handler (and its guard if it's allowed only in one app), so new
+# endpoints are added by registering them without editing the server loop.
+# every handler takes (socketConnection, request):
+#     :param socketConnection: the client connection (webserver.clientConnection) used to send the response
+#     :param request: the parsed request (httpparser.httpRequest: method, path, query, headers, body)
+# ======================================================================================================================
+routes = router(pageNotFound)  # used to dispatch the requests by their path (one dict lookup for every request)
+
+
+@routes.route('stylesheet.css')
+def styleSheetPage(socketConnection, request: httpRequest):
+    sendCachedResponse(socketConnection, 'styleSheet')  # accessing the stylesheet
+
+
+@routes.route('', 'index.html')
+def indexPage(socketConnection, request: httpRequest):
     """
-        =--------------------------------------------------------------------------------------------------------------=
+    the main web page of local host ('' === '/')
+    :var state: global variable, setting the current active app to empty string.
+    """
+    state.set(activeApp='')
+    sendCachedResponse(socketConnection, 'index')  # return response to the client
+
+
+@routes.route('mainapp/currentnumber', guard=isMainApp)
+def currentNumberPage(socketConnection, request: httpRequest):
+    getData = request.getData()  # reading the get data from the request url (ex: /?wait=12 => getData[wait] = 12)
+    if 'wait' in getData:
+        # long poll, returning the current number only when it differs from the client's number
+        serverSocket.waitChange(socketConnection, 'mainApp', getData['wait'], sendResponse)
+        return
+    sendResponse(socketConnection, state.currentNumber)  # returning the current number as response
+
+
+@routes.route('mainapp/events', guard=isMainApp)
+def mainAppEvents(socketConnection, request: httpRequest):
+    # streaming the current number to the client every time it changes
+    serverSocket.subscribe(socketConnection, 'mainApp')
+
+
+@routes.route('mainapp', 'mainapp/index.html')
+def mainAppPage(socketConnection, request: httpRequest):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
-        hanging up until a request is caught
-                if the request no. <= 5 then it will be accepted [listen(5)] else it will be rejected and closed
-        reading the received request from the client
-        parsing the received request (request type, requested path, post data, get data)
-        parsing the url sent by the client.
-        creating the infrastructure of the web server for handling and parsing the requests.
-        =--------------------------------------------------------------------------------------------------------------=
-                                                    *allowed formats*
-        accepting (post, get) requests
-        accepted urls ('/', '/index.html', 'mainApp/', 'mainApp/index.html', 'doorApp/', 'doorApp/index.html',
-                       'doorApp/request', 'mainApp/currentNumber', 'stylesheet.css')
-        paths => '/', '/index.html' the main page of web server (localhost) to redirect you to one app
-              => 'mainApp', 'mainApp/index.html' the main page of main app (counting system)
-              => 'mainApp/currentNumber' returns the value of current number of the system to be used by js.
-              => 'doorApp', 'doorApp/index.html' the main page of door app (corona system)
-              => 'doorApp/request' returns the current door status and current clients number(close, enter[exit], reject)
-                 to be used by js.
-              => 'stylesheet.css' the css stylesheet of all pages
-        =--------------------------------------------------------------------------------------------------------------=
+    setting the active app to main app
+    if the data is sent using post request then reading the choice of the user (increment, decrement, reset)
+    returning the mainAppIndex.html page to the client with current number
+    =------------------------------------------------------------------------------------------------------------------=
+    :var state:  global variable, used to set, read the current active app and the current number (main app)
+    """
+    state.set(activeApp='mainApp')
+    if request.method == 'POST':                # checking if the data is sent using post request
+        # get the value of choice if exists else it will return none
+        mainAppCommand(request.postData().get('choice'))
+    # returning the mainAppIndex.html page to the client with current number
+    sendTemplate(socketConnection, webPage('mainApp'), dict(current_number=state.currentNumber))
 
-        :var serverSocket:  global variable, socket (used to access the created socket)
-        :var currentNumber: global variable, used to save the value of current number in project 1 (main app)
-        :var activeApp:     global variable, used to set, read the current active app (main app, door app, '')
-        :var doorRequest:   global variable, used to set, read the door request value (close, request, rejected)
-        :var clientsNumber: global variable, used to set, read the number of clients in place (door app)
-        :var currentDistanceUSonic1: global variable, used to set, read the ultrasonic sensor object distance (door app)
-        :var maxClientsNumber: global variable, used to set, read the max clients in place (door app)
-        :var socketConnection: local variable, used to save the socket connection to receive and send data
-        :var clientAddress: local variable, used to save the ip address of client that sent the request
-        :var request: local variable, used to save the received request from the client to be parsed
-        :var headers: local variable, used to read the headers in request (to know more about request)
-        :var requestType: local variable, used to read the type of the received request (GET, POST, HEAD, ...etc)
-        :var fileName: local variable, used to read the requested path (localhost/filename, then fileName = /filename)
-        :var postData: local variable, used to read the request data send by post request (requestType == POST)
-        :var choice: local variable, used to read the current post request at the two apps {(inc., dec., reset),
-                                                                                            (enter, exit)}
-        :var number: local variable, used to read the max no. of clients send by settings page
 
-        :return: None
+@routes.route('mainapp/socket', methods=('GET',), guard=isMainApp)
+def mainAppSocket(socketConnection, request: httpRequest):
+    # upgrading to websocket, the commands (increment, decrement, reset) are received and the state changes are pushed
+    if webSocket(lambda connection, session, message: socketCommand(connection, session, isMainApp, mainAppCommand,
+                                                                    message),
+                 pushStateDelta).accept(socketConnection, request):
+        serverSocket.subscribe(socketConnection, 'state')
+
+
+def mainAppCommand(choice: str):
+    """
+    applying the choice of the user (sent by the page's post request or its websocket)
+    :param choice: increment, decrement or reset (other values are ignored)
+    :return: None
     """
-    global serverSocket, currentNumber, activeApp, \
-        doorRequest, clientsNumber, currentDistanceUSonic1, \
-        maxClientsNumber
+    if choice == 'increment':
+        # if the user clicked increment button in front-end
+        # checking if the number of max 9999 because free space in lcd is 4 digits (wrapping around to -999)
+        countNumber('mainApp', 1)
+    elif choice == 'decrement':
+        # if the user clicked decrement button in front-end
+        # checking if the number is greater than -999 because free space in lcd is 4 digits (wrapping around to 9999)
+        countNumber('mainApp', -1)
+    elif choice == 'reset':
+        # if the user clicked reset button in front-end
+        # setting the current number to 0
+        resetNumber('mainApp', 'currentNumber')
 
-    serverSocket = socket.socket(socket.AF_INET,
-                                 socket.SOCK_STREAM)  # creating web socket (address family ipv4, socket protocol TCP)
-    serverSocket.bind(('', 80))  # binding the web socket at mcu local ip address at port 80 (web surfing port)
-    serverSocket.listen(5)  # listening for incoming requests at max of 5 in queue before rejection
 
-    while True:
-        socketConnection, clientAddress = serverSocket.accept()  # hanging up until a request is received
-        request = socketConnection.recv(4096).decode('utf-8', 'ignore')  # reading the request data (4 bytes at once)
-        headers = request.split('\n')  # splitting request line by line to get headers
-        # splitting first header using spaces to parse request (request type, path, http type)
-        requestType, fileName, *http = headers[0].split()
-
-        # removing trailing (spaces, /, tabs, new lines) parse req. path (ex: /filename/ => filename)
-        fileName = str(fileName).strip('/\t\n').lower()
-
-        # reading the get data from the request url (ex: /?cmd=inc => getData[cmd] = inc)
-        getData = dict(tuple(get_data.split("=")[:2]
-                             if "=" in get_data else (get_data, '')
-                             for get_data in fileName.split("?")[-1].split("&")))
-
-        # reading the post data from the request (the data sent by post request)
-        postData = dict(tuple(post_data.split('=')[:2])
-                        if '=' in post_data else (post_data, '')
-                        for post_data in headers[headers.index('\r') + 1:]) if requestType == 'POST' else {}
-
-        if fileName == 'stylesheet.css':  # accessing the stylesheet
-            sendResponse(socketConnection, webPage('styleSheet'), contentType='text/css')
-            continue
-
-        if fileName == '' or fileName == 'index.html':  # accessing the main web page of local host ('' === '/')
-            activeApp = ''                              # setting the current active app to empty string.
-            sendResponse(socketConnection, webPage())   # return response to the client and close the connection
-            continue  # jump to the loop control
-
-        if fileName == 'mainapp/currentnumber' and activeApp == 'mainApp':
-            sendResponse(socketConnection,
-                         currentNumber)  # returning the current number as response and close the connection
-            continue
-
-        if fileName == 'mainapp' or fileName == 'mainapp/index.html':
-            activeApp = 'mainApp'
-            if requestType == 'POST':            # checking if the data is sent using post request
-                choice = postData.get('choice')  # get the value of choice if exists else it will return none
-                if choice == 'increment':
-                    # if the user clicked increment button in front-end
-                    # checking if the number of max 9999 because free space in lcd is 4 digits
-                    currentNumber = (currentNumber + 1) if currentNumber < 9999 else -999
-                elif choice == 'decrement':
-                    # if the user clicked decrement button in front-end
-                    # checking if the number is greater than -999 because free space in lcd is 4 digits
-                    currentNumber = (currentNumber - 1) if currentNumber > -999 else 9999
-                elif choice == 'reset':
-                    # if the user clicked reset button in front-end
-                    # setting the current number to 0
-                    currentNumber = 0
-            # returning the mainAppIndex.html page to the client with current number and closing the connection
-            sendResponse(socketConnection, webPage('mainApp') % dict(current_number=currentNumber))
-            continue
-
-        if fileName == 'doorapp/request' and activeApp == 'doorApp':
-            # returning door state and the current clients number to the request's client and closing the connection
-            sendResponse(socketConnection, doorStates[doorRequest] + "_%s" % clientsNumber)
-            continue
-
-        if fileName == 'doorapp' or fileName == 'doorapp/index.html':
-            activeApp = 'doorApp'  # setting the current active app to be door application
-            # settings door status to close (initial condition) to give idle state
-            doorRequest = 0x00
-            currentDistanceUSonic1 = 100  # resetting the initial values of ultrasonic
-            choice = postData.get('choice')  # getting choice from the request if exists else None
-            number = postData.get('number')  # getting number from the request if exists else None
-            if requestType == 'POST':
-                if choice == 'enter':
-                    # if the user clicked enter button in front-end
-                    # it will check if clients number < max number else will set the state to be rejected
-                    if clientsNumber < maxClientsNumber:
-                        clientsNumber += 1
-                    else:
-                        doorRequest = 0x02
-                elif choice == 'exit':
-                    # if the user clicked exit button in front-end
-                    # it will check if clients number > 0 else it will do nothing
-                    if clientsNumber > 0:
-                        clientsNumber -= 1
-                    else:
-                        doorRequest = 0x02
-                elif choice == 'reset':
-                    # if the user clicked reset button in front-end then it resets the system
-                    clientsNumber = 0
-                elif number:
-                    # if the number is set then it's redirected from settings.html
-                    # setting clientsNumber to 0
-                    # setting maxClients to number if sent data is numeric and greater than 0
-                    clientsNumber = 0
-                    maxClientsNumber = max(0, int(number)) if number.isdigit() else 0
-
-            # returning back to the client doorAppIndex.html with current clients number and door state
-            sendResponse(socketConnection,
-                         webPage('doorApp') % dict(clients_number=clientsNumber,
-                                                   door_state=doorStates[doorRequest]))
-            continue
-
-        if (fileName == 'doorapp/settings' or fileName == 'doorapp/settings/index.html') and activeApp == 'doorApp':
-            # returning back to the client settings.html and close the connection
-            sendResponse(socketConnection, webPage('settings'))
-            continue
-
-        # returning back to the client page not found request with http status code 404
-        sendResponse(socketConnection, 'Page not found', 404, 'NOT FOUND')
-
-
-def webPage(selector: str = 'index'):
+@routes.route('doorapp/request', guard=isDoorApp)
+def doorRequestPage(socketConnection, request: httpRequest):
+    getData = request.getData()  # reading the get data from the request url (ex: /?wait=idle_0)
+    if 'wait' in getData:
+        # long poll, returning the door state and clients number only when they differ from the client's values
+        serverSocket.waitChange(socketConnection, 'doorApp', getData['wait'], sendResponse)
+        return
+    # returning door state and the current clients number to the request's client
+    sendResponse(socketConnection, doorStates[state.doorRequest] + "_%s" % state.clientsNumber)
+
+
+@routes.route('doorapp/events', guard=isDoorApp)
+def doorAppEvents(socketConnection, request: httpRequest):
+    # streaming the door state and the current clients number to the client every time they change
+    serverSocket.subscribe(socketConnection, 'doorApp')
+
+
+@routes.route('doorapp', 'doorapp/index.html')
+def doorAppPage(socketConnection, request: httpRequest):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    setting the active app to door app and resetting the doors status and the ultrasonics distances
+    if the data is sent using post request then reading the choice of the user (enter, exit, reset)
+    or the max clients number sent by the settings page
+    returning the doorAppIndex.html page to the client with current clients number and door state
+    =------------------------------------------------------------------------------------------------------------------=
+    :var state:         global variable, used to set, read the current active app, the door request value (close,
+                        request, rejected), the number of clients in place and the max clients in place (door app)
+    :var doorDistances: global variable, used to set, read the ultrasonics objects distances (door app)
+    :var choice: local variable, used to read the current post request (enter, exit, reset)
+    :var number: local variable, used to read the max no. of clients send by settings page
+    """
+    # setting the current active app to be door application
+    # settings door status to close (initial condition) to give idle state
+    state.set(activeApp='doorApp', doorRequest=0x00)
+    for door in range(len(doorSensors)):  # resetting the initial values of the ultrasonics
+        doorDistances[door] = 100
+        doorRequests[door] = 0x00
+        doorSensors[door].filter.reset()  # forgetting the filtered distance and the presence
+    postData = request.postData()  # reading the post data from the request (the url-encoded form)
+    choice = postData.get('choice')  # getting choice from the request if exists else None
+    number = postData.get('number')  # getting number from the request if exists else None
+    if request.method == 'POST':
+        if choice:
+            doorAppCommand(choice)
+        elif number:
+            # if the number is set then it's redirected from settings.html
+            # setting clientsNumber to 0
+            # setting maxClients to number if sent data is numeric (0 ... MAX_CLIENTS_LIMIT)
+            resetNumber('doorApp', 'clientsNumber')
+            state.set(maxClientsNumber=min(int(number), MAX_CLIENTS_LIMIT) if number.isdigit() else 0)
+            venue.reset(state.maxClientsNumber) if venue else None  # resetting all the units with the new max
+
+    # returning back to the client doorAppIndex.html with current clients number and door state
+    values = state.snapshot()[1]  # reading the clients number and the door state together
+    sendTemplate(socketConnection,
+                 webPage('doorApp'), dict(clients_number=values['clientsNumber'],
+                                          door_state=doorStates[values['doorRequest']]))
+
+
+@routes.route('doorapp/socket', methods=('GET',), guard=isDoorApp)
+def doorAppSocket(socketConnection, request: httpRequest):
+    # upgrading to websocket, the commands (enter, exit, reset) are received and the state changes are pushed
+    if webSocket(lambda connection, session, message: socketCommand(connection, session, isDoorApp, doorAppCommand,
+                                                                    message),
+                 pushStateDelta).accept(socketConnection, request):
+        serverSocket.subscribe(socketConnection, 'state')
+
+
+def doorAppCommand(choice: str):
+    """
+    applying the choice of the user (sent by the page's post request or its websocket)
+    with peers, the max clients number is checked against the venue clients number (the clients of the other units
+    are added), and reset resets all the units
+    :param choice: enter, exit or reset (other values are ignored)
+    :var clients: local variable, used to read the clients number before entering (compare and set)
+    :return: None
+    """
+    if choice == 'enter':
+        # if the user clicked enter button in front-end
+        # it will check if clients number < max number else will set the state to be rejected
+        # the clients number is set only if no other thread changed it after it was checked (else checking again)
+        while True:
+            clients = state.clientsNumber
+            if clients + (venue.others() if venue else 0) >= state.maxClientsNumber:
+                rejectRequest()
+                break
+            if state.compareAndSet('clientsNumber', clients, clients + 1):
+                history.record('doorApp', 1, clients + 1)
+                break
+    elif choice == 'exit':
+        # if the user clicked exit button in front-end
+        # it will check if clients number > 0 else it will set the state to be rejected
+        clients = state.add('clientsNumber', -1, 0)
+        if clients is None:
+            rejectRequest()
+        else:
+            history.record('doorApp', -1, clients)
+    elif choice == 'reset':
+        # if the user clicked reset button in front-end then it resets the system
+        resetNumber('doorApp', 'clientsNumber')
+        venue.reset(state.maxClientsNumber) if venue else None
+
+
+def rejectRequest():
+    """
+    setting the door state to rejected (0x02), the door app replaces it with the next reading after REJECTED_MS
+    :var rejectedAt: global variable, the time the request was rejected
+    :return: None
+    """
+    global rejectedAt
+    rejectedAt = ticks_ms()
+    state.set(doorRequest=0x02)
+
+
+@routes.route('doorapp/settings', 'doorapp/settings/index.html', guard=isDoorApp)
+def settingsPage(socketConnection, request: httpRequest):
+    # returning back to the client settings.html
+    sendCachedResponse(socketConnection, 'settings')
+
+
+@routes.route('api/events', methods=('GET',))
+def eventsPage(socketConnection, request: httpRequest):
+    getData = request.getData()  # reading the format and the min time (ex: /api/events?format=csv&since=120)
+    since = getData.get('since', '0')
+    sendStream(socketConnection, request, history.eventRows(getData.get('format', 'json'),
+                                                            int(since) if since.isdigit() else 0),
+               'text/csv' if getData.get('format') == 'csv' else 'application/json')
+
+
+@routes.route('api/stats', methods=('GET',))
+def statsPage(socketConnection, request: httpRequest):
+    getData = request.getData()  # reading the format and the period (ex: /api/stats?period=hour)
+    sendStream(socketConnection, request, history.statsRows(getData.get('format', 'json'),
+                                                            getData.get('period', 'minute')),
+               'text/csv' if getData.get('format') == 'csv' else 'application/json')
+
+
+@routes.route('api/state', methods=('GET',))
+def statePage(socketConnection, request: httpRequest):
+    getData = request.getData()  # reading the format and the client's version (ex: /api/state?format=bin&wait=12)
+    binary = getData.get('format') == 'bin'
+    cache = stateResponses()
+    if getData.get('wait') == str(cache[0]):
+        # long poll, answering only when the state changes (the channel's value is the json text of this version)
+        serverSocket.waitChange(socketConnection, 'state', cache[2],
+                                lambda connection, value: sendState(connection, binary))
+        return
+    sendState(socketConnection, binary)
+
+
+@routes.route('api/state/events', methods=('GET',))
+def stateEvents(socketConnection, request: httpRequest):
+    # streaming the json state to the client every time it changes
+    serverSocket.subscribe(socketConnection, 'state')
+
+
+@routes.route('api/boot', methods=('GET',))
+def bootPage(socketConnection, request: httpRequest):
+    sendResponse(socketConnection, bootReport(), contentType='text/plain')
+
+
+def hasPeers():
+    return venue is not None
+
+
+@routes.route('api/venue', methods=('GET',), guard=hasPeers)
+def venuePage(socketConnection, request: httpRequest):
+    sendResponse(socketConnection, venue.json(), contentType='application/json')
+
+
+def metricsEnabled():
+    return metrics is not None
+
+
+@routes.route('metrics', methods=('GET',), guard=metricsEnabled)
+def metricsPage(socketConnection, request: httpRequest):
+    sendResponse(socketConnection, metrics.render(), contentType='text/plain; version=0.0.4')
+
+
+def webPage(selector: str = 'mainApp'):
     """
     =------------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
-    this function used to return the required html webpage to be sent to the client
+    this function used to return the required compiled html template to be rendered and sent to the client
+    the template is read and compiled at its first use (loadTemplate), so the boot doesn't wait for the files
+    the static pages (index, settings, styleSheet) are not templates, they are sent from responseCache
     =------------------------------------------------------------------------------------------------------------------=
-    :param selector: to select between (index, mainApp, doorApp, settings)
-    :return: str
+    :param selector: to select between (mainApp, doorApp)
+    :var mainAppHtml: global variable, the compiled template of main app
+    :var doorAppHtml: global variable, the compiled template of door app
+    :return: pageTemplate
     """
+    global mainAppHtml, doorAppHtml
     if selector == 'mainApp':
+        if mainAppHtml is None:
+            mainAppHtml = loadTemplate('mainAppIndex')
         return mainAppHtml
     elif selector == 'doorApp':
+        if doorAppHtml is None:
+            doorAppHtml = loadTemplate('doorAppIndex')
         return doorAppHtml
-    elif selector == 'index':
-        return indexHtml
-    elif selector == 'settings':
-        return settingsHtml
-    elif selector == 'styleSheet':
-        return styleSheet
     else:
         return None
 
 
+def loadTemplate(name: str):
+    """
+    reading the template file and compiling it (the minified '.min.html' built by tools/build.py, else the original)
+    :param name: the template name (mainAppIndex, doorAppIndex)
+    :return: pageTemplate
+    """
+    fileName = name + '.min.html' if fileExists(name + '.min.html') else name + '.html'
+    with open(fileName, 'r') as reader:
+        page = pageTemplate(reader.read())
+    bootStage('loaded ' + fileName)
+    return page
+
+
+def publishState():
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function publishes the state of the two apps to the web server to be pushed to the waiting clients
+    it's called every time the state changes (it listens to the state, so it runs in the changing thread)
+    the listeners of two threads can run at the same time and in any order, so the state is read and published under
+    publishLock, and a version not newer than the published one is dropped (the last published state is the latest)
+    the server sends nothing if the published value didn't change
+    =------------------------------------------------------------------------------------------------------------------=
+    :var serverSocket: global variable, the web server (None until the server is created)
+    :var publishedVersion: global variable, the state version published last
+    :var values: local variable, the state fields read together (from the state api cache)
+    :return: None
+    """
+    global publishedVersion
+    if serverSocket:
+        with publishLock:
+            cache = stateResponses()
+            if cache[0] <= publishedVersion:  # a newer state is already published by another thread
+                return
+            publishedVersion = cache[0]
+            values = cache[1]
+            serverSocket.publish('state', cache[2])
+            serverSocket.publish('mainApp', str(values['currentNumber']))
+            serverSocket.publish('doorApp', doorStates[values['doorRequest']] + '_%s' % values['clientsNumber'])
+
+
+state.listen(lambda changedState: publishState())  # publishing every change of the state
+# waking the loop if it's waiting for the buttons, so it checks the active app and draws the number on the lcd after
+# every change (made by a page, a websocket command or the settings)
+state.listen(lambda changedState: buttons.wake())
+
+
+def stateResponses():
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function returns the prebuilt responses of the state api, they are rebuilt only if the state version changed
+    since they were built, so every poll between two changes is one sendall of the same buffer
+    the etag is the state version, so a client having the same version gets the prebuilt (304 not modified) response
+    no connection header is sent (as the static pages responses)
+    =------------------------------------------------------------------------------------------------------------------=
+    :var stateCache: global variable, the cached responses (replaced by one assignment, so it's read from any thread)
+    :return: (version, values, json text, json response, binary response, not modified response, json items)
+    """
+    global stateCache
+    cache = stateCache
+    if cache[0] == state.version:
+        return cache
+    version, values = state.snapshot()
+    items = (('version', str(version)), ('app', '"%s"' % values['activeApp']),
+             ('currentNumber', str(values['currentNumber'])), ('clientsNumber', str(values['clientsNumber'])),
+             ('maxClientsNumber', str(values['maxClientsNumber'])),
+             ('doorState', '"%s"' % doorStates[values['doorRequest']]))
+    text = '{%s}' % ','.join('"%s":%s' % item for item in items)
+    binary = ustruct.pack(STATE_FORMAT, version, APPS.index(values['activeApp']), values['doorRequest'],
+                          values['currentNumber'], values['clientsNumber'], values['maxClientsNumber'])
+    headers = 'ETag: "%s"\r\nCache-Control: no-cache\r\n' % version
+    cache = stateCache = (
+        version, values, text,
+        ('HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %s\r\n%s\r\n%s'
+         % (len(text), headers, text)).encode(),
+        ('HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nContent-Length: %s\r\n%s\r\n'
+         % (len(binary), headers)).encode() + binary,
+        ('HTTP/1.1 304 Not Modified\r\n%s\r\n' % headers).encode(), items)
+    return cache
+
+
+def sendState(socketConnection, binary: bool = False):
+    """
+    sending the cached state api response (or 304 not modified if the client has the same version) with one sendall
+    then closing the connection if it's not kept alive
+    :param socketConnection: the socket connection handler
+    :param binary: True => the packed binary state (STATE_FORMAT), False => the json state
+    :return: None
+    """
+    cache = stateResponses()
+    ifNoneMatch = getattr(socketConnection, 'headers', {}).get('if-none-match', '')
+    try:
+        socketConnection.sendall(cache[5] if ifNoneMatch == '"%s"' % cache[0] else cache[4 if binary else 3])
+    except OSError:
+        socketConnection.close()
+        return
+    if not getattr(socketConnection, 'keepAlive', False):
+        socketConnection.close()
+
+
+def socketCommand(socketConnection, session: webSocket, isActive, command, message):
+    """
+    applying the command received by the websocket of an app page, the websocket is closed (policy violation) if its
+    app is not the active app any more (the page must be reloaded to activate it again)
+    :param socketConnection: the socket connection handler
+    :param session: the websocket session
+    :param isActive: function() returning True if the page's app is active (isMainApp, isDoorApp)
+    :param command: function(choice) applying the command (mainAppCommand, doorAppCommand)
+    :param message: the received text message (the choice)
+    :return: None
+    """
+    if not isActive():
+        session.close(socketConnection, CLOSE_POLICY)
+        return
+    command(message if isinstance(message, str) else '')
+
+
+def pushStateDelta(socketConnection, session: webSocket, value: str):
+    """
+    sending the json of the state fields changed since the last message of the websocket (with the version), the
+    first message has all the fields, the json items are formatted once per version (stateResponses), so every
+    websocket only compares them
+    :param socketConnection: the socket connection handler
+    :param session: the websocket session (session.last => the items of the last sent message)
+    :param value: the published state channel value (not used, the items are read from the cache)
+    :return: None
+    """
+    items = stateResponses()[6]
+    last = session.last or ()
+    changes = [item for index, item in enumerate(items) if index and (index >= len(last) or last[index] != item)]
+    if changes:
+        session.last = items
+        session.send(socketConnection, '{%s}' % ','.join('"%s":%s' % item for item in (items[0],) + tuple(changes)))
+
+
+def countNumber(source: str, delta: int):
+    """
+    adding delta to the current number (wrapping around in the lcd range -999 ... 9999) and recording the change
+    :param source: the event source (buttons, mainApp)
+    :param delta: +1 increment, -1 decrement
+    :return: None
+    """
+    history.record(source, delta, state.add('currentNumber', delta, -999, 9999, wrap=True))
+
+
+def resetNumber(source: str, name: str):
+    """
+    setting the number field of the state to 0 and recording the change (compare and set, so the recorded delta is
+    the real change even if another thread changes the number at the same time)
+    :param source: the event source (buttons, mainApp, doorApp)
+    :param name: the number field (currentNumber, clientsNumber)
+    :return: None
+    """
+    while True:
+        before = getattr(state, name)
+        if state.compareAndSet(name, before, 0):
+            break
+    if before:
+        history.record(source, -before, 0)
+
+
 def sendResponse(socketConnection, response, statusCode: int = 200, statusMsg: str = 'OK',
                  contentType: str = 'text/html'):
     """
     =------------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
     this function sends the response back to the client.
+    encoding the response passed to it as parameter to bytes to know its length
     sending http type to the client with status code (200 for nice response) with status message (OK for nice resp.)
     sending the content type for the client to make the client detect the type of returned data
-    sending connection type (close or keep-alive)
-    sending the response passed to it as parameter to the client after encoding it to bytes
-    then closing the connection with the client either there's a problem with send or not
+    sending the content length so the client knows where the response ends without closing the connection
+    sending connection type (close or keep-alive), the server decides it from the request (socketConnection.keepAlive)
+    the headers and the encoded response are sent with one sendall
+        keep-alive => the connection stays open for the next request (no new tcp handshake for every js poll)
+        close => closing the connection with the client either there's a problem with send or not
     =------------------------------------------------------------------------------------------------------------------=
     :param socketConnection: the socket connection handler
     :param response: the response which will be send to the client
@@ -297,15 +752,125 @@ def sendResponse(socketConnection, response, statusCode: int = 200, statusMsg: s
     :param contentType:  the http response type
     :return: None
     """
+    keepAlive = getattr(socketConnection, 'keepAlive', False)
     try:
-        socketConnection.send('HTTP/1.1 %s %s\n' % (statusCode, statusMsg))
-        socketConnection.send('Content-Type: %s\n' % contentType)
-        socketConnection.send('Connection: close\n\n')
+        response = (response if isinstance(response, str) else str(response)).encode('utf-8', 'ignore')
         # using send all here because send takes amount of the data until the buffer is filled only
-        socketConnection.sendall((response if isinstance(response, str) else str(response)).encode('utf-8', 'ignore'))
+        # the headers and the response are sent as one buffer
+        socketConnection.sendall(responseHeaders(statusCode, statusMsg, contentType, len(response), keepAlive)
+                                 + response)
+    except OSError:
+        keepAlive = False
+    finally:
+        if not keepAlive:
+            socketConnection.close()
+
+
+def responseHeaders(statusCode: int, statusMsg: str, contentType: str, contentLength: int, keepAlive: bool):
+    """
+    :param contentLength: the body length, None => chunked transfer encoding, -1 => unknown (ended by closing)
+    :return: the encoded response status line and headers (ended by the empty line)
+    """
+    if contentLength is None:
+        length = 'Transfer-Encoding: chunked\r\n'
+    else:
+        length = 'Content-Length: %s\r\n' % contentLength if contentLength >= 0 else ''
+    return ('HTTP/1.1 %s %s\r\nContent-Type: %s\r\n%sConnection: %s\r\n\r\n'
+            % (statusCode, statusMsg, contentType, length, 'keep-alive' if keepAlive else 'close')).encode()
+
+
+def sendTemplate(socketConnection, page: pageTemplate, values: dict, contentType: str = 'text/html'):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function renders the compiled template directly to the client
+    formatting only the template values (the static chunks are encoded at load time)
+    sending the headers with the content length (static chunks length + formatted values length)
+    then sending the static chunks and the values in order, so the full page is never built as one string
+    then closing the connection if it's not kept alive
+    =------------------------------------------------------------------------------------------------------------------=
+    :param socketConnection: the socket connection handler
+    :param page: the compiled template
+    :param values: the template values by their names
+    :param contentType: the http response type
+    :return: None
+    """
+    keepAlive = getattr(socketConnection, 'keepAlive', False)
+    try:
+        formatted = page.format(values)
+        socketConnection.sendall(responseHeaders(200, 'OK', contentType, page.length(formatted), keepAlive))
+        page.write(socketConnection, formatted)
     except OSError:
-        pass
+        keepAlive = False
     finally:
+        if not keepAlive:
+            socketConnection.close()
+
+
+def sendStream(socketConnection, request: httpRequest, rows, contentType: str):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function streams the generated rows to the client, the rows are formatted only when the connection's output
+    buffer is empty (rowReader), so the full response is never built in ram
+    the length is unknown before streaming, so HTTP/1.1 clients get chunked transfer encoding (the connection can be
+    kept alive), and the HTTP/1.0 clients get the rows until the connection is closed
+    =------------------------------------------------------------------------------------------------------------------=
+    :param socketConnection: the socket connection handler
+    :param request: the parsed request (its http version)
+    :param rows: generator of the text rows
+    :param contentType: the http response type
+    :return: None
+    """
+    chunked = request.version == 'HTTP/1.1'
+    keepAlive = chunked and getattr(socketConnection, 'keepAlive', False)
+    try:
+        socketConnection.sendall(responseHeaders(200, 'OK', contentType, None if chunked else -1, keepAlive))
+        socketConnection.sendstream(chunkedStream(rowReader(rows)) if chunked else rowReader(rows))
+    except OSError:
+        keepAlive = False
+    finally:
+        if not keepAlive:
+            socketConnection.close()
+
+
+def sendCachedResponse(socketConnection, selector: str):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function sends the prebuilt response headers of a static page back to the client with one sendall
+    (no formatting or encoding per request) then the page file is streamed from flash
+    the headers of the page (and its '.gz' file) are built at its first request (STATIC_PAGES)
+    if the client accepts gzip encoding and the page was compressed by the build step then the '.gz' file is sent
+    if the client sent (If-None-Match) with the same etag of the page then it has the same copy of the page,
+    so sending the prebuilt (304 not modified) response without the body
+    then closing the connection if it's not kept alive
+    =------------------------------------------------------------------------------------------------------------------=
+    :param socketConnection: the socket connection handler
+    :param selector: the key of the page in responseCache (index, settings, styleSheet)
+    :return: None
+    """
+    if selector not in responseCache:  # the first request of the page
+        fileName, contentType, cacheControl = STATIC_PAGES[selector]
+        responseCache[selector + '.gz'] = prebuildResponse(fileName + '.gz', contentType, cacheControl, 'gzip') \
+            if fileExists(fileName + '.gz') else None
+        responseCache[selector] = prebuildResponse(fileName, contentType, cacheControl)
+        bootStage('loaded ' + fileName)
+    headers = getattr(socketConnection, 'headers', {})
+    if 'gzip' in headers.get('accept-encoding', '') and responseCache[selector + '.gz']:
+        selector += '.gz'
+    etag, response, notModified, path = responseCache[selector]
+    ifNoneMatch = headers.get('if-none-match', '')
+    try:
+        if ifNoneMatch == '*' or etag in ifNoneMatch:
+            socketConnection.sendall(notModified)
+        else:
+            socketConnection.sendall(response)
+            socketConnection.sendfile(path)
+    except OSError:
+        socketConnection.close()
+        return
+    if not getattr(socketConnection, 'keepAlive', False):
         socketConnection.close()
 
 
@@ -314,40 +879,39 @@ def mainApp():
     =------------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
     this function runs the main app handler
-    reading the data from mcu GPIO pin (push buttons)
+    waiting for the push buttons events (buttons.wait), the loop sleeps until a button changes or a held button repeats
+    so a press is never missed (the pin interrupt saves it) and holding increment or decrement speeds up
     checking if reset button if pressed (highest priority), so if it's pressed then current number must become 0
-    but what if reset button is pressed with other button then due to the highest priority the other 2 buttons must be
-    set to 1 so if they are not set.
-    the variable addition is used to save increment, and decrement value and to handle if both are pressed at same time.
-        if increment and decrement pressed then (not 0 - not 0) = 1 - 1 => so no increments or decrements will occur
-        if increment pressed and decrement is not then (not 0 - not 1) = 1 - 0 => so increment will occur
-        if increment is not pressed and decrement is pressed then (not 1 - not 0) = 0 - 1 => so decrement will occur
-        if both are not pressed then (not 1 - not 1) = 0 - 0 => so no increments or decrements will occur
+    and the increment and decrement events are ignored while reset is held.
+    if increment and decrement are held together their repeats cancel each other
+    the number is changed under the state lock (a post request can change it at the same time) and the state publishes
+    every change to the web clients
     we compare the last captured number and the current number if they are not equal this should give output to lcd
-    and set the last captured number to the current captured number, so the lcd doesn't keep printing the msg.
-    then the function will sleep for 250 milli-seconds so we remove bouncing effect + high increment in one press
+    and set the last captured number to the current captured number,
+    so the lcd doesn't keep printing the msg.
     =------------------------------------------------------------------------------------------------------------------=
-    :var data: global variable, used to save the values read from the pins of mcu
-    :var currentNumber: global variable, used to record the current number
+    :var buttons: global variable, used to read the debounced events of the push buttons
+    :var state: global variable, used to record the current number (changed under its lock)
     :var oldNumber: global variable, used to record the last record of current number
-    :var addition:  local variable, used to save the value of (inc, dec) push buttons
+    :var events:  local variable, used to save the fired buttons (a held button appears once for every repeat)
     :return: None
     """
-    global data, currentNumber, oldNumber
-    data = dict((name, value.value()) for (name, value) in pins.items())
-    if data['reset'] == 0x00:
-        currentNumber = 0x00
-        data['increment'] = 0x01
-        data['decrement'] = 0x01
-    addition = (not data['increment']) - (not data['decrement'])
-    currentNumber += addition
-    currentNumber = -999 if currentNumber > 9999 else currentNumber
-    currentNumber = 9999 if currentNumber < -999 else currentNumber
+    global oldNumber
+    events = buttons.wait()
+    started = ticks_us() if metrics else 0
+    for event in events:
+        if event == 'reset' or buttons.isPressed('reset'):
+            resetNumber('buttons', 'currentNumber')
+        elif event == 'increment':
+            countNumber('buttons', 1)
+        elif event == 'decrement':
+            countNumber('buttons', -1)
 
+    currentNumber = state.currentNumber
     if currentNumber != oldNumber:
         oldNumber = currentNumber
-        lcd.writeString('current Num:' + str(currentNumber)) if lcd else None
-    sleep_ms(250)
+        display.post('counter', 'current Num:' + str(currentNumber)) if display else None
+    metrics.observe(mainAppMetric, ticks_diff(ticks_us(), started)) if metrics else None
 
 
 def doorApp():
@@ -355,34 +919,57 @@ def doorApp():
     =------------------------------------------------------------------------------------------------------------------=
                                         *specifications and requirements*
     this function run the door app handler
-    reading the ultrasonic distance and saving it
-    checking if the number of clients < max clients number (door request to enter is not rejected [code: 0x02])
-    if door status is not rejected then it measures the distance from ultra sonic as ultra sonic reads distance up to 4m
-    so we need to detect if there's a real client or not; so we made the max distance between ultrasonic and the client
-    should be less than 16 cms.
+    updating the doors ultrasonics by the ping scheduler (doorScheduler.update), only one ultrasonic pings at a time
+    (so one door doesn't hear the echo of another), it adds the echo of the active ultrasonic to its filter and pings
+    the next one without waiting for the echo, then saving the filtered distance of the active door
+    every door has its own request, 0x01 while a client is present in-front of its ultrasonic, the presence is filtered
+    (median and ema of the echoes) with hysteresis (present under 16 cms, absent over 22 cms) and dwell times, so a
+    bee has moved in-front of ultrasonic or a bad echo doesn't make a request
+    the door request is 0x01 if any door requests (all the doors share the same clients number and max clients number)
     then comparing the last captured door request by the current captured door request
-    if they are not equal then we need to write this to the lcd, this to not to make the lcd keep writing the values
+    if they are not equal then we need to write this to the lcd (and save it to the state, which publishes it),
+    this to not to make the lcd keep writing the values
+    a rejected state (set by an enter or exit command) is replaced by the current door request REJECTED_MS after it
+    was set (as the old loop's next reading did), so it doesn't stay until the next client at the door
     then settings the last captured door request to the current captured door request.
-    then sleeping 250 millis-seconds to remove errors like a bee has moved in-front of ultrasonic
+    then sleeping until the end of the echo or the next ping (doorScheduler.wait, the echo interrupt wakes the loop)
     =------------------------------------------------------------------------------------------------------------------=
-    :var currentDistanceUSonic1: the distance measured by the ultrasonic
-    :var doorRequest: the current door request
+    :var doorDistances: the filtered distances measured by the ultrasonics
+    :var doorRequests: the request of every door
+    :var doorRequest: local variable, the current door request (saved to the state when it changes)
     :var lastDoorRequest: the last read door request
+    :var rejectedAt: the time the last enter or exit was rejected
+    :var rejectedEnded: local variable, True if the rejected state is shown for REJECTED_MS (replaced by the reading)
+    :var changed: local variable, the index of the door whose presence changed (None if no door changed)
+    :var message: local variable, the door state shown on the lcd
     :return: None
     """
-    global currentDistanceUSonic1, doorRequest, lastDoorRequest
-    currentDistanceUSonic1 = int(uSonic1.readDistance())
+    global lastDoorRequest
+    started = ticks_us() if metrics else 0
+    changed = doorScheduler.update()
+    active = doorScheduler.active
+    doorDistances[active] = int(doorSensors[active].readDistance())
+    if changed is not None:
+        doorRequests[changed] = 0x01 if doorSensors[changed].present() else 0x00
+        # recording the client arriving (+1) or leaving (-1) the door with the number of the requesting doors
+        history.record('sensor', 1 if doorRequests[changed] else -1, doorRequests.count(0x01))
 
-    if currentDistanceUSonic1 < 16:
+    if 0x01 in doorRequests:
         doorRequest = 0x01
     else:
         doorRequest = 0x00
 
-    if lastDoorRequest != doorRequest:
-        lcd.writeString(doorStates[doorRequest]) if lcd else None
+    rejectedEnded = state.doorRequest == 0x02 and ticks_diff(ticks_ms(), rejectedAt) >= REJECTED_MS
+    if lastDoorRequest != doorRequest or rejectedEnded:
+        state.set(doorRequest=doorRequest)  # the state publishes it to the web clients
+        message = doorStates[doorRequest]
+        if doorRequest == 0x01 and len(doorSensors) > 1:
+            message += ' door %s' % (doorRequests.index(0x01) + 1)  # showing the (first) requesting door
+        display.post('door', message) if display else None
         lastDoorRequest = doorRequest
 
-    sleep_ms(250)
+    metrics.observe(doorAppMetric, ticks_diff(ticks_us(), started)) if metrics else None
+    doorScheduler.wait()
 
 
 def loop():
@@ -390,22 +977,103 @@ def loop():
     =------------------------------------------------------------------------------------------------------------------=
                                         *specifications and requirements*
     this function runs the main loop to make the system handling all hardware changes for the two apps.
+    the lcd messages are posted to the display writer thread, so the loop never waits for the lcd
     the 250 millis-seconds sleep in this function is for making (waiting...) appears for the user
     =------------------------------------------------------------------------------------------------------------------=
     :return: None
     """
     while True:
+        activeApp = state.activeApp
         if activeApp == 'mainApp':
             mainApp()
         elif activeApp == 'doorApp':
             doorApp()
         else:
-            lcd.writeString('waiting...') if lcd else None
+            display.post('status', 'waiting...') if display else None
             sleep_ms(250)
 
 
+def collectGarbage():
+    """
+    collecting the garbage, observing the collection time and the freed heap bytes (heap counters of micropython)
+    :return: None
+    """
+    free = mem_free() if mem_free else 0
+    started = ticks_us()
+    collect()
+    metrics.observe(gcMetric, ticks_diff(ticks_us(), started))
+    metrics.observe(gcFreedMetric, mem_free() - free) if mem_free else None
+
+
+def metricsLog():
+    """
+    the metrics thread function, printing the metrics summary line every METRICS_LOG_MS (after a measured collection)
+    :return: None
+    """
+    while True:
+        sleep_ms(METRICS_LOG_MS)
+        collectGarbage()
+        print('metrics', metrics.summary())
+
+
+def startPeers():
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    creating the venue counter with the restored clients number and starting the peer sync thread
+    every change of the clients number is set to the own entry of the venue counter (a state listener), it's sent
+    to the peers at once or with the next batch (peerSync.setLocal)
+    =------------------------------------------------------------------------------------------------------------------=
+    :var venue: global variable, the venue counter
+    :return: None
+    """
+    global venue
+    venue = venueCounter(NODE_ID, state.maxClientsNumber)
+    venue.setLocal(state.clientsNumber)
+    sync = peerSync(venue, PEER_PORT, PEERS, onAdopt=venueAdopted, metrics=metrics)
+    state.listen(lambda changedState: sync.setLocal(changedState.clientsNumber))
+    _thread.start_new_thread(sync.run, ())
+
+
+def venueAdopted(maxClients: int, reset: bool):
+    """
+    applying the epoch of another unit (called by the sync thread): its max clients number, and resetting the
+    clients number if the venue was reset (not if the unit is joining after its boot)
+    :param maxClients: the max clients number of the venue
+    :param reset: True if the venue was reset
+    :return: None
+    """
+    if reset:
+        resetNumber('doorApp', 'clientsNumber')
+    state.set(maxClientsNumber=min(maxClients, MAX_CLIENTS_LIMIT))
+
+
+def start(port: int = 80):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    starting the system threads (called when the app runs on the mcu, and by the simulator after it wires the
+    virtual devices)
+    the threads that don't need the network (display, journal) and the buttons interrupts start first, then the
+    access point is activated (its wait sleeps, so they run meanwhile), then the loop and the server start as soon
+    as the interface is up (with the peer sync thread if the unit has PEERS)
+    the templates and the static pages headers are loaded at their first request (not at boot)
+    =------------------------------------------------------------------------------------------------------------------=
+    :param port: the server port
+    :return: None
+    """
+    _thread.start_new_thread(display.run, ()) if display else None  # writing to the lcd
+    display.post('status', 'Creating AP....') if display else None
+    buttons.attach()  # the buttons edges are saved by their interrupts from now on
+    _thread.start_new_thread(journal.run, (state,))  # saving the counts to the flash
+    _thread.start_new_thread(metricsLog, ()) if metrics else None  # printing the metrics line
+    bootStage('threads')
+    host = generateAp(wifiName, wifiPassword, maxClients=16)
+    bootStage('access point')
+    startPeers() if PEERS else None  # sharing the clients number with the other units of the venue
+    _thread.start_new_thread(loop, ())  # creating a thread so we don't use interrupt
+    _thread.start_new_thread(createServer, (host, port))  # creating a thread so we don't use interrupt
+
+
 if __name__ == '__main__':  # checking if the app is running or imported
-    lcd.writeString('Creating AP....') if lcd else None
-    generateAp(wifiName, wifiPassword, maxClients=16)
-    loopThread = _thread.start_new_thread(loop, ())  # creating a thread so we don't use interrupt
-    serverThread = _thread.start_new_thread(createServer, ())  # creating a thread so we don't use interrupt
+    start()
@@ -0,0 +1,23 @@
+# micropython frozen modules manifest, the firmware is built with the app modules as frozen bytecode (compiled by
+# mpy-cross at build time), so they're run from flash without compiling them at boot or loading their code to ram:
+#     make -C ports/esp32 BOARD=ESP32_GENERIC FROZEN_MANIFEST=/path/to/esp32_counterSystem/manifest.py
+# the frozen main runs at boot when the filesystem has no main.py (delete it after flashing the frozen firmware)
+# the web assets (html, css and the '.gz' files of tools/build.py) stay on the filesystem, they're streamed from flash
+include("$(PORT_DIR)/boards/manifest.py")
+
+module("main.py")
+module("buttons.py")
+module("display.py")
+module("eventlog.py")
+module("httpparser.py")
+module("journal.py")
+module("lcd.py")
+module("metrics.py")
+module("peersync.py")
+module("router.py")
+module("state.py")
+module("template.py")
+module("ultrasonic.py")
+module("webserver.py")
+module("websocket.py")
+package("hal", files=("__init__.py", "mcu.py"))
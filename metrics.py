@@ -0,0 +1,169 @@
+from array import array
+
+LATENCY_BOUNDS_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+BYTES_BOUNDS = (256, 1024, 4096, 16384, 65536)
+WRAP = 0x3FFFFFFF  # the counters wrap at 2**30, so they stay small ints (no heap allocation on micropython)
+
+
+class metricsRegistry:
+    def __init__(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class saves the counters and the histograms of the hot paths (server, loop, lcd, gc) in preallocated
+        arrays, every metric is registered at boot (counter, histogram) and updated by its index, so counting and
+        observing never allocate (no new objects, the values stay small ints)
+        a histogram has fixed buckets (bounds, the last bucket is +Inf), its observation count and its sum, the sum is
+        saved as whole units and the remainder (ex: seconds and micro-seconds), so it never wraps
+        the counters wrap at 2**30 (prometheus sees the wrap as a counter reset)
+        every metric is updated by one thread only (the thread owning the hot path), so no lock is needed, a reader
+        may see a histogram in the middle of an update (one observation off)
+        the gauges and the collectors are read when the metrics are rendered (nothing is saved)
+        the metrics are switched off by not creating the registry, the hot paths check (metrics is None) only
+            render   => the prometheus text exposition of all the metrics (/metrics)
+            summary  => one compact log line, the histograms are summarized since the last summary
+        =--------------------------------------------------------------------------------------------------------------=
+        """
+        self.counters = []          # used to save (name, help) of every counter
+        self.counts = array('L')    # the counter values
+        self.histograms = []        # used to save (name, help, bounds, labels, scale, first bucket) of every histogram
+        self.buckets = array('L')   # the bucket counts of all the histograms (len(bounds) + 1 for every histogram)
+        self.totals = array('L')    # the observation count of every histogram
+        self.wholes = array('L')    # the whole units of the sum of every histogram (ex: seconds)
+        self.parts = array('L')     # the remainder of the sum of every histogram (ex: micro-seconds below one second)
+        self.gauges = []            # used to save (name, help, read) of every gauge, read() returns its value
+        self.collectors = []        # used to save (prefix, read) of every collector, read() returns a dict of gauges
+        self.lastBuckets = array('L')   # the bucket counts at the last summary
+        self.lastTotals = array('L')    # the observation counts at the last summary
+
+    def counter(self, name: str, help: str):
+        """
+        :param name: the prometheus metric name (ex: http_requests_total)
+        :param help: the metric description
+        :return: the counter index (used by count)
+        """
+        self.counters.append((name, help))
+        self.counts.append(0)
+        return len(self.counters) - 1
+
+    def histogram(self, name: str, help: str, bounds: tuple = LATENCY_BOUNDS_US, scale: int = 1000000):
+        """
+        :param name: the prometheus metric name (ex: http_parse_seconds)
+        :param help: the metric description
+        :param bounds: the upper bounds of the buckets in the observed unit (ex: micro-seconds), sorted
+        :param scale: the observed values in one reported unit (1000000 => micro-seconds reported as seconds)
+        :return: the histogram index (used by observe)
+        """
+        labels = tuple('%g' % (bound / scale) for bound in bounds) + ('+Inf',)
+        self.histograms.append((name, help, bounds, labels, scale, len(self.buckets)))
+        for index in range(len(labels)):
+            self.buckets.append(0)
+            self.lastBuckets.append(0)
+        for values in (self.totals, self.wholes, self.parts, self.lastTotals):
+            values.append(0)
+        return len(self.histograms) - 1
+
+    def gauge(self, name: str, help: str, read):
+        """
+        :param read: function() returning the gauge value (called when rendering)
+        """
+        self.gauges.append((name, help, read))
+
+    def collector(self, prefix: str, read):
+        """
+        :param prefix: the prefix of the gauge names (ex: lcd => lcd_written)
+        :param read: function() returning a dict of the gauge values by their names (ex: displayWriter.metrics)
+        """
+        self.collectors.append((prefix, read))
+
+    def count(self, index: int, amount: int = 1):
+        self.counts[index] = (self.counts[index] + amount) & WRAP
+
+    def observe(self, index: int, value: int):
+        """
+        adding the value to its bucket, the observation count and the sum of the histogram
+        :param index: the histogram index
+        :param value: the observed value (ex: micro-seconds)
+        :return: None
+        """
+        name, help, bounds, labels, scale, first = self.histograms[index]
+        bucket = first
+        for bound in bounds:
+            if value <= bound:
+                break
+            bucket += 1
+        self.buckets[bucket] = (self.buckets[bucket] + 1) & WRAP
+        self.totals[index] = (self.totals[index] + 1) & WRAP
+        part = self.parts[index] + max(value, 0)
+        if part >= scale:
+            self.wholes[index] = (self.wholes[index] + part // scale) & WRAP
+            part %= scale
+        self.parts[index] = part
+
+    def render(self):
+        """
+        :return: the prometheus text exposition (version 0.0.4) of the counters, histograms, gauges and collectors
+        """
+        lines = []
+        for index, (name, help) in enumerate(self.counters):
+            lines.append('# HELP %s %s\n# TYPE %s counter\n%s %d' % (name, help, name, name, self.counts[index]))
+        for index, (name, help, bounds, labels, scale, first) in enumerate(self.histograms):
+            lines.append('# HELP %s %s\n# TYPE %s histogram' % (name, help, name))
+            cumulative = 0
+            for bucket, label in enumerate(labels):
+                cumulative += self.buckets[first + bucket]
+                lines.append('%s_bucket{le="%s"} %d' % (name, label, cumulative))
+            lines.append('%s_sum %s\n%s_count %d' % (name, repr(self.wholes[index] + self.parts[index] / scale), name,
+                                                     self.totals[index]))
+        gauges = [(name, help, read()) for name, help, read in self.gauges]
+        for prefix, read in self.collectors:
+            gauges.extend(('%s_%s' % (prefix, key), '%s %s' % (prefix, key), value)
+                          for key, value in sorted(read().items()))
+        for name, help, value in gauges:
+            lines.append('# HELP %s %s\n# TYPE %s gauge\n%s %s' % (name, help, name, name, value))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def summary(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        one compact log line of the metrics:
+            counters   => name=value (since the boot)
+            histograms => name=count/p50/p99 of the observations since the last summary (the quantiles are the upper
+                          bounds of their buckets in the observed unit, ex: micro-seconds, '>' if over the last bound)
+            gauges     => name=value
+        the histograms without observations since the last summary are not shown
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: str
+        """
+        parts = ['%s=%d' % (name, self.counts[index]) for index, (name, help) in enumerate(self.counters)]
+        for index, (name, help, bounds, labels, scale, first) in enumerate(self.histograms):
+            total = (self.totals[index] - self.lastTotals[index]) & WRAP
+            self.lastTotals[index] = self.totals[index]
+            deltas = []
+            for bucket in range(first, first + len(labels)):
+                deltas.append((self.buckets[bucket] - self.lastBuckets[bucket]) & WRAP)
+                self.lastBuckets[bucket] = self.buckets[bucket]
+            if total:
+                parts.append('%s=%d/%s/%s' % (name, total, quantileBound(deltas, bounds, total, 0.5),
+                                              quantileBound(deltas, bounds, total, 0.99)))
+        parts.extend('%s=%s' % (name, read()) for name, help, read in self.gauges)
+        return ' '.join(parts)
+
+
+def quantileBound(deltas: list, bounds: tuple, total: int, fraction: float):
+    """
+    :param deltas: the observation count of every bucket (the last is +Inf)
+    :param bounds: the upper bounds of the buckets
+    :param total: the sum of the deltas
+    :param fraction: 0.5 => the median, 0.99 => p99
+    :return: the upper bound of the bucket holding the quantile ('>' + the last bound for the +Inf bucket)
+    """
+    rank = fraction * total
+    cumulative = 0
+    for index, count in enumerate(deltas):
+        cumulative += count
+        if cumulative >= rank and index < len(bounds):
+            return str(bounds[index])
+    return '>%s' % bounds[-1]
@@ -0,0 +1,290 @@
+import _thread
+
+from hal import usocket as socket, ustruct, ticks_ms, ticks_add, ticks_diff
+
+MAGIC = 0xC5            # the first byte of every packet (other udp packets on the port are ignored)
+HEADER_FORMAT = '<BHHHHB'   # magic, sender node, venue epoch, epoch owner node, max clients number, entries count
+ENTRY_FORMAT = '<HHIh'      # node, epoch, sequence number, clients number of the node
+HEADER_SIZE = ustruct.calcsize(HEADER_FORMAT)
+ENTRY_SIZE = ustruct.calcsize(ENTRY_FORMAT)
+MAX_ENTRIES = 32        # the max number of nodes in one packet (HEADER_SIZE + 32 * ENTRY_SIZE = 330 bytes)
+WAKE = b'\x00'          # the byte sent to the own port to wake the sync thread (not a venue packet, it's not merged)
+MAX_UINT16 = 0xFFFF     # the max of the epoch and the max clients number (uint16 in the packets)
+CLIENTS_RANGE = (-0x8000, 0x7FFF)   # the range of the clients number of a node (int16 in the packets)
+
+
+def bounded(value: int, minimum: int, maximum: int):
+    return min(max(value, minimum), maximum)
+
+
+class venueCounter:
+    def __init__(self, node: int, maxClients: int = 0):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class is the clients number of the venue shared by several units (nodes), a state based crdt:
+            every node owns one entry (epoch, sequence number, clients number), only the owner changes it, and every
+            change increments its sequence number
+            merging keeps the entry with the greater (epoch, sequence number) of every node, so the merge is
+            commutative, associative and idempotent (the packets can be lost, repeated or reordered)
+            the venue clients number is the sum of the entries of the current epoch
+        resetting the venue (or changing the max clients number) starts a new epoch owned by the node, the greater
+        (epoch, owner) wins, the nodes adopting a new epoch reset their own entry (the older entries count as 0)
+        a booting node (restored from its journal) joins the epoch of the first packet without resetting its entry
+        the decisions are local (no round trip per entry), so the nodes admitting at the same time can exceed the
+        max clients number by the entries made within the sync latency
+        the values are bounded to their packet fields when they're set (the max clients number and the epoch to
+        uint16, the clients number to int16), so packing never fails in the state listener or the sync thread
+        =--------------------------------------------------------------------------------------------------------------=
+        :param node: the node id (1 ... 65535, unique in the venue)
+        :param maxClients: the max clients number of the venue
+        """
+        self.node = node
+        self.lock = _thread.allocate_lock()     # used to guard the entries and the epoch between the threads
+        self.entries = dict()   # used to save [epoch, sequence number, clients number, ticks_ms of the update] by node
+        self.entries[node] = [0, 0, 0, ticks_ms()]
+        self.epoch = 0          # the venue epoch (incremented by every reset)
+        self.owner = 0          # the node that started the epoch
+        self.maxClients = bounded(maxClients, 0, MAX_UINT16)
+        self.joined = False     # set when the venue epoch is known (a packet is merged or the venue is reset)
+        self.dirty = False      # set when the own entry changed since it was sent
+
+    def setLocal(self, value: int):
+        """
+        :param value: the clients number of the node (admitted by its doors)
+        :return: True if the entry changed (it's sent with the next batch)
+        """
+        value = bounded(value, CLIENTS_RANGE[0], CLIENTS_RANGE[1])
+        with self.lock:
+            entry = self.entries[self.node]
+            if entry[2] == value and entry[0] == self.epoch:
+                return False
+            self.entries[self.node] = [self.epoch, entry[1] + 1, value, ticks_ms()]
+            self.dirty = True
+            return True
+
+    def reset(self, maxClients: int):
+        """
+        starting a new epoch of the venue (all the clients numbers are 0) with the max clients number
+        :param maxClients: the max clients number of the venue
+        :return: None
+        """
+        with self.lock:
+            self.epoch = min(self.epoch + 1, MAX_UINT16)
+            self.owner = self.node
+            self.maxClients = bounded(maxClients, 0, MAX_UINT16)
+            self.joined = True
+            self.entries[self.node] = [self.epoch, self.entries[self.node][1] + 1, 0, ticks_ms()]
+            self.dirty = True
+
+    def merge(self, packet):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        merging the received packet (the venue config and the entries of the nodes)
+            a greater (epoch, owner) => adopting the epoch and its max clients number, the own entry is reset to 0
+                                        (kept if the node didn't join yet) and sent again in the new epoch
+            a greater (epoch, sequence number) of a node => replacing its entry
+            the own entry with a greater sequence number (sent before a reboot) => the entry is sent again after it
+        =--------------------------------------------------------------------------------------------------------------=
+        :param packet: the received bytes
+        :return: (max clients number, reset) if the epoch was adopted, else None
+        :raise ValueError: if the packet isn't a venue packet
+        """
+        if len(packet) < HEADER_SIZE or packet[0] != MAGIC:
+            raise ValueError('not a venue packet')
+        magic, sender, epoch, owner, maxClients, count = ustruct.unpack_from(HEADER_FORMAT, packet, 0)
+        if len(packet) < HEADER_SIZE + count * ENTRY_SIZE:
+            raise ValueError('truncated venue packet')
+        adopted = None
+        now = ticks_ms()
+        with self.lock:
+            if (epoch, owner) > (self.epoch, self.owner):
+                own = self.entries[self.node]
+                adopted = (maxClients, self.joined)
+                self.epoch, self.owner, self.maxClients = epoch, owner, maxClients
+                self.entries[self.node] = [epoch, own[1] + 1, own[2] if not self.joined else 0, now]
+                self.dirty = True
+            self.joined = True
+            for index in range(count):
+                node, entryEpoch, sequence, value = ustruct.unpack_from(ENTRY_FORMAT, packet,
+                                                                        HEADER_SIZE + index * ENTRY_SIZE)
+                entry = self.entries.get(node)
+                if entry is not None and (entryEpoch, sequence) <= (entry[0], entry[1]):
+                    continue
+                if node == self.node:  # the own entry sent before a reboot, sending the current one after it
+                    self.entries[node] = [self.epoch, sequence + 1, entry[2], now]
+                    self.dirty = True
+                else:
+                    self.entries[node] = [entryEpoch, sequence, value, now]
+        return adopted
+
+    def packet(self, full: bool = False):
+        """
+        :param full: True => all the known entries (the anti-entropy heartbeat), False => the own entry (the delta)
+        :return: the packet bytes (the own entry is always first, at most MAX_ENTRIES entries)
+        """
+        with self.lock:
+            self.dirty = False
+            nodes = [self.node]
+            if full:
+                nodes.extend(node for node in self.entries if node != self.node)
+            nodes = nodes[:MAX_ENTRIES]
+            packet = bytearray(HEADER_SIZE + len(nodes) * ENTRY_SIZE)
+            ustruct.pack_into(HEADER_FORMAT, packet, 0, MAGIC, self.node, self.epoch, self.owner, self.maxClients,
+                              len(nodes))
+            for index, node in enumerate(nodes):
+                entry = self.entries[node]
+                ustruct.pack_into(ENTRY_FORMAT, packet, HEADER_SIZE + index * ENTRY_SIZE, node, entry[0], entry[1],
+                                  entry[2])
+        return packet
+
+    def total(self):
+        """
+        :return: the venue clients number (the sum of the entries of the current epoch)
+        """
+        with self.lock:
+            return sum(entry[2] for entry in self.entries.values() if entry[0] == self.epoch)
+
+    def others(self):
+        """
+        :return: the clients number of the other nodes (the venue clients number without the own entry)
+        """
+        with self.lock:
+            return sum(entry[2] for node, entry in self.entries.items()
+                       if entry[0] == self.epoch and node != self.node)
+
+    def json(self):
+        """
+        :return: the json text of the merged venue state (the coordinator view), every node with its entry and the
+                 time in ms since its last update
+        """
+        now = ticks_ms()
+        with self.lock:
+            nodes = ','.join('{"node":%s,"epoch":%s,"sequence":%s,"clientsNumber":%s,"ageMs":%s}'
+                             % (node, entry[0], entry[1], entry[2], ticks_diff(now, entry[3]))
+                             for node, entry in sorted(self.entries.items()))
+            total = sum(entry[2] for entry in self.entries.values() if entry[0] == self.epoch)
+            return '{"node":%s,"epoch":%s,"owner":%s,"maxClientsNumber":%s,"clientsNumber":%s,"nodes":[%s]}' \
+                   % (self.node, self.epoch, self.owner, self.maxClients, total, nodes)
+
+
+class peerSync:
+    def __init__(self, counter: venueCounter, port: int, peers, batchMs: int = 50, heartbeatMs: int = 1000,
+                 onAdopt=None, metrics=None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class exchanges the venue counter (venueCounter) with the peer units over udp from its own thread
+            the own entry is sent to every peer when it changes, at most once every batchMs, the changes made in
+            the batch are sent together as one delta packet of 20 bytes (so a single change is sent at once and a
+            burst of changes is coalesced)
+            only the sync thread sends (so the sent counters and metrics have one writer), setLocal (in the changing
+            thread) marks the entry and wakes the sync thread with one byte (WAKE) sent to its own port on the
+            loopback interface (one wake byte until the sync thread reads it)
+            all the known entries are sent every heartbeatMs (anti-entropy, so the lost packets are repaired and the
+            nodes learn the entries of the nodes they don't hear)
+            the received packets are merged, adopting a new epoch calls onAdopt(maxClients, reset)
+        the thread waits for the packets until the batch ends (at most batchMs, no busy waiting)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param counter: the venue counter
+        :param port: the udp port of the node
+        :param peers: list of (host, port) of the other nodes
+        :param batchMs: the min time in ms between two delta packets
+        :param heartbeatMs: the time in ms between two full packets
+        :param onAdopt: function(maxClients, reset) called when the epoch of another node is adopted
+        :param metrics: the metrics registry (metrics.metricsRegistry) updated by the sync thread (None => no metrics)
+        """
+        self.counter = counter
+        self.batchMs = batchMs
+        self.heartbeatMs = heartbeatMs
+        self.onAdopt = onAdopt
+        self.peers = [socket.getaddrinfo(host, peerPort)[0][-1] for host, peerPort in peers]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(socket.getaddrinfo('0.0.0.0', port)[0][-1])
+        self.sock.settimeout(batchMs / 1000)
+        self.wakeAddress = socket.getaddrinfo('127.0.0.1', port)[0][-1]
+        self.wakePending = False    # set when a wake byte is sent and not read yet by the sync thread
+        self.lastDelta = ticks_add(ticks_ms(), -batchMs)   # the time of the last delta packet
+        self.sent = 0           # the number of sent packets
+        self.received = 0       # the number of merged packets
+        self.rejected = 0       # the number of received packets that aren't venue packets
+        self.metrics = metrics
+        if metrics:
+            self.sentMetric = metrics.counter('peer_sent_bytes_total', 'the bytes sent to the peers')
+            self.receivedMetric = metrics.counter('peer_received_bytes_total', 'the bytes received from the peers')
+            self.rejectedMetric = metrics.counter('peer_rejected_packets_total', 'the received non venue packets')
+            metrics.gauge('venue_clients', 'the clients number of the venue', counter.total)
+            metrics.gauge('venue_nodes', 'the known nodes of the venue', lambda: len(counter.entries))
+
+    def setLocal(self, value: int):
+        """
+        setting the own clients number and waking the sync thread, it sends the delta now if no delta was sent in
+        the last batchMs (else with the batch)
+        :param value: the clients number of the node
+        :return: None
+        """
+        if self.counter.setLocal(value) and not self.wakePending:
+            self.wakePending = True
+            try:
+                self.sock.sendto(WAKE, self.wakeAddress)
+            except OSError:  # the sync thread sends the delta at the end of its wait (at most batchMs)
+                self.wakePending = False
+
+    def flush(self):
+        now = ticks_ms()
+        if self.counter.dirty and ticks_diff(now, self.lastDelta) >= self.batchMs:
+            self.send(False)
+            self.lastDelta = now
+
+    def send(self, full: bool):
+        packet = self.counter.packet(full)
+        for address in self.peers:
+            try:
+                self.sock.sendto(packet, address)
+                self.sent += 1
+                self.metrics.count(self.sentMetric, len(packet)) if self.metrics else None
+            except OSError:  # the peer network is down, the next heartbeat repairs it
+                pass
+
+    def receive(self, packet):
+        """
+        merging the received packet, calling onAdopt if its epoch was adopted
+        :param packet: the received bytes
+        :return: None
+        """
+        try:
+            adopted = self.counter.merge(packet)
+        except ValueError:
+            self.rejected += 1
+            self.metrics.count(self.rejectedMetric) if self.metrics else None
+            return
+        self.received += 1
+        self.metrics.count(self.receivedMetric, len(packet)) if self.metrics else None
+        if adopted and self.onAdopt:
+            self.onAdopt(*adopted)
+
+    def run(self):
+        """
+        the sync thread function, receiving and merging the packets, sending the deltas and the heartbeats
+        :return: None
+        """
+        lastFull = ticks_add(ticks_ms(), -self.heartbeatMs)
+        while True:
+            # waiting for the packets until the batch of the waiting changes ends (at most batchMs)
+            waitMs = self.batchMs - ticks_diff(ticks_ms(), self.lastDelta) if self.counter.dirty else self.batchMs
+            self.sock.settimeout(max(1, min(waitMs, self.batchMs)) / 1000)
+            try:
+                packet, address = self.sock.recvfrom(HEADER_SIZE + MAX_ENTRIES * ENTRY_SIZE)
+                if packet == WAKE:  # the own entry changed (setLocal)
+                    self.wakePending = False
+                else:
+                    self.receive(packet)
+            except OSError:  # timed out, nothing received
+                pass
+            now = ticks_ms()
+            if ticks_diff(now, lastFull) >= self.heartbeatMs:
+                self.send(True)
+                lastFull = now
+            else:
+                self.flush()
@@ -0,0 +1,81 @@
+class router:
+    def __init__(self, notFound=None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class dispatches the requests to their handlers by the requested path
+        the paths are saved in a dict (path => {method => [(guard, handler), ...]}), so resolving a path is one dict
+        lookup no matter how many routes are added
+        the requested path is normalized before the lookup (removing trailing (spaces, /, tabs, new lines) and lower
+        casing it, ex: /mainApp/ => mainapp)
+        every route may have:
+            methods => the request types it handles (None => any request type)
+            guard   => function() returning True if the route is allowed now (ex: the active app check)
+        the routes of the same path are checked in the order they are added, the first route with the request type
+        and a passing guard handles the request, else the notFound handler handles it
+        a HEAD request is handled by the GET routes (the web server sends only the headers of its response)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param notFound: function(connection, request) called if no route handles the request
+        """
+        self.routes = dict()    # used to save {path: {method or '*': [(guard, handler), ...]}}
+        self.notFound = notFound
+
+    def add(self, paths, handler, methods=None, guard=None):
+        """
+        :param paths: the normalized path or tuple of paths handled by the handler (ex: 'mainapp', 'mainapp/index.html')
+        :param handler: function(connection, request) handling the request
+        :param methods: tuple of the request types handled by the handler (None => any request type)
+        :param guard: function() returning True if the route is allowed now (None => always allowed)
+        :return: None
+        """
+        for path in ((paths,) if isinstance(paths, str) else paths):
+            methodRoutes = self.routes.setdefault(path, dict())
+            for method in (methods or ('*',)):
+                methodRoutes.setdefault(method, []).append((guard, handler))
+
+    def route(self, *paths, methods=None, guard=None):
+        """
+        decorator used to register the decorated function as the handler of the paths
+        :param paths: the normalized paths handled by the function
+        :param methods: tuple of the request types handled by the function (None => any request type)
+        :param guard: function() returning True if the route is allowed now (None => always allowed)
+        :return: the decorator
+        """
+        def register(handler):
+            self.add(paths, handler, methods, guard)
+            return handler
+        return register
+
+    def resolve(self, method: str, path: str):
+        """
+        :param method: the request type
+        :param path: the normalized path
+        :return: the handler of the first route allowed now, or None
+        """
+        methodRoutes = self.routes.get(path)
+        if methodRoutes is None:
+            return None
+        for routes in (methodRoutes.get(method), methodRoutes.get('*')):
+            for guard, handler in routes or ():
+                if guard is None or guard():
+                    return handler
+        return None
+
+    def dispatch(self, connection, request):
+        """
+        calling the handler of the request (or notFound if no route handles it)
+        :param connection: the client connection used to send the response
+        :param request: the parsed request (httpparser.httpRequest)
+        :return: None
+        """
+        method = 'GET' if request.method == 'HEAD' else request.method
+        handler = self.resolve(method, normalizePath(request.path)) or self.notFound
+        handler(connection, request)
+
+
+def normalizePath(path: str):
+    """
+    :param path: the requested path (ex: /mainApp/index.html/)
+    :return: the path without trailing (spaces, /, tabs, new lines) in lower case (ex: mainapp/index.html)
+    """
+    return path.strip('/\t\n ').lower()
@@ -0,0 +1,143 @@
+import _thread
+
+
+class appState:
+    __slots__ = ('lock', 'version', 'listeners', 'waiters', 'listenerErrors',
+                 'activeApp', 'currentNumber', 'clientsNumber', 'maxClientsNumber', 'doorRequest')
+    FIELDS = ('activeApp', 'currentNumber', 'clientsNumber', 'maxClientsNumber', 'doorRequest')
+
+    def __init__(self, **values):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class saves the state shared between the loop thread and the server thread (the slots are fixed, so
+        it's compact and a misspelled field raises AttributeError instead of creating a new global)
+        reading a field is one attribute read (atomic), every change is made under one lock:
+            set            => setting one or more fields
+            add            => adding to a number field in its range (wrapping around or refusing at the limits)
+            compareAndSet  => setting a field only if it still has the expected value
+        every change increments the version, then the listeners are called (in the changing thread, outside the lock)
+        and the threads waiting in wait() are woken up, a listener raising an exception is counted (listenerErrors)
+        and skipped, so it can't stop the other listeners or kill the changing thread
+        the listeners of changes made by different threads can run at the same time and finish in any order, so a
+        listener must read the state itself (not trust the order of its calls), as main.publishState does
+        =--------------------------------------------------------------------------------------------------------------=
+        :param values: the initial values of the fields (the missing fields are None)
+        """
+        self.lock = _thread.allocate_lock()
+        self.version = 0        # used to save the number of changes
+        self.listeners = []     # used to save the functions called after every change
+        self.waiters = []       # used to save the locks of the threads waiting for a change
+        self.listenerErrors = 0  # the number of exceptions raised by the listeners
+        for name in self.FIELDS:
+            setattr(self, name, values.get(name))
+
+    def snapshot(self):
+        """
+        :return: (version, dict of all the fields) read together under the lock
+        """
+        with self.lock:
+            return self.version, dict((name, getattr(self, name)) for name in self.FIELDS)
+
+    def set(self, **values):
+        """
+        :param values: the new values of the fields
+        :return: the version after the change (not incremented if no value changed)
+        """
+        with self.lock:
+            changed = False
+            for name, value in values.items():
+                if getattr(self, name) != value:
+                    setattr(self, name, value)
+                    changed = True
+            if not changed:
+                return self.version
+            waiters = self.changed()
+        return self.notify(waiters)
+
+    def add(self, name: str, delta: int, minimum: int = None, maximum: int = None, wrap: bool = False):
+        """
+        :param name: the number field name
+        :param delta: the number added to the field
+        :param minimum: the min value of the field (None => no min)
+        :param maximum: the max value of the field (None => no max)
+        :param wrap: True to wrap around at the limits (over the max => min, under the min => max)
+        :return: the new value, or None if it's out of the range and wrap is False (the field isn't changed)
+        """
+        with self.lock:
+            value = getattr(self, name) + delta
+            if (maximum is not None and value > maximum) or (minimum is not None and value < minimum):
+                if not wrap:
+                    return None
+                value = minimum if value > maximum else maximum
+            setattr(self, name, value)
+            waiters = self.changed()
+        self.notify(waiters)
+        return value
+
+    def compareAndSet(self, name: str, expected, value):
+        """
+        :param name: the field name
+        :param expected: the value the field must have
+        :param value: the new value
+        :return: True if the field had the expected value and it's set to the new value (the version isn't incremented
+                 and the listeners aren't called if the new value is the expected value, as set does)
+        """
+        with self.lock:
+            if getattr(self, name) != expected:
+                return False
+            if value == expected:
+                return True
+            setattr(self, name, value)
+            waiters = self.changed()
+        self.notify(waiters)
+        return True
+
+    def changed(self):
+        """
+        incrementing the version (called under the lock)
+        :return: the waiters locks to be released
+        """
+        self.version += 1
+        waiters = self.waiters
+        self.waiters = []
+        return waiters
+
+    def notify(self, waiters: list):
+        """
+        waking the waiting threads and calling the listeners (called outside the lock)
+        :param waiters: the waiters locks returned by changed
+        :return: the current version
+        """
+        for waiter in waiters:
+            waiter.release()
+        for listener in self.listeners:
+            try:
+                listener(self)
+            except Exception:
+                with self.lock:
+                    self.listenerErrors += 1
+        return self.version
+
+    def listen(self, listener):
+        """
+        :param listener: function(state) called after every change (in the changing thread, the listeners of two
+                         threads can run concurrently and out of order)
+        :return: None
+        """
+        self.listeners.append(listener)
+
+    def wait(self, version: int):
+        """
+        blocking the calling thread until the version is not the given version
+        :param version: the version known by the caller
+        :return: the current version
+        """
+        with self.lock:
+            if self.version != version:
+                return self.version
+            waiter = _thread.allocate_lock()
+            waiter.acquire()
+            self.waiters.append(waiter)
+        waiter.acquire()
+        return self.version
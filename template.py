@@ -0,0 +1,73 @@
+class pageTemplate:
+    def __init__(self, text: str):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class compiles a '%'-formatted page once (at load time) to a render plan:
+            chunks => the static parts of the page encoded to bytes (len(chunks) == len(slots) + 1)
+            slots  => (name, conversion) of every '%(name)s', '%(name)d' or '%(name)i' in the page
+        '%%' is compiled to '%' like the '%' operator, any other '%' format raises ValueError
+        rendering formats only the slot values, then the chunks and the values are written one by one to the writer,
+        so the full page is never built as one big string (page % values builds a new full page for every request)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param text: the page text
+        """
+        self.chunks = []    # used to save the static byte chunks of the page
+        self.slots = []     # used to save the (name, conversion) of the values between the chunks
+        chunk = []          # used to collect the parts of the current static chunk
+        position = 0
+        while True:
+            index = text.find('%', position)
+            if index < 0:
+                chunk.append(text[position:])
+                break
+            chunk.append(text[position:index])
+            if text.startswith('%%', index):
+                chunk.append('%')
+                position = index + 2
+                continue
+            end = text.find(')', index)
+            if not text.startswith('%(', index) or end < 0 or text[end + 1:end + 2] not in ('s', 'd', 'i'):
+                raise ValueError('unsupported format at %s' % index)
+            self.chunks.append(''.join(chunk).encode('utf-8'))
+            self.slots.append((text[index + 2:end], text[end + 1]))
+            chunk = []
+            position = end + 2
+        self.chunks.append(''.join(chunk).encode('utf-8'))
+        self.staticLength = sum(len(chunk) for chunk in self.chunks)  # used to know the page length without building it
+
+    def format(self, values: dict):
+        """
+        :param values: the values of the slots by their names
+        :return: list of the encoded slot values (in the slots order)
+        """
+        return [(str(values[name]) if conversion == 's' else '%d' % values[name]).encode('utf-8')
+                for name, conversion in self.slots]
+
+    def length(self, formatted: list):
+        """
+        :param formatted: the encoded slot values returned by format
+        :return: the rendered page length in bytes
+        """
+        return self.staticLength + sum(len(value) for value in formatted)
+
+    def write(self, writer, formatted: list):
+        """
+        writing the static chunks and the encoded slot values to the writer (socket or connection) in order
+        :param writer: any object with sendall(bytes)
+        :param formatted: the encoded slot values returned by format
+        :return: None
+        """
+        for index in range(len(formatted)):
+            writer.sendall(self.chunks[index])
+            writer.sendall(formatted[index])
+        writer.sendall(self.chunks[-1])
+
+    def render(self, values: dict):
+        """
+        :param values: the values of the slots by their names
+        :return: the full rendered page as bytes (used when the page is needed as one buffer)
+        """
+        formatted = self.format(values)
+        return b''.join(self.chunks[index // 2] if index % 2 == 0 else formatted[index // 2]
+                        for index in range(len(self.chunks) + len(formatted)))
@@ -0,0 +1,74 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+micro-benchmark of the page rendering (runs on CPython)
+comparing the old rendering (page % values then encoding the full page) with the compiled template
+(template.pageTemplate formatting only the values and writing the chunks to the socket)
+for every page and method it reports:
+    the render time per request in micro-seconds
+    the peak allocated bytes of one render (tracemalloc)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/benchTemplate.py [iterations]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from template import pageTemplate  # noqa: E402
+
+PAGES = (('mainAppIndex.html', dict(current_number=1234)),
+         ('doorAppIndex.html', dict(clients_number=3, door_state='request')))
+
+
+class nullWriter:
+    """ a writer that counts the written bytes only (like a socket that never blocks) """
+    def __init__(self):
+        self.written = 0
+
+    def sendall(self, data):
+        self.written += len(data)
+
+
+def renderFormat(text: str, values: dict, writer):
+    writer.sendall((text % values).encode('utf-8', 'ignore'))
+
+
+def renderTemplate(page: pageTemplate, values: dict, writer):
+    formatted = page.format(values)
+    page.length(formatted)
+    page.write(writer, formatted)
+
+
+def measure(render, source, values: dict, iterations: int):
+    writer = nullWriter()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render(source, values, writer)
+    elapsed = (time.perf_counter() - start) / iterations * 1E6
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    render(source, values, writer)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(iterations: int):
+    print('%-20s %-10s %12s %12s' % ('page', 'method', 'us/render', 'peak bytes'))
+    for fileName, values in PAGES:
+        with open(os.path.join(ROOT, fileName)) as reader:
+            text = reader.read()
+        page = pageTemplate(text)
+        for method, render, source in (('%', renderFormat, text), ('template', renderTemplate, page)):
+            elapsed, peak = measure(render, source, values, iterations)
+            print('%-20s %-10s %12.2f %12d' % (fileName, method, elapsed, peak))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
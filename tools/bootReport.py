@@ -0,0 +1,41 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+boot time breakdown of the firmware in the simulator (runs on CPython with the simulated hardware of hal.sim)
+importing main (the modules, the hardware, the state restored from the journal), starting the system (main.start)
+then requesting the first pages as a browser does after connecting to the access point
+it prints the boot stages of main (main.bootReport): the time of every stage since main started and its duration,
+the templates and the static pages are loaded at their first request, so they show up after the server started
+(on the mcu the same report is served by /api/boot)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/bootReport.py [port]
+"""
+import http.client
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+FIRST_PAGES = ('/', '/styleSheet.css', '/mainApp')
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8091
+    started = time.perf_counter()
+    import hal.sim  # noqa: E402
+    import main  # noqa: E402
+    for trig, echo in main.doorPins:
+        hal.sim.virtualUltrasonic(trig, echo)
+    main.start(port)
+    while not any(name == 'server listening' for name, at in main.bootStages):
+        time.sleep(0.001)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    for path in FIRST_PAGES:
+        connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+        connection.getresponse().read()
+    firstPage = (time.perf_counter() - started) * 1000
+    connection.close()
+    print(main.bootReport())
+    print('first pages served %.0f ms after the start (python start-up not included)' % firstPage)
@@ -0,0 +1,138 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+host-side build step of the web assets (runs on CPython, not on the mcu)
+minifying the html and css files (removing the indentation, the empty lines and the js line comments)
+    the new lines are kept, so the inline js doesn't change its meaning
+compressing the minified static files (index, settings, stylesheet) to '.gz' files, served with gzip encoding
+writing the minified templates (mainApp, doorApp) to '.min.html' files, they are formatted for every request so they
+can't be precompressed
+checking that the decompressed '.gz' files match the minified originals
+checking that the frozen modules manifest (manifest.py) has all the firmware modules
+compiling the firmware modules (not main.py, micropython runs it from source) to bytecode '.mpy' files (mpy-cross)
+in build/mpy, they're uploaded instead of the '.py' files so the mcu doesn't compile them at boot
+(the frozen firmware built with manifest.py doesn't need them)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/build.py [--check] [--mpy]
+    --check => only checking the existing build outputs, exits with 1 if any output is missing or doesn't match
+    --mpy   => compiling the modules too (needs the mpy-cross command or the mpy_cross package)
+"""
+import gzip
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_FILES = ('index.html', 'settings.html', 'styleSheet.css')
+TEMPLATE_FILES = ('mainAppIndex.html', 'doorAppIndex.html')
+FIRMWARE_MODULES = ('buttons.py', 'display.py', 'eventlog.py', 'httpparser.py', 'journal.py', 'lcd.py', 'metrics.py',
+                    'peersync.py', 'router.py', 'state.py', 'template.py', 'ultrasonic.py', 'webserver.py',
+                    'websocket.py', 'hal/__init__.py', 'hal/mcu.py')
+MPY_OUTPUT = os.path.join(ROOT, 'build', 'mpy')
+
+
+def minify(text: str):
+    """
+    :param text: the html, css text
+    :return: the text without css comments, indentation, empty lines and js line comments
+    """
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+def templatePath(fileName: str):
+    return os.path.join(ROOT, fileName[:-len('.html')] + '.min.html')
+
+
+def read(path: str, mode: str = 'r'):
+    with open(path, mode) as reader:
+        return reader.read()
+
+
+def build():
+    """
+    writing the build outputs next to the originals
+    :return: list of (output file name, original size, output size)
+    """
+    report = []
+    for fileName in STATIC_FILES:
+        original = read(os.path.join(ROOT, fileName), 'rb')
+        compressed = gzip.compress(minify(original.decode('utf-8')).encode('utf-8'), 9, mtime=0)  # reproducible
+        with open(os.path.join(ROOT, fileName + '.gz'), 'wb') as writer:
+            writer.write(compressed)
+        report.append((fileName + '.gz', len(original), len(compressed)))
+    for fileName in TEMPLATE_FILES:
+        original = read(os.path.join(ROOT, fileName))
+        minified = minify(original)
+        with open(templatePath(fileName), 'w') as writer:
+            writer.write(minified)
+        report.append((os.path.basename(templatePath(fileName)), len(original), len(minified)))
+    return report
+
+
+def check():
+    """
+    checking every build output against its original
+        '.gz' => decompressed bytes == minified original
+        '.min.html' => text == minified original and it has the same template keys
+    :return: list of the errors (empty if all outputs match)
+    """
+    errors = []
+    for fileName in STATIC_FILES:
+        path = os.path.join(ROOT, fileName + '.gz')
+        if not os.path.exists(path):
+            errors.append('%s is missing' % path)
+            continue
+        expected = minify(read(os.path.join(ROOT, fileName))).encode('utf-8')
+        if gzip.decompress(read(path, 'rb')) != expected:
+            errors.append('%s doesn\'t match %s' % (path, fileName))
+    for fileName in TEMPLATE_FILES:
+        path = templatePath(fileName)
+        if not os.path.exists(path):
+            errors.append('%s is missing' % path)
+            continue
+        original = read(os.path.join(ROOT, fileName))
+        minified = read(path)
+        if minified != minify(original) or re.findall(r'%\(\w+\)s', minified) != re.findall(r'%\(\w+\)s', original):
+            errors.append('%s doesn\'t match %s' % (path, fileName))
+    manifest = read(os.path.join(ROOT, 'manifest.py'))
+    for module in ('main.py',) + FIRMWARE_MODULES:
+        if os.path.basename(module) not in manifest:
+            errors.append('%s is not frozen by manifest.py' % module)
+    return errors
+
+
+def compileModules():
+    """
+    compiling the firmware modules to '.mpy' files in MPY_OUTPUT (keeping the packages directories)
+    :return: list of (output file name, source size, output size)
+    """
+    if shutil.which('mpy-cross'):
+        command = ['mpy-cross']
+    else:
+        try:
+            import mpy_cross  # noqa: F401
+        except ImportError:
+            raise SystemExit('error: mpy-cross is not installed (pip install mpy-cross)')
+        command = [sys.executable, '-m', 'mpy_cross']
+    report = []
+    for module in FIRMWARE_MODULES:
+        output = os.path.join(MPY_OUTPUT, module[:-len('.py')] + '.mpy')
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        subprocess.check_call(command + ['-o', output, '-s', module, os.path.join(ROOT, module)])
+        report.append((module[:-len('.py')] + '.mpy', os.path.getsize(os.path.join(ROOT, module)),
+                       os.path.getsize(output)))
+    return report
+
+
+if __name__ == '__main__':
+    if '--check' not in sys.argv:
+        for name, originalSize, outputSize in build() + (compileModules() if '--mpy' in sys.argv else []):
+            print('%-24s %6d => %6d bytes' % (name, originalSize, outputSize))
+    problems = check()
+    for problem in problems:
+        print('error: %s' % problem)
+    sys.exit(1 if problems else 0)
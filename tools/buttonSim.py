@@ -0,0 +1,189 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+host-side harness of the push buttons input (buttons.buttonInput) using simulated pins (runs on CPython)
+every scenario is a timeline of (time, button, level) pin changes (with contact bouncing), the simulated pins call
+the registered interrupt handlers, and the loop is simulated like buttonInput.wait (polling only after an edge or at
+the next deadline) with a milli-second clock
+for every scenario it reports and checks:
+    the fired events count of every button against the expected count
+    the loop wakeups (the old loop woke up every 250 ms)
+    the count the old 250 ms polling would read (sampling the pins every 250 ms)
+every scenario runs again with the ticks wrapping around in its middle, the ticks functions of buttons are replaced
+with the utime ones (wrapping at TICKS_PERIOD, a time out of the ticks range raises, as made by '+' on the ticks)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/buttonSim.py [seed]
+    exits with 1 if any scenario's counts don't match
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import buttons  # noqa: E402
+from buttons import buttonInput  # noqa: E402
+
+OLD_PERIOD = 250    # the old polling period of mainApp in milli-seconds
+TICKS_PERIOD = 1 << 30  # the utime ticks period of the esp32 port (ticks_ms wraps around to 0)
+
+
+class simulatedClock:
+    now = 0
+
+    def __call__(self):
+        return simulatedClock.now
+
+
+def checkedTicks(ticks: int):
+    if not 0 <= ticks < TICKS_PERIOD:
+        raise ValueError('%d is out of the ticks range' % ticks)
+    return ticks
+
+
+def ticksAdd(ticks: int, delta: int):
+    return (checkedTicks(ticks) + delta) % TICKS_PERIOD
+
+
+def ticksDiff(new: int, old: int):
+    return (checkedTicks(new) - checkedTicks(old) + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+
+class simulatedPin:
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    def __init__(self):
+        """ input pin with pull up (released => 1), calling the interrupt handler on every level change """
+        self.level = 1
+        self.handler = None
+
+    def value(self):
+        return self.level
+
+    def irq(self, trigger, handler):
+        self.handler = handler
+
+    def set(self, level: int):
+        if level != self.level:
+            self.level = level
+            if self.handler:
+                self.handler(self)
+
+
+def press(changes: list, name: str, start: int, duration: int, rng, bounces: int = 0):
+    """
+    adding one press (and its release) to the timeline, with bouncing edges after the press and after the release
+    :return: None
+    """
+    for at, level in ((start, 0), (start + duration, 1)):
+        changes.append((at, name, level))
+        for bounce in range(bounces):  # the contacts bounce within 5 ms then settle at the level
+            offset = rng.randint(0, 4)
+            changes.append((at + offset, name, 1 - level))
+            changes.append((at + offset, name, level))
+
+
+def holdCount(duration: int, input: buttonInput):
+    """
+    :return: the expected events of one held repeating button (the press + the repeats until the release)
+    """
+    count = 1
+    at = input.repeatDelayMs
+    repeats = 0
+    while at < duration:
+        count += 1
+        repeats += 1
+        at += input.repeatIntervalsMs[min(repeats // input.accelerateEvery, len(input.repeatIntervalsMs) - 1)]
+    return count
+
+
+def simulate(changes: list, end: int, start: int = 0):
+    """
+    replaying the timeline on new simulated pins
+    :param start: the ticks at the start of the timeline (the ticks wrap around at TICKS_PERIOD)
+    :return: (dict of the fired events count by button, the loop wakeups, dict of the old polling count by button)
+    """
+    pins = dict(increment=simulatedPin(), decrement=simulatedPin(), reset=simulatedPin())
+    input = buttonInput(pins, repeating=('increment', 'decrement'))
+    input.attach()
+    changes = sorted(changes, key=lambda change: change[0])
+    counts = dict((name, 0) for name in pins)
+    oldCounts = dict((name, 0) for name in pins)
+    wakeups = 0
+    position = 0
+    for at in range(end + 1):
+        now = simulatedClock.now = (start + at) % TICKS_PERIOD
+        while position < len(changes) and changes[position][0] == at:
+            pins[changes[position][1]].set(changes[position][2])
+            position += 1
+        if at % OLD_PERIOD == 0:
+            for name, pin in pins.items():
+                oldCounts[name] += pin.value() == 0
+        deadline = input.deadline(now)
+        if input.ready.acquire(0) or deadline == 0:  # woken by an edge or a deadline (as buttonInput.wait)
+            wakeups += 1
+            for event in input.poll(now):
+                counts[event] += 1
+    return counts, wakeups, oldCounts
+
+
+def scenarios(rng):
+    """
+    :return: list of (name, changes, end time, dict of the expected events count by button)
+    """
+    probe = buttonInput(dict())
+    result = []
+
+    changes = []
+    press(changes, 'increment', 100, 120, rng)
+    result.append(('one clean press', changes, 1000, dict(increment=1)))
+
+    changes = []
+    press(changes, 'increment', 110, 8, rng)
+    result.append(('8 ms tap', changes, 1000, dict(increment=1)))
+
+    changes = []
+    press(changes, 'decrement', 100, 150, rng, bounces=6)
+    result.append(('bouncing press', changes, 1000, dict(decrement=1)))
+
+    changes = []
+    for index in range(10):
+        press(changes, 'increment', 100 + index * 70, 35, rng, bounces=3)
+    result.append(('10 fast presses', changes, 1500, dict(increment=10)))
+
+    changes = []
+    press(changes, 'increment', 100, 3000, rng, bounces=3)
+    result.append(('3 s hold', changes, 4000, dict(increment=holdCount(3000, probe))))
+
+    changes = []
+    press(changes, 'reset', 100, 60, rng, bounces=40)  # more bounces than the edges ring size
+    result.append(('ring overflow', changes, 1000, dict(reset=1)))
+
+    changes = []
+    press(changes, 'increment', 100, 60, rng, bounces=2)
+    press(changes, 'decrement', 130, 60, rng, bounces=2)
+    press(changes, 'reset', 400, 30, rng, bounces=2)
+    result.append(('mixed buttons', changes, 1000, dict(increment=1, decrement=1, reset=1)))
+    return result
+
+
+if __name__ == '__main__':
+    buttons.ticks_ms = simulatedClock()
+    buttons.ticks_add = ticksAdd
+    buttons.ticks_diff = ticksDiff
+    rng = random.Random(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
+    failed = 0
+    print('%-18s %-40s %-40s %8s %8s' % ('scenario', 'events', 'old 250 ms polling', 'wakeups', 'old'))
+    for name, changes, end, expected in scenarios(rng):
+        expected = dict(dict(increment=0, decrement=0, reset=0), **expected)
+        for title, start in ((name, 0), (name[:12] + ' wrap', TICKS_PERIOD - end // 2)):
+            try:
+                counts, wakeups, oldCounts = simulate(changes, end, start)
+            except ValueError as error:
+                counts, wakeups, oldCounts = str(error), 0, {}
+            ok = counts == expected
+            failed += not ok
+            print('%-18s %-40s %-40s %8d %8d%s' % (title, counts, oldCounts, wakeups, end // OLD_PERIOD,
+                                                    '' if ok else '  FAILED expected %s' % expected))
+    sys.exit(1 if failed else 0)
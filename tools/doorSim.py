@@ -0,0 +1,166 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+simulation of several door ultrasonics (ultrasonic.ultraSonic) on simulated pins with a micro-second clock (CPython)
+every simulated sensor answers a ping with an echo pulse of its object distance (no echo over 400 cm), the sound of a
+ping stays in the air until its echo returns, so a sensor pinged while another ping's sound is in the air receives
+that echo instead of its own (cross-talk, a wrong distance)
+for 1..N sensors it compares:
+    scheduler => pingScheduler (one sensor pings at a time, the next right after the echo and the guard time)
+    free      => every sensor updated by itself (ultraSonic.update, pinging every intervalMs at its own phase)
+and reports the aggregate and per sensor update rates (filter samples per second), the cross-talk samples and the loop
+wakeups per second (the scheduler loop sleeps until the end of the echo, woken by the echo interrupt as in wait())
+the capacity is the best rate one sensor at a time allows: every sensor pinged every intervalMs, bounded by the air
+time of one ping (the echo delay, the echo or its timeout, and the guard time), so with the objects at 120 cm the
+scheduler is flat at ~105 samples/s from 4 sensors (adding sensors splits the air time, it can't add samples)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/doorSim.py [max sensors] [distance cm]
+    exits with 1 if the scheduler made a cross-talk sample, its aggregate rate is under 95% of the capacity, or a
+    sensor's rate is under 90% of its share of the capacity
+"""
+import heapq
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ECHO_DELAY = 450        # the time in us from the trigger to the echo rising edge (the sensor sending its burst)
+SIMULATED_SECONDS = 5
+
+
+class simulatedClock:
+    now = 0     # the time in micro-seconds
+    events = []     # heap of (time, order, function) to run at their times
+    order = 0
+
+    @staticmethod
+    def at(time: int, function):
+        simulatedClock.order += 1
+        heapq.heappush(simulatedClock.events, (time, simulatedClock.order, function))
+
+    @staticmethod
+    def advance(until: int, woken=None):
+        """
+        running the events until the time (or until woken() returns True after an event, the clock stays at its time)
+        """
+        while simulatedClock.events and simulatedClock.events[0][0] <= until:
+            time, order, function = heapq.heappop(simulatedClock.events)
+            simulatedClock.now = time
+            function()
+            if woken and woken():
+                return
+        simulatedClock.now = until
+
+
+class simulatedPin:
+    OUT = 1
+    IN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+    created = []    # the created pins in their order (trigger, echo, trigger, echo, ...)
+
+    def __init__(self, number, mode=None, value=0):
+        self.level = value
+        self.handler = None
+        self.onFalling = None   # called when the pin is set from high to low (the trigger pulse end)
+        simulatedPin.created.append(self)
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        if self.level and not level and self.onFalling:
+            self.onFalling()
+        self.level = level
+
+    def irq(self, trigger, handler, hard=False):
+        self.handler = handler
+
+    def drive(self, level: int):
+        self.level = level
+        if self.handler:
+            self.handler(self)
+
+
+import ultrasonic  # noqa: E402
+from ultrasonic import ultraSonic, pingScheduler, CM_PER_US  # noqa: E402
+
+ultrasonic.Pin = simulatedPin   # the pins of this simulation run on its micro-second clock (not hal.sim)
+ultrasonic.ticks_us = lambda: simulatedClock.now
+ultrasonic.ticks_ms = lambda: simulatedClock.now // 1000
+ultrasonic.sleep_us = lambda duration: None
+
+
+class acousticRoom:
+    def __init__(self):
+        """ the sounds in the air: list of (the time its echo returns, echo end) of every ping """
+        self.sounds = []
+        self.crossTalk = 0
+
+    def attach(self, sensor: ultraSonic, distance: float):
+        sensor.trig.onFalling = lambda: self.pinged(sensor, distance)
+
+    def pinged(self, sensor: ultraSonic, distance: float):
+        now = simulatedClock.now
+        self.sounds = [sound for sound in self.sounds if sound[1] > now]
+        duration = int(distance / CM_PER_US) if distance <= 400 else None
+        heard = [sound for sound in self.sounds if sound[0] > now + ECHO_DELAY]
+        if heard:  # another ping's echo arrives first and is taken as this sensor's echo
+            self.crossTalk += 1
+            duration = heard[0][0] - now - ECHO_DELAY
+        if duration is not None:
+            self.sounds.append((now + ECHO_DELAY + duration, now + ECHO_DELAY + duration + 1000))
+            simulatedClock.at(now + ECHO_DELAY, lambda: sensor.echo.drive(1))
+            simulatedClock.at(now + ECHO_DELAY + duration, lambda: sensor.echo.drive(0))
+
+
+def simulate(count: int, distance: float, scheduled: bool):
+    """
+    :return: (the aggregate samples per second, list of the per sensor samples per second, the cross-talk samples,
+              the loop wakeups per second, the capacity in samples per second)
+    """
+    simulatedClock.now = 0
+    simulatedClock.events = []
+    room = acousticRoom()
+    sensors = []
+    for index in range(count):
+        simulatedClock.now = index * 7000 if not scheduled else 0  # the free sensors start at different phases
+        sensor = ultraSonic(2 * index, 2 * index + 1)
+        room.attach(sensor, distance)
+        sensors.append(sensor)
+    simulatedClock.now = 0
+    scheduler = pingScheduler(sensors)
+    end = SIMULATED_SECONDS * 1000000
+    wakeups = 0
+    while simulatedClock.now < end:
+        wakeups += 1
+        if scheduled:
+            scheduler.update()
+            # sleeping as wait() does, until the echo interrupt releases the lock or the timer bound
+            simulatedClock.advance(simulatedClock.now + max(1, scheduler.sleepMs()) * 1000,
+                                   lambda: scheduler.echoed.acquire(0))
+        else:
+            for sensor in sensors:
+                sensor.update()
+            simulatedClock.advance(simulatedClock.now + 1000)
+    rates = [sensor.filter.samples / SIMULATED_SECONDS for sensor in sensors]
+    airUs = ECHO_DELAY + distance / CM_PER_US if distance <= 400 else sensors[0].timeoutUs
+    capacity = min(count * 1000 / sensors[0].intervalMs, 1E6 / (airUs + scheduler.guardUs))
+    return sum(rates), rates, room.crossTalk, wakeups / SIMULATED_SECONDS, capacity
+
+
+if __name__ == '__main__':
+    maxSensors = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    distance = float(sys.argv[2]) if len(sys.argv) > 2 else 120
+    failed = 0
+    print('objects at %s cm, %s simulated seconds' % (distance, SIMULATED_SECONDS))
+    print('%8s %-10s %12s %14s %11s %11s %10s' % ('sensors', 'method', 'samples/s', 'per sensor', 'cross-talk',
+                                                  'wakeups/s', 'capacity'))
+    for count in range(1, maxSensors + 1):
+        for method in ('scheduler', 'free'):
+            rate, rates, crossTalk, wakeups, capacity = simulate(count, distance, method == 'scheduler')
+            missed = method == 'scheduler' and (crossTalk > 0 or rate < capacity * 0.95 or
+                                                min(rates) < capacity / count * 0.9)
+            failed += missed
+            print('%8d %-10s %12.1f %14.1f %11d %11.1f %10.1f%s' % (count, method, rate, min(rates), crossTalk, wakeups,
+                                                                   capacity, '  FAILED' if missed else ''))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,176 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+fuzz and benchmark suite of the incremental request parser (httpparser.requestParser), runs on CPython
+fuzz:
+    every sample request is fed to the parser split at random points (any number of recv parts), the parsed requests
+    must be the same as parsing the whole stream at once (pipelined requests included)
+    random mutations (flipped, removed, inserted bytes) of the sample requests must either parse or raise parseError,
+    and the parser must never read past its buffer or raise anything else
+    the empty lines (CRLF) before a request line are skipped, so the requests must parse the same with them
+benchmark:
+    parsing time per request of the old parsing (decoding the request and splitting it to lines and dicts) and the
+    incremental parser, received at once and with the body in a second part (the headers are parsed once)
+    the old parsing isn't a like for like baseline, it has no checks (a broken request raised anything or was
+    answered), no url-decoding, no body length (so no pipelining or body in a later part) and it needed the whole
+    request decoded to one str (received by appending the parts)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/fuzzParser.py [iterations] [seed]
+    exits with 1 if any fuzz check failed
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpparser import requestParser, parseError  # noqa: E402
+
+# the headers read by the server and the apps (compared between the parsed requests)
+HEADERS = ('content-length', 'transfer-encoding', 'connection', 'if-none-match', 'accept-encoding', 'upgrade',
+           'sec-websocket-key', 'sec-websocket-version')
+
+SAMPLES = (
+    b'GET / HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept: text/html\r\n\r\n',
+    b'GET /mainApp/currentNumber?wait=12 HTTP/1.1\r\nHost: 192.168.4.1\r\nConnection: keep-alive\r\n\r\n',
+    b'POST /mainApp HTTP/1.1\r\nHost: 192.168.4.1\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+    b'Content-Length: 16\r\n\r\nchoice=increment',
+    b'POST /doorApp HTTP/1.1\r\nContent-Length: 10\r\n\r\nnumber=%35',
+    b'GET /doorApp/request?wait=idle_3 HTTP/1.0\r\n\r\n',
+    b'GET /styleSheet.css HTTP/1.1\r\nHost: 192.168.4.1\r\nUser-Agent: Mozilla/5.0 (X11; Linux x86_64)\r\n'
+    b'Accept: text/css,*/*;q=0.1\r\nAccept-Encoding: gzip, deflate\r\nAccept-Language: en-US,en;q=0.5\r\n'
+    b'If-None-Match: "5f3a"\r\nConnection: keep-alive\r\n\r\n',
+)
+
+
+def summary(request):
+    return (request.method, request.path, request.query, request.version,
+            [request.headers.get(name) for name in HEADERS],
+            request.body, sorted(request.getData().items()), sorted(request.postData().items()))
+
+
+def feed(stream: bytes, cuts):
+    """
+    feeding the stream to a new parser in parts (split at cuts)
+    :return: (list of the parsed request summaries, the parse error or None)
+    """
+    parser = requestParser()
+    results = []
+    start = 0
+    for end in list(cuts) + [len(stream)]:
+        part = stream[start:end]
+        start = end
+        while part:
+            free = parser.free()
+            count = min(len(free), len(part))
+            if not count:
+                return results, parseError(431, 'buffer full')
+            free[:count] = part[:count]
+            parser.received(count)
+            part = part[count:]
+            try:
+                request = parser.parse()
+                while request is not None:
+                    results.append(summary(request))
+                    request = parser.parse()
+            except parseError as e:
+                return results, e
+    return results, None
+
+
+def mutate(rand, stream: bytes):
+    data = bytearray(stream)
+    for _ in range(rand.randint(1, 4)):
+        index = rand.randrange(len(data))
+        action = rand.randrange(3)
+        if action == 0:
+            data[index] = rand.randrange(256)
+        elif action == 1:
+            del data[index]
+        else:
+            data.insert(index, rand.choice(b'\r\n :%?&=/'))
+    return bytes(data)
+
+
+def fuzz(iterations: int, seed: int):
+    rand = random.Random(seed)
+    failures = 0
+    for _ in range(iterations):
+        stream = b''.join(rand.choice(SAMPLES) for _ in range(rand.randint(1, 4)))
+        expected = feed(stream, [])
+        cuts = sorted(rand.sample(range(1, len(stream)), min(len(stream) - 1, rand.randint(1, 12))))
+        if feed(stream, cuts)[0] != expected[0]:
+            failures += 1
+            print('segmentation changed the result: %r at %r' % (stream, cuts))
+        try:
+            feed(mutate(rand, stream), cuts)
+        except Exception as e:  # anything other than parseError (handled in feed) is a parser bug
+            failures += 1
+            print('mutation raised %r: %r' % (e, stream))
+    return failures
+
+
+def emptyLines(iterations: int, seed: int):
+    rand = random.Random(seed)
+    failures = 0
+    for _ in range(iterations):
+        requests = [rand.choice(SAMPLES) for _ in range(rand.randint(1, 4))]
+        stream = b''.join(b'\r\n' * rand.randint(0, 3) + request for request in requests)
+        cuts = sorted(rand.sample(range(1, len(stream)), min(len(stream) - 1, rand.randint(0, 12))))
+        if feed(stream, cuts) != feed(b''.join(requests), []):
+            failures += 1
+            print('empty lines changed the result: %r at %r' % (stream, cuts))
+    return failures
+
+
+def oldParse(request: bytes):
+    request = request.decode('utf-8', 'ignore')
+    headers = request.split('\n')
+    requestType, fileName, *http = headers[0].split()
+    fileName, _, query = str(fileName).lower().partition('?')
+    fileName = fileName.strip('/\t\n')
+    getData = dict(tuple(get_data.split("=")[:2] if "=" in get_data else (get_data, ''))
+                   for get_data in query.split("&")) if query else {}
+    postData = dict(tuple(post_data.split('=')[:2]) if '=' in post_data else (post_data, '')
+                    for post_data in headers[headers.index('\r') + 1:]) if requestType == 'POST' else {}
+    return requestType, fileName, getData, postData
+
+
+def newParse(parser: requestParser, request: bytes):
+    parser.free()[:len(request)] = request
+    parser.received(len(request))
+    request = parser.parse()
+    return request.method, request.path.strip('/').lower(), request.getData(), request.postData()
+
+
+def splitParse(parser: requestParser, request: bytes):
+    """
+    parsing the request received in two parts, the headers without the last byte of the body then the last byte
+    """
+    parser.free()[:len(request) - 1] = request[:-1]
+    parser.received(len(request) - 1)
+    if parser.parse() is None:
+        parser.free()[:1] = request[-1:]
+        parser.received(1)
+        parser.parse()
+
+
+def benchmark(iterations: int):
+    parser = requestParser()
+    for name, parse in (('old', oldParse), ('incremental', lambda request: newParse(parser, request)),
+                        ('two parts', lambda request: splitParse(parser, request))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for sample in SAMPLES:
+                parse(sample)
+        print('%-12s %8.2f us/request' % (name, (time.perf_counter() - start) / iterations / len(SAMPLES) * 1E6))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    failed = fuzz(count, int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    failed += emptyLines(count, int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    print('fuzz: %s iterations, %s failures' % (count, failed))
+    benchmark(count)
+    sys.exit(1 if failed else 0)
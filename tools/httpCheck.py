@@ -0,0 +1,229 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+protocol checks of the web server end to end (runs on CPython)
+the firmware is booted in this process with the simulated hardware (as python -m hal does) and its server listens on
+the loopback interface, every check talks raw http on one persistent connection:
+    head => HEAD then a pipelined GET of the same path in one segment, the HEAD response must have no body (with the
+            Content-Length of the GET body), and the GET response must follow it and have a body of its length
+    publish => threads change the state at the same time (their listeners publish it concurrently, every publish is
+            delayed randomly to widen the race), after they end the published channels (event stream, long poll and
+            websocket values) must be the latest state
+    rejected => an enter posted to the door app at the max clients number shows the rejected door state (api/state),
+            and the door loop replaces it with the door reading (idle) REJECTED_MS later, as the old 250 ms loop did
+    gzip => every static page (index, settings, stylesheet) requested with and without Accept-Encoding: gzip, the gzip
+            response must have Content-Encoding: gzip, Vary: Accept-Encoding and the Content-Length of its body, and its
+            decompressed body must be the minified (tools/build.py) identity body, the templates (mainApp, doorApp) are
+            formatted for every request so they can't be precompressed, they must be sent without Content-Encoding
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/httpCheck.py [port]
+    exits with 1 if any check failed
+"""
+import gzip
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # the firmware opens its pages and journal files from its directory
+
+HEAD_PATHS = ('/', '/styleSheet.css', '/mainApp', '/api/state', '/missing')
+# the static pages, the settings page needs the door app active so it's first (requesting the index page resets it)
+GZIP_PATHS = ('/doorApp/settings', '/', '/styleSheet.css')
+TEMPLATE_PATHS = ('/mainApp', '/doorApp')
+
+from build import minify  # noqa: E402 (tools/build.py, the directory of this script)
+
+
+class responseReader:
+    def __init__(self, sock):
+        """ reading the responses of one connection (the received bytes after a response are kept for the next) """
+        self.sock = sock
+        self.data = b''
+
+    def head(self):
+        """
+        :return: (status line, dict of the headers by their lower case names)
+        """
+        while b'\r\n\r\n' not in self.data:
+            self.receive()
+        head, self.data = self.data.split(b'\r\n\r\n', 1)
+        lines = head.decode().split('\r\n')
+        headers = dict()
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return lines[0], headers
+
+    def body(self, length: int):
+        while len(self.data) < length:
+            self.receive()
+        body, self.data = self.data[:length], self.data[length:]
+        return body
+
+    def receive(self):
+        chunk = self.sock.recv(4096)
+        if not chunk:
+            raise ConnectionError('the server closed the connection')
+        self.data += chunk
+
+    def extra(self, waitMs: int = 200):
+        """
+        :return: the bytes received after the read responses (nothing is expected)
+        """
+        self.sock.settimeout(waitMs / 1000)
+        try:
+            self.receive()
+        except (socket.timeout, ConnectionError):
+            pass
+        return self.data
+
+
+class checker:
+    def __init__(self):
+        self.failures = 0
+        self.count = 0
+
+    def check(self, name: str, actual, expected):
+        self.count += 1
+        if actual != expected:
+            self.failures += 1
+            print('FAIL %-40s %r != %r' % (name, actual, expected))
+
+
+def checkHead(checks: checker, port: int, path: str):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    try:
+        sock.sendall(('HEAD %s HTTP/1.1\r\nHost: x\r\n\r\nGET %s HTTP/1.1\r\nHost: x\r\n\r\n' % (path, path)).encode())
+        reader = responseReader(sock)
+        headStatus, headHeaders = reader.head()
+        status, headers = reader.head()
+        checks.check('HEAD %s status' % path, headStatus, status)
+        checks.check('HEAD %s next response' % path, status.startswith('HTTP/1.1 '), True)
+        checks.check('HEAD %s content length' % path, headHeaders.get('content-length'), headers.get('content-length'))
+        body = reader.body(int(headers.get('content-length', '0')))
+        checks.check('GET %s after HEAD body' % path, len(body), int(headers.get('content-length', '0')))
+        checks.check('GET %s after HEAD extra bytes' % path, reader.extra(), b'')
+    finally:
+        sock.close()
+
+
+def checkPublish(checks: checker, main, threads: int = 8, changes: int = 300):
+    def change():
+        for index in range(changes):
+            main.state.add('currentNumber', 1, 0, 9999, wrap=True)
+            main.state.add('clientsNumber', 1 if index % 2 else -1, 0, 50)
+    def delayedPublish(channel: str, value: str):
+        time.sleep(random.random() / 5000)
+        publish(channel, value)
+    publish = main.serverSocket.publish
+    main.serverSocket.publish = delayedPublish
+    workers = [threading.Thread(target=change) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    del main.serverSocket.publish  # the class method again
+    version, values = main.state.snapshot()
+    channels = main.serverSocket.channels
+    checks.check('published state version', channels.get('state', '').split(',')[0], '{"version":%s' % version)
+    checks.check('published mainApp', channels.get('mainApp'), str(values['currentNumber']))
+    checks.check('published doorApp', channels.get('doorApp'),
+                 main.doorStates[values['doorRequest']] + '_%s' % values['clientsNumber'])
+
+
+def get(port: int, path: str, headers: dict = None):
+    """
+    :return: (status code, dict of the headers by their lower case names, body as sent (not decompressed))
+    """
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        client.request('GET', path, headers=headers or {})
+        response = client.getresponse()
+        return response.status, {name.lower(): value for name, value in response.getheaders()}, response.read()
+    finally:
+        client.close()
+
+
+def checkGzip(checks: checker, port: int, path: str):
+    status, headers, body = get(port, path)
+    gzipStatus, gzipHeaders, gzipBody = get(port, path, {'Accept-Encoding': 'gzip, deflate'})
+    checks.check('GET %s status' % path, status, 200)
+    checks.check('GET %s encoding' % path, headers.get('content-encoding'), None)
+    checks.check('GET %s gzip status' % path, gzipStatus, 200)
+    checks.check('GET %s gzip encoding' % path, gzipHeaders.get('content-encoding'), 'gzip')
+    checks.check('GET %s gzip vary' % path, gzipHeaders.get('vary'), 'Accept-Encoding')
+    checks.check('GET %s gzip content length' % path, gzipHeaders.get('content-length'), str(len(gzipBody)))
+    checks.check('GET %s gzip etag differs' % path, gzipHeaders.get('etag') != headers.get('etag'), True)
+    try:
+        decompressed = gzip.decompress(gzipBody).decode('utf-8')
+    except (OSError, EOFError, UnicodeDecodeError) as error:
+        decompressed = repr(error)
+    checks.check('GET %s gzip body' % path, decompressed == minify(body.decode('utf-8')), True)
+    checks.check('GET %s gzip smaller' % path, len(gzipBody) < len(body), True)
+
+
+def checkTemplate(checks: checker, port: int, path: str):
+    status, headers, body = get(port, path, {'Accept-Encoding': 'gzip'})
+    checks.check('GET %s status' % path, status, 200)
+    checks.check('GET %s encoding' % path, headers.get('content-encoding'), None)
+    checks.check('GET %s content length' % path, headers.get('content-length'), str(len(body)))
+    checks.check('GET %s html' % path, body.lstrip().lower().startswith(b'<!doctype html'), True)
+
+
+def doorState(port: int):
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        client.request('GET', '/api/state')
+        return json.loads(client.getresponse().read())['doorState']
+    finally:
+        client.close()
+
+
+def checkRejected(checks: checker, port: int, main):
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        client.request('GET', '/doorApp')  # activating the door app (the loop reads the doors)
+        client.getresponse().read()
+        main.state.set(clientsNumber=main.state.maxClientsNumber)
+        client.request('POST', '/doorApp', 'choice=enter', {'Content-Type': 'application/x-www-form-urlencoded'})
+        client.getresponse().read()
+    finally:
+        client.close()
+    checks.check('enter at the max clients number', doorState(port), 'rejected')
+    time.sleep(main.REJECTED_MS / 2000)
+    checks.check('rejected before REJECTED_MS', doorState(port), 'rejected')
+    time.sleep(main.REJECTED_MS / 1000)
+    checks.check('rejected after REJECTED_MS', doorState(port), 'idle')
+    main.state.set(activeApp='', clientsNumber=0)
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8096
+    import hal.sim  # noqa: E402 (the simulated backend, the checks run on CPython)
+    import main  # noqa: E402
+    for trig, echo in main.doorPins:
+        hal.sim.virtualUltrasonic(trig, echo)
+    main.start(port)
+    while main.serverSocket is None:
+        time.sleep(0.01)
+    checks = checker()
+    for path in HEAD_PATHS:
+        checkHead(checks, port, path)
+    for attempt in range(5):
+        checkPublish(checks, main, changes=100)
+    checkRejected(checks, port, main)
+    main.state.set(activeApp='doorApp')
+    for path in GZIP_PATHS:
+        checkGzip(checks, port, path)
+    for path in TEMPLATE_PATHS:
+        checkTemplate(checks, port, path)
+    main.state.set(activeApp='')
+    print('http: %d checks, %d failures' % (checks.count, checks.failures))
+    sys.exit(1 if checks.failures else 0)
@@ -0,0 +1,205 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+host-side crash-injection test of the state journal (journal.stateJournal), runs on CPython in a temporary directory
+crash:
+    every trial writes random states until a simulated power cut (the file write stops after a random number of
+    bytes, tearing the record, or the cut comes right after truncating the next file when rotating), then a new
+    journal restores the state, it must be the last fully written record, and writing must go on after the recovery
+corruption:
+    a random byte of the last record is flipped, the restored state must be the previous record
+failed write:
+    random writes fail (half of the record is written, then OSError as a full or failing flash), the journal goes on
+    writing in the same process, the failed writes must close the writer and the restored state must be the last
+    record written without an error (no record is appended after the torn bytes)
+write amplification:
+    a day of button presses (bursts of presses with pauses) is replayed with the batching delay, and the written
+    records and bytes are compared with writing one record per press and rewriting a json file per press
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/journalCrash.py [trials] [seed]
+    exits with 1 if any restored state was wrong
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal  # noqa: E402
+from journal import stateJournal  # noqa: E402
+
+FIELDS = ('currentNumber', 'clientsNumber', 'maxClientsNumber')
+
+
+class powerCut(Exception):
+    pass
+
+
+class crashingFile:
+    budget = None   # the number of bytes written before the power cut (None => no cut)
+    failing = 0     # the number of the next writes failing with OSError (unlike the power cut, the process goes on)
+
+    def __init__(self, name: str, mode: str):
+        self.file = open(name, mode)
+        if 'w' in mode and crashingFile.budget == 0:  # cut right after truncating the file
+            self.file.close()
+            raise powerCut()
+
+    def write(self, data: bytes):
+        if crashingFile.failing:
+            crashingFile.failing -= 1
+            self.file.write(data[:len(data) // 2])
+            raise OSError(28, 'ENOSPC')
+        if crashingFile.budget is not None and len(data) > crashingFile.budget:
+            self.file.write(data[:crashingFile.budget])
+            self.file.close()
+            raise powerCut()
+        if crashingFile.budget is not None:
+            crashingFile.budget -= len(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def crashingOpen(name: str, mode: str = 'r'):
+    return crashingFile(name, mode) if 'w' in mode or 'a' in mode else open(name, mode)
+
+
+def randomValues(rng):
+    return dict(currentNumber=rng.randint(-999, 9999), clientsNumber=rng.randint(0, 50),
+                maxClientsNumber=rng.randint(0, 50))
+
+
+def crashTrial(rng, directory: str):
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    prefix = os.path.join(directory, 'journal')
+    writer = stateJournal(FIELDS, prefix, files=3, recordsPerFile=rng.randint(1, 8))
+    committed = None
+    crashingFile.budget = rng.randint(0, writer.recordSize * 30)
+    try:
+        while True:
+            values = randomValues(rng)
+            writer.append(values)
+            committed = values
+    except powerCut:
+        pass
+    crashingFile.budget = None
+    reader = stateJournal(FIELDS, prefix, files=3, recordsPerFile=writer.recordsPerFile)
+    restored = reader.restore()
+    if restored != committed:
+        return 'restored %s instead of %s' % (restored, committed)
+    values = randomValues(rng)
+    reader.append(values)  # the journal must go on after the recovery
+    reader.writer.close()
+    again = stateJournal(FIELDS, prefix, files=3, recordsPerFile=writer.recordsPerFile).restore()
+    if again != values:
+        return 'after recovery restored %s instead of %s' % (again, values)
+    return None
+
+
+def corruptionTrial(rng, directory: str):
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    prefix = os.path.join(directory, 'journal')
+    writer = stateJournal(FIELDS, prefix, files=2, recordsPerFile=16)
+    history = [randomValues(rng) for index in range(rng.randint(2, 12))]
+    for values in history:
+        writer.append(values)
+    writer.writer.close()
+    name = writer.names[writer.current]
+    with open(name, 'r+b') as file:
+        position = os.path.getsize(name) - writer.recordSize + rng.randrange(writer.recordSize)
+        file.seek(position)
+        byte = file.read(1)[0]
+        file.seek(position)
+        file.write(bytes([byte ^ (1 << rng.randrange(8))]))
+    restored = stateJournal(FIELDS, prefix, files=2, recordsPerFile=16).restore()
+    return None if restored == history[-2] else 'corrupted: restored %s instead of %s' % (restored, history[-2])
+
+
+def failedWriteTrial(rng, directory: str):
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    prefix = os.path.join(directory, 'journal')
+    writer = stateJournal(FIELDS, prefix, files=3, recordsPerFile=rng.randint(1, 8))
+    committed = None
+    for index in range(rng.randint(1, 30)):
+        values = randomValues(rng)
+        crashingFile.failing = rng.random() < 0.3
+        try:
+            writer.append(values)
+            committed = values
+        except OSError:
+            if writer.writer is not None:
+                return 'failed write: the writer is still open'
+    crashingFile.failing = 0
+    writer.writer.close() if writer.writer else None
+    restored = stateJournal(FIELDS, prefix, files=3, recordsPerFile=writer.recordsPerFile).restore()
+    return None if restored == committed else 'failed write: restored %s instead of %s' % (restored, committed)
+
+
+def amplification(rng, directory: str, delayMs: int = 2000):
+    """
+    :return: (presses, records, bytes, started files) of the batched journal, the bytes of a json rewrite per press
+             and the record size
+    """
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    presses = []
+    time = 0
+    while time < 24 * 3600 * 1000:  # bursts of 1..40 presses every 100..400 ms, then a 1..120 s pause
+        for press in range(rng.randint(1, 40)):
+            time += rng.randint(100, 400)
+            presses.append(time)
+        time += rng.randint(1000, 120000)
+    writer = stateJournal(FIELDS, os.path.join(directory, 'journal'), delayMs=delayMs)
+    values = dict(currentNumber=0, clientsNumber=0, maxClientsNumber=3)
+    jsonBytes = 0
+    windowEnd = None
+    for time in presses:
+        if windowEnd is not None and time > windowEnd:  # the batch delay ended before this press
+            writer.append(values)
+            windowEnd = None
+        values = dict(values, currentNumber=(values['currentNumber'] + 1) % 10000)
+        jsonBytes += len(json.dumps(values))
+        if windowEnd is None:
+            windowEnd = time + delayMs
+    writer.append(values)
+    writer.writer.close()
+    return len(presses), writer.records, writer.bytes, writer.rotations, jsonBytes, writer.recordSize
+
+
+if __name__ == '__main__':
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 1)
+    journal.open = crashingOpen
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        for trial in range(trials):
+            failure = crashTrial(rng, directory)
+            failures += [failure] if failure else []
+        for trial in range(trials):
+            failure = corruptionTrial(rng, directory)
+            failures += [failure] if failure else []
+        for trial in range(trials):
+            failure = failedWriteTrial(rng, directory)
+            failures += [failure] if failure else []
+        presses, records, written, rotations, jsonBytes, recordSize = amplification(rng, directory)
+    for failure in failures[:10]:
+        print(failure)
+    print('%d crash, %d corruption and %d failed write trials, %d failed' % (trials, trials, trials, len(failures)))
+    print('one day of %d presses:' % presses)
+    print('    batched journal   %7d records %9d bytes %6.2f bytes per press (%d files started)'
+          % (records, written, written / presses, rotations))
+    print('    record per press  %7d records %9d bytes %6.2f bytes per press'
+          % (presses, presses * recordSize, recordSize))
+    print('    json per press    %7d rewrites %8d bytes %6.2f bytes per press'
+          % (presses, jsonBytes, jsonBytes / presses))
+    sys.exit(1 if failures else 0)
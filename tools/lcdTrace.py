@@ -0,0 +1,113 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+host-side check of the LCD16X1 driver against a fake i2c bus that records the transactions (runs on CPython)
+the recorded bytes are decoded like the lcd does (latching a nibble on every enable falling edge, executing the
+command or data after 2 nibbles), so the shown cells can be compared with the expected text
+for writeString (clear + char by char) and writeFrame (shadow framebuffer diff) it reports:
+    the number of i2c transactions and bytes
+    the estimated bus time at 100 KHz and the sleep time the driver blocks for
+and checks that the decoded display shows the expected text after every write
+failing bus:
+    every 7th transaction stops after half of its bytes with OSError (as a nack on a noisy bus), the failed write is
+    retried (as the display does on its next update) and the decoded display must show the text after the retry
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/lcdTrace.py
+    exits with 1 if the decoded display doesn't match the written text
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lcd  # noqa: E402
+from lcd import LCD16X1  # noqa: E402
+
+
+class recordingSleep:
+    slept = 0   # the total time in us the driver slept (the time it blocks the loop thread)
+
+    def __init__(self, scale: int):
+        self.scale = scale
+
+    def __call__(self, duration):  # a callable object (not a function) so it's not bound as a method of LCD16X1
+        recordingSleep.slept += duration * self.scale
+
+
+lcd.sleep_ms = recordingSleep(1000)  # the driver's sleeps are recorded (not slept)
+lcd.sleep_us = recordingSleep(1)
+
+BUS_FREQUENCY = 100000  # the PCF8574 standard bus frequency
+
+
+class recordingI2C:
+    def __init__(self, failEvery: int = 0):
+        """ fake i2c bus recording the transactions and decoding them to the lcd display ram """
+        self.failEvery = failEvery  # every failEvery-th transaction fails after half of its bytes (0 => no failure)
+        self.transactions = 0
+        self.bytes = 0
+        self.lastByte = 0
+        self.nibbles = []
+        self.address = 0        # the lcd address counter
+        self.ram = dict()       # the lcd display ram (address => char)
+
+    def writeto(self, address, data):
+        self.transactions += 1
+        self.bytes += len(data) + 1     # + the address byte
+        failing = self.failEvery and self.transactions % self.failEvery == 0
+        for byte in bytes(data)[:len(data) // 2] if failing else bytes(data):
+            if self.lastByte & 0x04 and not byte & 0x04:    # enable falling edge latches the nibble
+                self.nibbles.append(byte)
+                if len(self.nibbles) == 2:
+                    self.execute((self.nibbles[0] & 0xF0) | (self.nibbles[1] >> 4), self.nibbles[0] & 0x01)
+                    self.nibbles = []
+            self.lastByte = byte
+        if failing:
+            raise OSError(5, 'EIO')
+
+    def execute(self, value, RS):
+        if RS:
+            self.ram[self.address] = chr(value)
+            self.address += 1
+        elif value == 0x01:
+            self.ram.clear()
+            self.address = 0
+        elif value & 0x80:
+            self.address = value & 0x7F
+
+    def shown(self):
+        return ''.join(self.ram.get(xPos if xPos < 8 else 0x40 + xPos - 8, ' ') for xPos in range(16))
+
+    def busTimeUs(self):
+        return self.bytes * 9 * 1E6 / BUS_FREQUENCY    # 8 bits + ack for every byte
+
+
+def run(method: str, texts, failEvery: int = 0):
+    bus = recordingI2C()
+    lcd = LCD16X1(bus, 0x27)
+    bus.transactions = bus.bytes = 0
+    bus.failEvery = failEvery
+    recordingSleep.slept = 0
+    errors = failures = 0
+    for text in texts:
+        try:
+            getattr(lcd, method)(text)
+        except OSError:
+            failures += 1
+            getattr(lcd, method)(text)  # the retry of the next update
+        if bus.shown() != (text + ' ' * 16)[:16]:
+            errors += 1
+            print('%s: shown %r instead of %r' % (method, bus.shown(), text))
+    print('%-12s %6d transactions %7d bytes %9.1f ms bus %9.1f ms sleep%s'
+          % (method, bus.transactions, bus.bytes, bus.busTimeUs() / 1000, recordingSleep.slept / 1000,
+             ' (%d failed)' % failures if failEvery else ''))
+    return errors
+
+
+if __name__ == '__main__':
+    sequence = ['waiting...'] + ['current Num:%s' % number for number in range(0, 120)] + ['request', 'idle']
+    print('%s writes of the counter sequence' % len(sequence))
+    failed = run('writeString', sequence) + run('writeFrame', sequence)
+    print('failing bus (every 7th transaction):')
+    failed += run('writeFrame', sequence, failEvery=7)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,254 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+load test and latency benchmark of the web server (runs on CPython)
+the firmware is booted in a child process with the simulated hardware (python -m hal backend), its server listens on
+the loopback interface, or the test targets a running server (--host, ex: the esp32 access point 192.168.4.1)
+every simulated client is a thread with one persistent connection (reconnecting when the server closes it):
+    poll   => the page's polling request every --interval ms (the 16 AP clients polling at 250 ms)
+    post   => the command form posts (increment, decrement) every --post-interval ms
+    static => the static pages and the stylesheet (gzip accepted) every --static-interval ms
+for every kind it reports the p50, p99 and max latency in ms, the requests/s and the connection errors (refused,
+reset or timed out requests, the server closing a kept alive connection is counted as a reconnect)
+for the simulated server it reports the server side allocations of the run (measured in the child process):
+    blocks  => the growth of the allocated memory blocks (sys.getallocatedblocks, a leak shows as steady growth)
+    peak    => the peak traced heap bytes above the start (tracemalloc)
+    gc      => the garbage collections of every generation
+the results are saved as json (--json) to compare the changes over time
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/loadTest.py [--pollers 16] [--posters 2] [--statics 1] [--seconds 10] [--interval 250]
+                                [--poll-path /api/state] [--host host] [--port 8090] [--json results.json]
+    exits with 1 if any request failed
+"""
+import argparse
+import gc
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATIC_PATHS = ('/', '/styleSheet.css', '/index.html')
+POST_CHOICES = ('increment', 'decrement')
+
+
+def percentile(values: list, fraction: float):
+    """
+    :param values: the sorted values
+    :param fraction: 0.5 => the median, 0.99 => p99
+    :return: the value under which the fraction of the values are (nearest rank), None if there are no values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+class loadClient(threading.Thread):
+    def __init__(self, kind: str, host: str, port: int, requests, intervalMs: int, stop: threading.Event):
+        """
+        one simulated client with a persistent connection sending its requests in turn every intervalMs
+        :param kind: the reported kind (poll, post, static)
+        :param requests: list of (method, path, body, headers) sent in turn
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.requests = requests
+        self.intervalMs = intervalMs
+        self.stop = stop
+        self.latencies = []     # the latency in ms of every answered request
+        self.errors = 0         # the failed requests
+        self.reconnects = 0     # the kept alive connections closed by the server (the request is sent again)
+        self.statuses = dict()  # the number of responses of every status code
+
+    def connection(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=5)
+
+    def send(self, connection, method: str, path: str, body, headers: dict):
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        if response.getheader('connection', '').lower() == 'close':
+            connection.close()
+        return response.status
+
+    def run(self):
+        connection = self.connection()
+        index = 0
+        nextAt = time.perf_counter()
+        while not self.stop.is_set():
+            method, path, body, headers = self.requests[index % len(self.requests)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                try:
+                    status = self.send(connection, method, path, body, headers)
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    self.reconnects += 1    # the server closed the kept alive connection, sending it again
+                    connection.close()
+                    started = time.perf_counter()
+                    status = self.send(connection, method, path, body, headers)
+                self.latencies.append((time.perf_counter() - started) * 1000)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self.connection()
+            nextAt += self.intervalMs / 1000
+            delay = nextAt - time.perf_counter()
+            if delay > 0:
+                self.stop.wait(delay)
+            else:
+                nextAt = time.perf_counter()  # the client is late, not sending a burst to catch up
+        connection.close()
+
+
+def clientRequests(kind: str, pollPath: str):
+    if kind == 'poll':
+        return [('GET', pollPath, None, {})]
+    if kind == 'post':
+        return [('POST', '/mainApp', 'choice=%s' % choice, {'Content-Type': 'application/x-www-form-urlencoded'})
+                for choice in POST_CHOICES]
+    return [('GET', path, None, {'Accept-Encoding': 'gzip'}) for path in STATIC_PATHS]
+
+
+def summary(clients: list, seconds: float):
+    """
+    :return: dict of the results of the clients of one kind (latencies in ms)
+    """
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    statuses = dict()
+    for client in clients:
+        for status, count in client.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    return dict(clients=len(clients), requests=len(latencies), rps=round(len(latencies) / seconds, 1),
+                p50=percentile(latencies, 0.5), p99=percentile(latencies, 0.99),
+                max=latencies[-1] if latencies else None,
+                errors=sum(client.errors for client in clients),
+                reconnects=sum(client.reconnects for client in clients), statuses=statuses)
+
+
+def serve(port: int):
+    """
+    the child process: booting the firmware with the simulated hardware and answering the parent's commands on stdin
+        mark => printing the allocation counters as a json line (the peak is reset)
+    """
+    import tracemalloc
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import hal.sim  # the simulated backend (the child runs on CPython)
+    import main
+    for trig, echo in main.doorPins:
+        hal.sim.virtualUltrasonic(trig, echo)
+    main.start(port)
+    while main.serverSocket is None:
+        time.sleep(0.01)
+    tracemalloc.start()
+    print('ready', flush=True)
+    for line in sys.stdin:
+        if line.strip() == 'mark':
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            print(json.dumps(dict(blocks=sys.getallocatedblocks(), traced=current, peak=peak,
+                                  collections=[stats['collections'] for stats in gc.get_stats()])), flush=True)
+
+
+def mark(child):
+    child.stdin.write('mark\n')
+    child.stdin.flush()
+    return json.loads(child.stdout.readline())
+
+
+def runLoad(options):
+    """
+    :return: dict of the results (the options, the results of every kind and of all the requests, the server side
+             allocations if the server is simulated)
+    """
+    child = None
+    host = options.host or '127.0.0.1'
+    if not options.host:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(options.port)],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        if child.stdout.readline().strip() != 'ready':
+            raise RuntimeError('the simulated server did not start')
+    try:
+        activating = http.client.HTTPConnection(host, options.port, timeout=5)
+        activating.request('GET', '/mainApp')  # the posted commands and the legacy polling need the main app
+        activating.getresponse().read()
+        activating.close()
+        time.sleep(0.2)
+        before = mark(child) if child else None
+        stop = threading.Event()
+        clients = [loadClient(kind, host, options.port, clientRequests(kind, options.poll_path), interval, stop)
+                   for kind, count, interval in (('poll', options.pollers, options.interval),
+                                                 ('post', options.posters, options.post_interval),
+                                                 ('static', options.statics, options.static_interval))
+                   for index in range(count)]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        time.sleep(options.seconds)
+        stop.set()
+        for client in clients:
+            client.join(10)
+        elapsed = time.perf_counter() - started
+        after = mark(child) if child else None
+    finally:
+        if child:
+            child.kill()
+            child.wait()
+    results = dict(options=vars(options), seconds=round(elapsed, 2), time=int(time.time()),
+                   kinds=dict((kind, summary([client for client in clients if client.kind == kind], elapsed))
+                              for kind in ('poll', 'post', 'static')),
+                   total=summary(clients, elapsed))
+    if child:
+        results['server'] = dict(blocks=after['blocks'] - before['blocks'], peak=after['peak'] - before['traced'],
+                                 collections=[new - old for new, old in zip(after['collections'],
+                                                                            before['collections'])])
+    return results
+
+
+def report(results: dict):
+    print('%-8s %7s %9s %9s %9s %9s %9s %7s %10s'
+          % ('kind', 'clients', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'max ms', 'errors', 'reconnects'))
+    for kind, result in list(results['kinds'].items()) + [('total', results['total'])]:
+        if result['clients']:
+            print('%-8s %7d %9d %9.1f %9s %9s %9s %7d %10d'
+                  % (kind, result['clients'], result['requests'], result['rps'],
+                     *['%.2f' % result[name] if result[name] is not None else '-' for name in ('p50', 'p99', 'max')],
+                     result['errors'], result['reconnects']))
+    if 'server' in results:
+        server = results['server']
+        print('server: %+d allocated blocks, %d peak bytes, gc collections %s'
+              % (server['blocks'], server['peak'], '/'.join(str(count) for count in server['collections'])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='load test of the web server')
+    parser.add_argument('--pollers', type=int, default=16, help='the polling clients')
+    parser.add_argument('--posters', type=int, default=2, help='the clients posting commands')
+    parser.add_argument('--statics', type=int, default=1, help='the clients loading the static pages')
+    parser.add_argument('--seconds', type=float, default=10, help='the test duration')
+    parser.add_argument('--interval', type=int, default=250, help='the polling interval in ms')
+    parser.add_argument('--post-interval', type=int, default=500, help='the posting interval in ms')
+    parser.add_argument('--static-interval', type=int, default=1000, help='the static pages interval in ms')
+    parser.add_argument('--poll-path', default='/api/state', help='the polling request path')
+    parser.add_argument('--host', default=None, help='the server host (None => a simulated server is started)')
+    parser.add_argument('--port', type=int, default=8090, help='the server port')
+    parser.add_argument('--json', default=None, help='the results json file')
+    parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.serve is not None:
+        serve(options.serve)
+        sys.exit(0)
+    results = runLoad(options)
+    report(results)
+    if options.json:
+        with open(options.json, 'w') as writer:
+            json.dump(results, writer, indent=2)
+    sys.exit(1 if results['total']['errors'] else 0)
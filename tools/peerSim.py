@@ -0,0 +1,264 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+convergence and sync latency test of the venue peer sync (peersync.py) on the loopback interface (runs on CPython)
+every node is a child process running a venue counter with its sync thread (peersync.peerSync), all the other nodes
+are its peers, the parent changes the clients numbers of the nodes over their stdin (as the door app commands do) and
+every node reports its venue clients number when it changes (with the monotonic time, shared by the processes)
+for every number of nodes (--nodes 2,4,8):
+    latency => one node admits (+1) or lets out (-1) a client, the time until every node has the expected venue
+               clients number (p50, p99 and max in ms over --rounds changes, --gap ms apart, so with a gap over the
+               batch time every change is sent at once, else the changes of the same node are batched)
+    burst   => every node admits --burst clients at the same time, the time until all the nodes have the sum
+    reset   => one node resets the venue with a new max, the time until all the nodes adopt it (clients number 0)
+    traffic => the packets and bytes sent by one node per second (deltas and heartbeats)
+--loss drops the fraction of the received packets in every node (the heartbeats must repair them)
+the results are saved as json (--json) to compare the changes over time
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/peerSim.py [--nodes 2,4,8] [--rounds 40] [--gap 100] [--burst 5] [--batch 50] [--heartbeat 1000]
+                               [--loss 0] [--base-port 10200] [--timeout 5] [--json results.json]
+    exits with 1 if the nodes didn't converge
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, fraction: float):
+    """
+    :param values: the sorted values
+    :param fraction: 0.5 => the median, 0.99 => p99
+    :return: the value under which the fraction of the values are (nearest rank), None if there are no values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def runNode(options):
+    """
+    the child process: one node of the venue answering the parent's commands on stdin
+        add delta  => adding delta to the clients number of the node
+        reset max  => resetting the venue with the max clients number
+        stats      => printing the sent and received bytes and packets as a json line
+    every change of the venue (clients number, epoch, max) is printed as a json line with its monotonic time
+    """
+    sys.path.insert(0, ROOT)
+    from state import appState
+    from peersync import venueCounter, peerSync
+    from metrics import metricsRegistry
+
+    state = appState(clientsNumber=0, maxClientsNumber=1000)
+    counter = venueCounter(options.node, 1000)
+    registry = metricsRegistry()
+    output = threading.Lock()
+
+    def report(**values):
+        with output:
+            print(json.dumps(values), flush=True)
+
+    def adopted(maxClients: int, reset: bool):
+        if reset:
+            state.set(clientsNumber=0)
+        state.set(maxClientsNumber=maxClients)
+
+    sync = peerSync(counter, options.port, [('127.0.0.1', int(port)) for port in options.peers.split(',') if port],
+                    options.batch, options.heartbeat, adopted, registry)
+    if options.loss:
+        receive = sync.receive
+        sync.receive = lambda packet: None if random.random() < options.loss else receive(packet)
+    state.listen(lambda changedState: sync.setLocal(changedState.clientsNumber))
+    threading.Thread(target=sync.run, daemon=True).start()
+
+    def watch():  # reporting the venue changes (checked every ms)
+        last = None
+        while True:
+            current = (counter.total(), counter.epoch, counter.maxClients)
+            if current != last:
+                report(kind='venue', total=current[0], epoch=current[1], max=current[2], at=time.monotonic())
+                last = current
+            time.sleep(0.001)
+
+    threading.Thread(target=watch, daemon=True).start()
+    report(kind='ready')
+    for line in sys.stdin:
+        command = line.split()
+        if command[0] == 'add':
+            state.add('clientsNumber', int(command[1]))
+        elif command[0] == 'reset':
+            state.set(clientsNumber=0, maxClientsNumber=int(command[1]))
+            counter.reset(int(command[1]))
+        elif command[0] == 'stats':
+            report(kind='stats', sentBytes=registry.counts[sync.sentMetric], sentPackets=sync.sent,
+                   receivedBytes=registry.counts[sync.receivedMetric], receivedPackets=sync.received)
+
+
+class nodeProcess:
+    def __init__(self, node: int, port: int, peers: list, options):
+        """
+        the parent's handle of one node process, its reports are read by a thread
+        """
+        self.node = node
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--node', str(node), '--port',
+                                         str(port), '--peers', ','.join(str(peer) for peer in peers),
+                                         '--batch', str(options.batch), '--heartbeat', str(options.heartbeat),
+                                         '--loss', str(options.loss)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        self.condition = threading.Condition()
+        self.ready = False
+        self.venue = None   # the last venue report (total, epoch, max, at)
+        self.stats = None   # the last stats report
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self):
+        for line in self.process.stdout:
+            values = json.loads(line)
+            with self.condition:
+                if values['kind'] == 'ready':
+                    self.ready = True
+                elif values['kind'] == 'venue':
+                    self.venue = values
+                else:
+                    self.stats = values
+                self.condition.notify_all()
+
+    def command(self, line: str):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    def waitFor(self, predicate, deadline: float):
+        """
+        :param predicate: function(node) returning True when the expected report is received
+        :param deadline: the monotonic time to give up
+        :return: True if the predicate became True before the deadline
+        """
+        with self.condition:
+            while not predicate(self):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def converge(nodes: list, predicate, timeout: float):
+    """
+    :return: the time of the last node's matching report (monotonic), None if any node didn't match in time
+    """
+    deadline = time.monotonic() + timeout
+    if not all(node.waitFor(predicate, deadline) for node in nodes):
+        return None
+    return max(node.venue['at'] for node in nodes)
+
+
+def runScenario(count: int, options):
+    """
+    :param count: the number of nodes
+    :return: dict of the results of the nodes count
+    """
+    ports = [options.base_port + index for index in range(count)]
+    launched = time.monotonic()
+    nodes = [nodeProcess(index + 1, port, [peer for peer in ports if peer != port], options)
+             for index, port in enumerate(ports)]
+    results = dict(nodes=count, failures=0)
+    try:
+        deadline = time.monotonic() + options.timeout
+        for node in nodes:
+            node.waitFor(lambda current: current.ready and current.venue is not None, deadline)
+        total = 0
+        latencies = []
+        for index in range(options.rounds):
+            delta = -1 if total and random.random() < 0.4 else 1
+            total += delta
+            started = time.monotonic()
+            random.choice(nodes).command('add %d' % delta)
+            ended = converge(nodes, lambda current, total=total: current.venue['total'] == total, options.timeout)
+            if ended is None:
+                results['failures'] += 1
+            else:
+                latencies.append((ended - started) * 1000)
+            time.sleep(options.gap / 1000)
+        latencies.sort()
+        results['latency'] = dict(p50=percentile(latencies, 0.5), p99=percentile(latencies, 0.99),
+                                  max=latencies[-1] if latencies else None)
+
+        total += count * options.burst
+        started = time.monotonic()
+        for index in range(options.burst):
+            for node in nodes:
+                node.command('add 1')
+        ended = converge(nodes, lambda current: current.venue['total'] == total, options.timeout)
+        results['burstMs'] = (ended - started) * 1000 if ended else None
+        results['failures'] += ended is None
+
+        started = time.monotonic()
+        epoch = max(node.venue['epoch'] for node in nodes) + 1
+        random.choice(nodes).command('reset 50')
+        ended = converge(nodes, lambda current: current.venue['epoch'] == epoch and current.venue['max'] == 50 and
+                         current.venue['total'] == 0, options.timeout)
+        results['resetMs'] = (ended - started) * 1000 if ended else None
+        results['failures'] += ended is None
+
+        for node in nodes:
+            node.stats = None
+            node.command('stats')
+        deadline = time.monotonic() + options.timeout
+        stats = [node.stats for node in nodes if node.waitFor(lambda current: current.stats, deadline)]
+        elapsed = time.monotonic() - launched
+        results['traffic'] = dict(packetsPerSecond=round(sum(stat['sentPackets'] for stat in stats) / len(stats) /
+                                                         max(elapsed, 0.001), 1),
+                                  bytesPerSecond=round(sum(stat['sentBytes'] for stat in stats) / len(stats) /
+                                                       max(elapsed, 0.001), 1))
+    finally:
+        for node in nodes:
+            node.close()
+    return results
+
+
+def report(results: list):
+    print('%5s %9s %9s %9s %9s %9s %10s %10s %8s'
+          % ('nodes', 'p50 ms', 'p99 ms', 'max ms', 'burst ms', 'reset ms', 'packets/s', 'bytes/s', 'failures'))
+    for result in results:
+        print('%5d %9s %9s %9s %9s %9s %10s %10s %8d'
+              % (result['nodes'], *['%.1f' % value if value is not None else '-'
+                                    for value in (result['latency']['p50'], result['latency']['p99'],
+                                                  result['latency']['max'], result['burstMs'], result['resetMs'])],
+                 result['traffic']['packetsPerSecond'], result['traffic']['bytesPerSecond'], result['failures']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='convergence and latency test of the venue peer sync')
+    parser.add_argument('--nodes', default='2,4,8', help='the numbers of nodes (comma separated)')
+    parser.add_argument('--rounds', type=int, default=40, help='the single node changes for every number of nodes')
+    parser.add_argument('--gap', type=int, default=100, help='the time in ms between the single node changes')
+    parser.add_argument('--burst', type=int, default=5, help='the clients admitted by every node in the burst')
+    parser.add_argument('--batch', type=int, default=50, help='the batch time of the deltas in ms')
+    parser.add_argument('--heartbeat', type=int, default=1000, help='the heartbeat time in ms')
+    parser.add_argument('--loss', type=float, default=0, help='the fraction of the dropped received packets')
+    parser.add_argument('--base-port', type=int, default=10200, help='the udp port of the first node')
+    parser.add_argument('--timeout', type=float, default=5, help='the max convergence time in seconds')
+    parser.add_argument('--json', default=None, help='the results json file')
+    parser.add_argument('--node', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--peers', default='', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.node is not None:
+        runNode(options)
+        sys.exit(0)
+    results = [runScenario(int(count), options) for count in options.nodes.split(',')]
+    report(results)
+    if options.json:
+        with open(options.json, 'w') as writer:
+            json.dump(dict(options=vars(options), time=int(time.time()), results=results), writer, indent=2)
+    sys.exit(1 if any(result['failures'] for result in results) else 0)
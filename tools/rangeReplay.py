@@ -0,0 +1,129 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+replay harness of the ultrasonic ranging filter (ultrasonic.rangeFilter), runs on CPython
+the recorded echo durations are fed to the filter, and to the old door check (one raw sample every 250 ms compared
+with 16 cm, a timeout was the negative time_pulse_us error code) to compare them with the ground truth:
+    triggers        => the number of door requests (present rising edges)
+    false triggers  => the requests made while no client was in-front of the sensor
+    missed          => the clients that weren't detected
+    latency         => the average time from the client arriving to the request
+a recording file has one sample per line: "time_ms duration_us [truth]" where duration_us is 'timeout' (or a
+negative error code) for a ping without echo and truth is 1 while a client is really in-front of the sensor
+without a file, generated recordings (noise, spikes, bees, dropouts and clients) are replayed
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/rangeReplay.py [recording.txt ...]
+    exits with 1 if the filter made a false trigger or missed a client
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ultrasonic import rangeFilter, CM_PER_US  # noqa: E402
+
+OLD_PERIOD = 250    # the old doorApp period in milli-seconds
+OLD_NEAR = 16       # the old door request distance in cm
+INTERVAL = 30       # the ping interval of the engine in milli-seconds
+
+
+def durationOf(distance: float):
+    return int(distance / CM_PER_US)
+
+
+def generate(rng, name: str):
+    """
+    :return: list of (time_ms, duration_us or None, truth) of a generated recording
+    """
+    samples = []
+    visits = dict(hallway=[], bees=[], clients=[(1000, 2500), (4000, 4600)],
+                  dropouts=[(1500, 3500)]).get(name, [])
+    for time in range(0, 6000, INTERVAL):
+        truth = any(start <= time < end for start, end in visits)
+        distance = rng.gauss(9 if truth else 120, 1.5)
+        duration = durationOf(distance)
+        chance = rng.random()
+        if name == 'bees' and chance < 0.04:  # an insect flying through the beam (one close echo)
+            duration = durationOf(rng.uniform(3, 12))
+        elif name == 'dropouts' and chance < 0.15:  # the echo absorbed by the client's clothes
+            duration = None
+        elif chance < 0.02:  # a crossed (too early or too late) echo
+            duration = rng.choice((None, -2, durationOf(rng.uniform(500, 900))))
+        samples.append((time, duration, truth))
+    return samples
+
+
+def load(path: str):
+    samples = []
+    with open(path) as reader:
+        for line in reader:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            duration = None if fields[1] == 'timeout' or int(fields[1]) < 0 else int(fields[1])
+            samples.append((int(fields[0]), duration, len(fields) > 2 and fields[2] == '1'))
+    return samples
+
+
+def score(samples: list, detections: list):
+    """
+    :param samples: the recording (time_ms, duration_us, truth)
+    :param detections: list of (time_ms, present) of every change of the detected presence
+    :return: (triggers, false triggers, missed, average latency ms)
+    """
+    arrivals = [samples[index][0] for index in range(len(samples))
+                if samples[index][2] and (index == 0 or not samples[index - 1][2])]
+    truthAt = dict((time, truth) for time, duration, truth in samples)
+    triggers = [time for time, present in detections if present]
+    falseTriggers = 0
+    for time in triggers:
+        nearest = max(sampleTime for sampleTime in truthAt if sampleTime <= time)
+        falseTriggers += not truthAt[nearest]
+    latencies = []
+    for arrival in arrivals:
+        detected = [time - arrival for time in triggers if time >= arrival and truthAt.get(
+            max(sampleTime for sampleTime in truthAt if sampleTime <= time))]
+        if detected:
+            latencies.append(min(detected))
+    missed = len(arrivals) - len(latencies)
+    return len(triggers), falseTriggers, missed, (sum(latencies) / len(latencies) if latencies else 0)
+
+
+def replayFilter(samples: list):
+    distanceFilter = rangeFilter()
+    detections = []
+    for time, duration, truth in samples:
+        if distanceFilter.add(duration, time):
+            detections.append((time, distanceFilter.present))
+    return detections
+
+
+def replayOld(samples: list):
+    detections = []
+    present = False
+    position = 0
+    for time in range(0, samples[-1][0] + 1, OLD_PERIOD):
+        while position + 1 < len(samples) and samples[position + 1][0] <= time:
+            position += 1
+        duration = samples[position][1]
+        distance = (-1 if duration is None else duration) * CM_PER_US
+        if (distance < OLD_NEAR) != present:
+            present = not present
+            detections.append((time, present))
+    return detections
+
+
+if __name__ == '__main__':
+    rng = random.Random(1)
+    recordings = [(path, load(path)) for path in sys.argv[1:]] or \
+        [(name, generate(rng, name)) for name in ('hallway', 'bees', 'clients', 'dropouts')]
+    failed = 0
+    print('%-12s %-8s %9s %8s %8s %12s' % ('recording', 'method', 'triggers', 'false', 'missed', 'latency ms'))
+    for name, samples in recordings:
+        for method, replay in (('old', replayOld), ('filter', replayFilter)):
+            triggers, falseTriggers, missed, latency = score(samples, replay(samples))
+            if method == 'filter':
+                failed += falseTriggers + missed
+            print('%-12s %-8s %9d %8d %8d %12.0f' % (name, method, triggers, falseTriggers, missed, latency))
+    sys.exit(1 if failed else 0)
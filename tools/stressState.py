@@ -0,0 +1,117 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+stress test of the shared state (state.appState) hammered by several threads at the same time (runs on CPython)
+every thread makes the same number of:
+    add('currentNumber', +1)                 => the buttons and the increment posts
+    compareAndSet('clientsNumber', n, n + 1)  => the enter posts (retrying when another thread changed it first)
+    add('doorRequest', +1) and add('doorRequest', -1) in a wrapped range
+a waiter thread follows the versions with wait(), and a listener counts the notifications
+the checks: no lost increment, the version counts every change, every change notified the listener, and the waiter
+saw the last version
+for comparison the same increments are made on plain module globals without the lock (the lost updates are counted)
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/stressState.py [threads] [operations per thread]
+    exits with 1 if any check failed
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import appState  # noqa: E402
+
+globalNumber = 0    # the unsynchronized counter (as the old module globals)
+
+
+def hammer(state: appState, operations: int, start: threading.Event):
+    start.wait()
+    for operation in range(operations):
+        state.add('currentNumber', 1)
+        while True:
+            clients = state.clientsNumber
+            if state.compareAndSet('clientsNumber', clients, clients + 1):
+                break
+        state.add('doorRequest', 1, 0, 2, wrap=True)
+        state.add('doorRequest', -1, 0, 2, wrap=True)
+
+
+def wrap(number: int):
+    return -999 if number > 10 ** 9 else number
+
+
+def hammerGlobal(operations: int, start: threading.Event):
+    global globalNumber
+    start.wait()
+    for operation in range(operations):
+        number = globalNumber  # read-modify-write as the old loop and handlers did (with a call between them)
+        globalNumber = wrap(number + 1)
+
+
+def run(threads: int, operations: int):
+    state = appState(activeApp='mainApp', currentNumber=0, clientsNumber=0, maxClientsNumber=0, doorRequest=0)
+    notified = []
+    state.listen(lambda changedState: notified.append(1))
+    seen = []
+
+    def follow():
+        version = 0
+        while version < 4 * threads * operations:
+            version = state.wait(version)
+            seen.append(version)
+
+    start = threading.Event()
+    workers = [threading.Thread(target=hammer, args=(state, operations, start)) for index in range(threads)]
+    waiter = threading.Thread(target=follow, daemon=True)
+    waiter.start()
+    for worker in workers:
+        worker.start()
+    began = time.perf_counter()
+    start.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    waiter.join(5)
+
+    expected = threads * operations
+    checks = (
+        ('currentNumber', state.currentNumber, expected),
+        ('clientsNumber', state.clientsNumber, expected),
+        ('doorRequest', state.doorRequest, 0),
+        ('version', state.version, 4 * expected),
+        ('notifications', len(notified), 4 * expected),
+        ('waiter last version', seen[-1] if seen else None, 4 * expected),
+    )
+    failed = 0
+    for name, value, wanted in checks:
+        ok = value == wanted
+        failed += not ok
+        print('%-20s %10s %10s %s' % (name, value, wanted, 'ok' if ok else 'FAILED'))
+    print('%d changes in %.2f s (%.1f us per change), the waiter woke %d times'
+          % (4 * expected, elapsed, elapsed * 1E6 / (4 * expected), len(seen)))
+    return failed
+
+
+def runGlobal(threads: int, operations: int):
+    global globalNumber
+    globalNumber = 0
+    start = threading.Event()
+    workers = [threading.Thread(target=hammerGlobal, args=(operations, start)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join()
+    print('unsynchronized globals: %d of %d increments (%d lost)'
+          % (globalNumber, threads * operations, threads * operations - globalNumber))
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    sys.setswitchinterval(1E-6)  # switching the threads as often as possible to expose the races
+    failed = run(threads, operations)
+    runGlobal(threads, operations)
+    sys.exit(1 if failed else 0)
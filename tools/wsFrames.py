@@ -0,0 +1,271 @@
+"""
+=----------------------------------------------------------------------------------------------------------------------=
+                                        *specifications and requirements*
+host-side harness of the websocket session (websocket.webSocket) using a simulated connection (runs on CPython)
+the client frames are fed to the connection's read buffer (httpparser.requestParser, as the web server does) and the
+frames sent by the session are decoded and checked, every scenario checks:
+    handshake      => the Sec-WebSocket-Accept of the RFC 6455 sample key, 101 for a valid upgrade request and 400 for
+                      a request without the key or with another version
+    masking        => masked frames are delivered, unmasked frames (or reserved bits) close the connection with 1002
+    lengths        => 7 bits, 16 bits (126) extended lengths are delivered, 64 bits (127) lengths, frames over the
+                      buffer and messages over maxMessage close the connection with 1009
+    fragmentation  => fragmented messages are joined, the control frames between the fragments are answered, a
+                      continuation without a first fragment or a new message before the last fragment closes with 1002
+    control        => the control frames (close, ping, pong) must be final with a payload <= 125 bytes, else the
+                      connection is closed with 1002, a ping of 125 bytes is answered with its pong
+    close          => the close frame is echoed with the client's code (1000 if it has no code), once
+    keep alive     => the server ping is sent on an open session, nothing is sent after the session or the
+                      connection is closed
+    segmentation   => the same frames split at random points (any number of recv parts) give the same messages
+    encoding       => the server frames use the shortest length (7 bits, 126, 127) and are never masked
+=----------------------------------------------------------------------------------------------------------------------=
+usage: python tools/wsFrames.py [iterations] [seed]
+    exits with 1 if any check failed
+"""
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpparser import requestParser  # noqa: E402
+from websocket import (webSocket, acceptKey, encodeFrame, OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE,  # noqa: E402
+                       OP_PING, OP_PONG, CLOSE_NORMAL, CLOSE_PROTOCOL_ERROR, CLOSE_TOO_BIG)
+
+SAMPLE_KEY = 'dGhlIHNhbXBsZSBub25jZQ=='           # the sample key of RFC 6455 (section 1.3)
+SAMPLE_ACCEPT = 's3pPLMBiTxaQ9kYGzzhZRbK+xOo='    # its Sec-WebSocket-Accept
+
+
+class simulatedConnection:
+    def __init__(self, bufferSize: int = 2048):
+        """ the client connection of the web server: its read buffer, the sent bytes and the closed flag """
+        self.parser = requestParser(bufferSize)
+        self.sent = bytearray()
+        self.closed = False
+        self.closing = False    # as the web server's connection (closed after flushing its output buffer)
+        self.connected = True
+        self.websocket = None
+        self.keepAlive = False
+
+    def sendall(self, data):
+        self.sent.extend(data.encode() if isinstance(data, str) else data)
+
+    def close(self):
+        self.closed = self.closing = True
+
+    def feed(self, data: bytes):
+        """ receiving the data as the web server does (filling the free part of the buffer then handling it) """
+        while data and not self.closed:
+            free = self.parser.free()
+            count = min(len(free), len(data))
+            free[:count] = data[:count]
+            self.parser.received(count)
+            data = data[count:]
+            self.websocket.received(self)
+
+    def frames(self):
+        """ :return: list of (final, opcode, payload) of the sent frames (AssertionError if a frame is masked) """
+        frames = []
+        data = bytes(self.sent)
+        while data:
+            length, start = data[1] & 0x7F, 2
+            assert not data[1] & 0x80, 'the server frame is masked'
+            if length == 126:
+                length, start = struct.unpack('>H', data[2:4])[0], 4
+            elif length == 127:
+                length, start = struct.unpack('>Q', data[2:10])[0], 10
+            frames.append((data[0] & 0x80, data[0] & 0x0F, data[start:start + length]))
+            data = data[start + length:]
+        return frames
+
+
+def clientFrame(opcode: int, payload: bytes = b'', final: bool = True, masked: bool = True, length: int = None):
+    """
+    :param length: the length written in the header (None => the payload length), used for the too big frames
+    :return: the client frame bytes (masked with a random key unless masked is False)
+    """
+    length = len(payload) if length is None else length
+    first = bytes(((0x80 if final else 0) | opcode,))
+    flag = 0x80 if masked else 0
+    if length < 126:
+        header = first + bytes((flag | length,))
+    elif length < 0x10000:
+        header = first + bytes((flag | 126,)) + struct.pack('>H', length)
+    else:
+        header = first + bytes((flag | 127,)) + struct.pack('>Q', length)
+    if not masked:
+        return header + payload
+    mask = os.urandom(4)
+    return header + mask + bytes(byte ^ mask[index & 3] for index, byte in enumerate(payload))
+
+
+def closeCode(code: int):
+    return bytes((code >> 8, code & 0xFF))
+
+
+def session(bufferSize: int = 2048, maxMessage: int = 256):
+    """ :return: (connection, received messages) of a new session attached to a simulated connection """
+    messages = []
+    connection = simulatedConnection(bufferSize)
+    connection.websocket = webSocket(lambda connection, session, message: messages.append(message),
+                                     maxMessage=maxMessage)
+    return connection, messages
+
+
+def run(data: bytes, bufferSize: int = 2048, maxMessage: int = 256):
+    """ :return: (received messages, sent frames, closed) after feeding the data at once """
+    connection, messages = session(bufferSize, maxMessage)
+    connection.feed(data)
+    return messages, connection.frames(), connection.closed
+
+
+class checker:
+    def __init__(self):
+        self.failures = 0
+        self.count = 0
+
+    def check(self, name: str, actual, expected):
+        self.count += 1
+        if actual != expected:
+            self.failures += 1
+            print('FAIL %-40s %r != %r' % (name, actual, expected))
+
+
+def handshake(checks: checker):
+    checks.check('accept key of the rfc sample', acceptKey(SAMPLE_KEY), SAMPLE_ACCEPT)
+    for name, request, status in (
+            ('valid upgrade', 'GET /mainapp/socket HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                              'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n' % SAMPLE_KEY, b'101'),
+            ('upgrade without key', 'GET /mainapp/socket HTTP/1.1\r\nUpgrade: websocket\r\n'
+                                    'Sec-WebSocket-Version: 13\r\n\r\n', b'400'),
+            ('upgrade of another version', 'GET /mainapp/socket HTTP/1.1\r\nUpgrade: websocket\r\n'
+                                           'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 8\r\n\r\n' % SAMPLE_KEY,
+             b'400')):
+        connection = simulatedConnection()
+        connection.parser.free()[:len(request)] = request.encode()
+        connection.parser.received(len(request))
+        upgraded = webSocket(None).accept(connection, connection.parser.parse())
+        checks.check(name + ' status', bytes(connection.sent).split(b' ')[1], status)
+        checks.check(name + ' upgraded', upgraded, status == b'101')
+        if upgraded:
+            checks.check(name + ' accept header', ('Sec-WebSocket-Accept: %s\r\n' % SAMPLE_ACCEPT).encode() in
+                         connection.sent, True)
+
+
+def masking(checks: checker):
+    checks.check('masked text', run(clientFrame(OP_TEXT, b'increment')), (['increment'], [], False))
+    checks.check('masked binary', run(clientFrame(OP_BINARY, b'\x00\x01\xff'))[0], [b'\x00\x01\xff'])
+    checks.check('unmasked text', run(clientFrame(OP_TEXT, b'increment', masked=False)),
+                 ([], [(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))], True))
+    checks.check('reserved bit', run(bytes((0x40,)) + clientFrame(OP_TEXT, b'x')[1:])[1:],
+                 ([(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))], True))
+    checks.check('unknown opcode', run(clientFrame(0x3, b'x'))[1], [(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))])
+
+
+def lengths(checks: checker):
+    tooBig = [(0x80, OP_CLOSE, closeCode(CLOSE_TOO_BIG))]
+    checks.check('7 bits length', run(clientFrame(OP_TEXT, b'a' * 125))[0], ['a' * 125])
+    checks.check('16 bits length', run(clientFrame(OP_TEXT, b'b' * 200))[0], ['b' * 200])
+    checks.check('16 bits length over maxMessage', run(clientFrame(OP_TEXT, b'c' * 300))[1:], (tooBig, True))
+    checks.check('16 bits length over the buffer', run(clientFrame(OP_TEXT, b'', length=4000))[1:], (tooBig, True))
+    checks.check('64 bits length', run(clientFrame(OP_TEXT, b'', length=0x10000))[1:], (tooBig, True))
+    checks.check('frame filling the buffer', run(clientFrame(OP_TEXT, b'd' * 200), bufferSize=100)[1:],
+                 (tooBig, True))
+    checks.check('fragments over maxMessage', run(clientFrame(OP_TEXT, b'e' * 200, final=False) +
+                                                  clientFrame(OP_CONTINUATION, b'e' * 100))[1:], (tooBig, True))
+
+
+def fragmentation(checks: checker):
+    checks.check('fragmented text', run(clientFrame(OP_TEXT, b'incr', final=False) +
+                                        clientFrame(OP_CONTINUATION, b'em', final=False) +
+                                        clientFrame(OP_CONTINUATION, b'ent'))[0], ['increment'])
+    checks.check('ping between fragments', run(clientFrame(OP_TEXT, b'rese', final=False) +
+                                               clientFrame(OP_PING, b'hi') + clientFrame(OP_PONG, b'') +
+                                               clientFrame(OP_CONTINUATION, b't')),
+                 (['reset'], [(0x80, OP_PONG, b'hi')], False))
+    checks.check('fragmented binary', run(clientFrame(OP_BINARY, b'\x01', final=False) +
+                                          clientFrame(OP_CONTINUATION, b'\x02'))[0], [b'\x01\x02'])
+    checks.check('continuation without first fragment', run(clientFrame(OP_CONTINUATION, b'x'))[1:],
+                 ([(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))], True))
+    checks.check('message before the last fragment', run(clientFrame(OP_TEXT, b'a', final=False) +
+                                                         clientFrame(OP_TEXT, b'b')),
+                 ([], [(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))], True))
+
+
+def control(checks: checker):
+    protocolError = ([], [(0x80, OP_CLOSE, closeCode(CLOSE_PROTOCOL_ERROR))], True)
+    checks.check('fragmented ping', run(clientFrame(OP_PING, b'p', final=False)), protocolError)
+    checks.check('fragmented pong', run(clientFrame(OP_PONG, b'', final=False)), protocolError)
+    checks.check('fragmented close', run(clientFrame(OP_CLOSE, closeCode(CLOSE_NORMAL), final=False)), protocolError)
+    checks.check('ping of 126 bytes', run(clientFrame(OP_PING, b'p' * 126)), protocolError)
+    checks.check('close of 126 bytes', run(clientFrame(OP_CLOSE, closeCode(CLOSE_NORMAL) + b'x' * 124)),
+                 protocolError)
+    checks.check('ping of 125 bytes', run(clientFrame(OP_PING, b'p' * 125)), ([], [(0x80, OP_PONG, b'p' * 125)], False))
+
+
+def keepAlive(checks: checker):
+    connection, messages = session()
+    connection.websocket.ping(connection)
+    checks.check('ping of an open session', connection.frames(), [(0x80, OP_PING, b'')])
+    connection.websocket.close(connection)
+    connection.websocket.ping(connection)
+    checks.check('ping after the session close', connection.frames()[1:], [(0x80, OP_CLOSE, closeCode(CLOSE_NORMAL))])
+    connection, messages = session()
+    connection.closing = True  # the server is closing the connection (ex: dropped, or the response ended it)
+    connection.websocket.ping(connection)
+    connection.websocket.send(connection, 'late')
+    checks.check('ping and send on a closing connection', connection.frames(), [])
+
+
+def closing(checks: checker):
+    checks.check('close echo', run(clientFrame(OP_CLOSE, closeCode(1001) + b'bye'))[1:],
+                 ([(0x80, OP_CLOSE, closeCode(1001))], True))
+    checks.check('close without code', run(clientFrame(OP_CLOSE))[1:], ([(0x80, OP_CLOSE, closeCode(CLOSE_NORMAL))],
+                                                                        True))
+    checks.check('frames after close', run(clientFrame(OP_CLOSE, closeCode(CLOSE_NORMAL)) +
+                                           clientFrame(OP_TEXT, b'late') + clientFrame(OP_CLOSE)),
+                 ([], [(0x80, OP_CLOSE, closeCode(CLOSE_NORMAL))], True))
+    connection, messages = session()
+    connection.websocket.close(connection)
+    connection.websocket.close(connection)
+    checks.check('close sent once', connection.frames(), [(0x80, OP_CLOSE, closeCode(CLOSE_NORMAL))])
+
+
+def segmentation(checks: checker, iterations: int, rand: random.Random):
+    for _ in range(iterations):
+        frames, expected = [], []
+        for _ in range(rand.randint(1, 6)):
+            payload = bytes(rand.randrange(97, 123) for _ in range(rand.choice((0, 5, 125, 126, 200))))
+            parts = rand.randint(1, 3)
+            for index in range(parts):
+                part = payload[index * len(payload) // parts:(index + 1) * len(payload) // parts]
+                frames.append(clientFrame(OP_CONTINUATION if index else OP_TEXT, part, final=index == parts - 1))
+                if rand.random() < 0.3:
+                    frames.append(clientFrame(OP_PING, b'p'))
+            expected.append(payload.decode())
+        data = b''.join(frames)
+        connection, messages = session()
+        start = 0
+        for end in sorted(rand.sample(range(1, len(data)), min(len(data) - 1, rand.randint(1, 12)))) + [len(data)]:
+            connection.feed(data[start:end])
+            start = end
+        checks.check('segmented frames', (messages, connection.closed), (expected, False))
+
+
+def encoding(checks: checker):
+    for length, header in ((0, b'\x81\x00'), (125, b'\x81\x7d'), (126, b'\x81\x7e\x00\x7e'),
+                           (0xFFFF, b'\x81\x7e\xff\xff'), (0x10000, b'\x81\x7f\x00\x00\x00\x00\x00\x01\x00\x00')):
+        frame = encodeFrame(OP_TEXT, b'x' * length)
+        checks.check('server frame header of %d bytes' % length, (frame[:len(header)], len(frame) - len(header)),
+                     (header, length))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    checks = checker()
+    for scenario in (handshake, masking, lengths, fragmentation, control, closing, keepAlive, encoding):
+        scenario(checks)
+    segmentation(checks, count, random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0))
+    print('websocket: %d checks, %d failures' % (checks.count, checks.failures))
+    sys.exit(1 if checks.failures else 0)
@@ -1,29 +1,307 @@
-from machine import Pin, time_pulse_us
-from utime import sleep_us
+import _thread
+from array import array
+
+from hal import Pin, Timer, schedule, sleep_us, ticks_us, ticks_ms, ticks_diff
+
+CM_PER_US = 340 * 100 / 10 ** 6 / 2    # the sound moves the distance twice (back and forth)
+
+
+class rangeFilter:
+    def __init__(self, window: int = 5, alpha: float = 0.4, minCm: float = 2, maxCm: float = 400,
+                 nearCm: float = 16, farCm: float = 22, presenceMs: int = 100, absenceMs: int = 500):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class filters the echo durations of the ultrasonic to a stable distance and a presence state
+            timeout (no echo) => nothing in range, it's counted as maxCm
+            outliers          => the distances out of (minCm, maxCm) (ex: the negative time_pulse_us error codes or the
+                                 crossed echoes) are rejected
+            median            => of the last window samples (the burst), removes the single spikes
+            ema               => exponential moving average of the medians (alpha is the new median weight), it's the
+                                 reported distance
+        the presence is decided by the median (it follows a client arriving faster than the ema) using hysteresis
+        (present under nearCm, absent over farCm, between them the state is kept), and the new state must last
+        presenceMs (to become present) or absenceMs (to become absent) before it's accepted, so a bee or one bad burst
+        doesn't trigger the door
+        =--------------------------------------------------------------------------------------------------------------=
+        :param window: the number of samples the median is taken of
+        :param alpha: the ema weight of the new median (0 < alpha <= 1)
+        :param minCm: the min valid distance in cm
+        :param maxCm: the max valid distance in cm (the distance of a timeout)
+        :param nearCm: the distance in cm an object becomes present under
+        :param farCm: the distance in cm an object becomes absent over
+        :param presenceMs: the time in milli-seconds an object must be near before it's present
+        :param absenceMs: the time in milli-seconds an object must be far before it's absent
+        """
+        self.window = array('f', [maxCm] * window)   # used to save the last valid distances (ring)
+        self.position = 0
+        self.alpha = alpha
+        self.minCm = minCm
+        self.maxCm = maxCm
+        self.nearCm = nearCm
+        self.farCm = farCm
+        self.presenceMs = presenceMs
+        self.absenceMs = absenceMs
+        self.samples = 0        # the number of samples added
+        self.timeouts = 0       # the number of samples without echo
+        self.rejected = 0       # the number of outliers
+        self.reset()
+
+    def reset(self):
+        """
+        forgetting the filtered distance and the presence (nothing in range)
+        :return: None
+        """
+        for index in range(len(self.window)):
+            self.window[index] = self.maxCm
+        self.median = self.maxCm    # used to save the median of the window
+        self.distance = self.maxCm  # used to save the filtered distance (ema)
+        self.present = False        # used to save the presence state (after the hysteresis and the dwell times)
+        self.changingSince = None   # used to save the time the opposite state started (None => not changing)
+
+    def add(self, durationUs, now: int):
+        """
+        :param durationUs: the echo duration in micro-seconds (None for a timeout)
+        :param now: the sample time in milli-seconds
+        :return: True if the presence changed
+        """
+        self.samples += 1
+        if durationUs is None:
+            self.timeouts += 1
+            distance = self.maxCm
+        else:
+            distance = durationUs * CM_PER_US
+            if not self.minCm <= distance <= self.maxCm:
+                self.rejected += 1
+                return False
+        self.window[self.position] = distance
+        self.position = (self.position + 1) % len(self.window)
+        self.median = sorted(self.window)[len(self.window) // 2]
+        self.distance += self.alpha * (self.median - self.distance)
+        return self.dwell(now)
+
+    def dwell(self, now: int):
+        """
+        :param now: the current time in milli-seconds
+        :return: True if the presence changed (the opposite state lasted its dwell time)
+        """
+        if self.median < self.nearCm:
+            wanted = True
+        elif self.median > self.farCm:
+            wanted = False
+        else:
+            wanted = self.present
+        if wanted == self.present:
+            self.changingSince = None
+            return False
+        if self.changingSince is None:
+            self.changingSince = now
+        if ticks_diff(now, self.changingSince) < (self.presenceMs if wanted else self.absenceMs):
+            return False
+        self.present = wanted
+        self.changingSince = None
+        return True
 
 
 class ultraSonic:
-    def __init__(self, trig: int, echo: int):
+    def __init__(self, trig: int, echo: int, intervalMs: int = 30, timeoutUs: int = 25000, **filterOptions):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class is a non-blocking ranging engine of the ultrasonic (HC-SR04)
+        instead of waiting for the echo pulse (time_pulse_us), the echo pin interrupt saves the time of the rising edge
+        and the pulse duration at the falling edge, and update() (called by the loop) adds the finished echoes to the
+        filter (rangeFilter) and sends the next ping every intervalMs (the loop never waits for the echo)
+        a ping without echo after timeoutUs (~4 m) is added to the filter as a timeout
+        the end of the echo releases the echoed lock (set by pingScheduler, so its loop sleeps until the echo instead of
+        polling), the hard interrupt can't release it, so it schedules wake (a soft callback)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param trig: the trigger pin number
+        :param echo: the echo pin number
+        :param intervalMs: the time in milli-seconds between the pings (>= the longest echo, so echoes don't cross)
+        :param timeoutUs: the time in micro-seconds a ping waits for its echo
+        :param filterOptions: the rangeFilter options (window, alpha, nearCm, farCm, presenceMs, absenceMs, ...)
+        """
         self.trig = Pin(trig, Pin.OUT, value=0)
         self.echo = Pin(echo, Pin.IN, value=0)
+        self.intervalMs = intervalMs
+        self.timeoutUs = timeoutUs
+        self.filter = rangeFilter(**filterOptions)
+        self.pingedAt = ticks_us()  # used to save the time (us) of the last ping
+        self.waiting = False    # used to save if the last ping is waiting for its echo
+        self.riseAt = 0         # used to save the time (us) of the echo rising edge (saved by the interrupt)
+        self.echoUs = None      # used to save the echo duration (us) of the last ping (saved by the interrupt)
+        self.echoed = None      # used to save the lock released at the end of the echo (None => nobody waits for it)
+        self.wakeRef = self.wake    # the bound method is created once (the interrupt handler can't allocate)
+        # hard interrupt, so the edge times aren't delayed by the scheduler
+        self.echo.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self.echoEdge, hard=True)
+
+    def echoEdge(self, pin):
+        """
+        the echo pin interrupt handler, saving the rising edge time or the pulse duration (no allocation)
+        """
+        if pin.value():
+            self.riseAt = ticks_us()
+        else:
+            self.echoUs = ticks_diff(ticks_us(), self.riseAt)
+            if self.echoed:
+                try:
+                    schedule(self.wakeRef, None)
+                except RuntimeError:  # the schedule queue is full, the waiting loop is woken by its timer
+                    pass
+
+    def wake(self, argument):
+        """
+        releasing the echoed lock (called by the scheduled echo interrupt or the timer of pingScheduler)
+        """
+        try:
+            self.echoed.release()
+        except RuntimeError:  # the lock is already released
+            pass
+
+    def ping(self):
+        """
+        sending high pulse with width of 10 US to the trigger pin then setting it to low (the echo is not waited for)
+        :return: None
+        """
+        self.echoUs = None
+        self.waiting = True
+        self.pingedAt = ticks_us()
+        self.trig.value(0x01)
+        sleep_us(10)
+        self.trig.value(0x00)
+
+    def collect(self, now: int):
+        """
+        adding the echo of the last ping to the filter (or a timeout if it didn't come in timeoutUs)
+        :param now: the current time in micro-seconds
+        :return: True if the presence changed
+        """
+        if not self.waiting:
+            return False
+        if self.echoUs is not None:
+            self.waiting = False
+            return self.filter.add(self.echoUs, ticks_ms())
+        if ticks_diff(now, self.pingedAt) > self.timeoutUs:
+            self.waiting = False
+            return self.filter.add(None, ticks_ms())
+        return False
+
+    def due(self, now: int):
+        """
+        :param now: the current time in micro-seconds
+        :return: True if the sensor can be pinged (its echo is finished and intervalMs passed from its last ping)
+        """
+        return not self.waiting and ticks_diff(now, self.pingedAt) >= self.intervalMs * 1000
+
+    def update(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        adding the echo of the last ping to the filter (or a timeout if it didn't come in timeoutUs)
+        then sending the next ping if intervalMs passed from the last ping
+        (used for a single sensor, several sensors are updated by pingScheduler)
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: True if the presence changed
+        """
+        now = ticks_us()
+        changed = self.collect(now)
+        if self.due(now):
+            self.ping()
+        return changed
+
+    def present(self):
+        """
+        :return: True if an object is present in front of the sensor (filtered, with hysteresis and dwell times)
+        """
+        return self.filter.present
 
     def readDistance(self):
+        """
+        :return: the filtered distance between the sensor and the object in cm
+        """
+        return self.filter.distance
+
+
+class pingScheduler:
+    def __init__(self, sensors: list, guardUs: int = 2000, timerId: int = 0):
         """
         =--------------------------------------------------------------------------------------------------------------=
                                             *specifications and requirements*
-        this function reads the distance between the sensor and the object by using PWM reader (time_pulse_us)
-        sending high pulse with width of 10 US to the trigger pin then setting it to low
-        reading the duration of high pulse from echo (which equal to the time take by the sound to move the whole distance)
-        to get the distance between object and sensor:
-            1- divide the duration by 2 (as the duration is total time take back and forth)
-            2- distance = time * velocity => (340 cm * 100 / 10 ^ (6)) * duration / 2
-        time_pulse_us (measure the time taken by a pulse to change from state to another)
+        this class schedules the pings of several ultrasonic sensors (one sensor per door)
+        only one sensor is pinging at a time, so the echo of one sensor is never received by another (cross-talk),
+        the next sensor is pinged as soon as the echo of the current sensor is finished (or timed out) and the guard
+        time passed (the late reflections fade), so the total scan rate is limited only by the echoes durations
+        the sensors are pinged in turn (round robin), a sensor that was pinged less than its intervalMs ago is skipped
+        the loop sleeps in wait() on the echoed lock, released by the end of the echo of the active sensor or by the
+        one shot timer at the echo timeout (or the next ping time), the lock of micropython can't wait with a timeout
         =--------------------------------------------------------------------------------------------------------------=
+        :param sensors: list of the ultraSonic sensors
+        :param guardUs: the time in micro-seconds between the end of an echo and the next ping
+        :param timerId: the id of the timer bounding wait()
+        """
+        self.sensors = sensors
+        self.guardUs = guardUs
+        self.active = len(sensors) - 1  # used to save the index of the last pinged sensor
+        self.quietAt = ticks_us()       # used to save the time the last echo finished
+        self.pings = 0                  # the number of sent pings
+        self.wakeups = 0                # the number of the loop wakeups in wait()
+        self.echoed = _thread.allocate_lock()   # released by the end of an echo or by the timer to wake the loop
+        self.echoed.acquire()
+        self.timer = Timer(timerId)
+        for sensor in sensors:
+            sensor.echoed = self.echoed
+
+    def update(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        adding the echo of the active sensor to its filter once it's finished
+        then pinging the next due sensor if the guard time passed
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: the index of the sensor whose presence changed, or None
+        """
+        now = ticks_us()
+        sensor = self.sensors[self.active]
+        changed = None
+        if sensor.waiting:
+            if sensor.collect(now):
+                changed = self.active
+            if sensor.waiting:
+                return changed
+            self.quietAt = now
+        if ticks_diff(now, self.quietAt) < self.guardUs:
+            return changed
+        for step in range(1, len(self.sensors) + 1):
+            index = (self.active + step) % len(self.sensors)
+            if self.sensors[index].due(now):
+                self.active = index
+                self.pings += 1
+                self.sensors[index].ping()
+                break
+        return changed
+
+    def sleepMs(self):
+        """
+        :return: the time in milli-seconds the loop can sleep before the next update (the echo timeout of the active
+                 sensor while its echo is waited for, the end of the echo wakes the loop before it)
+        """
+        now = ticks_us()
+        sensor = self.sensors[self.active]
+        if sensor.waiting:
+            return (max(0, sensor.timeoutUs - ticks_diff(now, sensor.pingedAt)) + 999) // 1000 + 1
+        wait = max(self.guardUs - ticks_diff(now, self.quietAt),
+                   min(sensor.intervalMs * 1000 - ticks_diff(now, sensor.pingedAt) for sensor in self.sensors))
+        return (max(0, wait) + 999) // 1000
+
+    def wait(self):
+        """
+        blocking the loop until the echo of the active sensor ends or the next update is due (sleepMs)
         :return: None
         """
-        self.trig.value(0x01)
-        sleep_us(10)
-        self.trig.value(0x00)
-        duration = time_pulse_us(self.echo, 0x01)
-        distance = duration * (340 * 100 / 10 ** 6) / 2
-        return distance
+        delay = self.sleepMs()
+        if delay:
+            self.timer.init(mode=Timer.ONE_SHOT, period=delay, callback=self.sensors[self.active].wakeRef)
+            self.echoed.acquire()
+            self.timer.deinit()
+            self.wakeups += 1
@@ -0,0 +1,655 @@
+import sys
+import _thread
+
+from hal import uselect as select, usocket as socket, uerrno as errno, ticks_ms, ticks_us, ticks_diff, crc32
+from httpparser import requestParser, parseError
+
+# micropython poll returns the registered object itself, while CPython poll returns the file descriptor
+POLL_RETURNS_FD = sys.implementation.name != 'micropython'
+# errors raised by a non-blocking socket when there's nothing to read or no room to write
+WOULD_BLOCK = (errno.EAGAIN, getattr(errno, 'EWOULDBLOCK', errno.EAGAIN), getattr(errno, 'ETIMEDOUT', -1))
+EVENT_STREAM_HEADERS = b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n' \
+                       b'Connection: keep-alive\r\n\r\n'
+
+
+def pollKey(sock):
+    """
+    :param sock: the socket registered in the poller
+    :return: the key returned by poll() for this socket (file descriptor on CPython, the socket on micropython)
+    """
+    return sock.fileno() if POLL_RETURNS_FD else sock
+
+
+class clientConnection:
+    def __init__(self, sock, address, parser: requestParser):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class wraps one accepted client socket for the event loop
+        it has the same (send, sendall, close) interface of the socket so the request handlers don't know the
+        difference, but nothing is written directly to the socket:
+            send/sendall append the data to the output buffer which is flushed when the socket is writable
+            close marks the connection to be closed after the output buffer is fully flushed
+        =--------------------------------------------------------------------------------------------------------------=
+        :param sock: the accepted non-blocking client socket
+        :param address: the client address (ip, port)
+        :param parser: the request parser (with its fixed size read buffer) of this connection
+        """
+        self.sock = sock
+        self.address = address
+        self.parser = parser            # used to receive and parse the requests until a full request is received
+        self.outBuffer = bytearray()    # used to save the bytes waiting to be sent to the client
+        self.outQueue = []              # used to save the files (and the bytes after them) waiting to be streamed
+        self.closing = False            # set when the connection must be closed after flushing the output buffer
+        self.keepAlive = False          # set by the server if the connection may stay open after the current response
+        self.requests = 0               # used to save the number of requests received on this connection
+        self.headers = dict()           # used to save the headers of the current request (lower case names)
+        self.head = False               # set for a HEAD request, only the headers of its response are sent
+        self.headEnded = False          # set after the headers of the HEAD response are sent (the body is dropped)
+        self.connected = True           # set to False after the server drops the connection
+        self.stream = None              # the channel pushed to this connection as server sent events (if subscribed)
+        self.waiting = None             # (channel, respond) if the connection is waiting for a change (long poll)
+        self.websocket = None           # the websocket session (websocket.webSocket) if the connection is upgraded
+        self.lastActive = ticks_ms()    # used to drop the idle (or too slow) connections
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        data = data.encode('utf-8', 'ignore') if isinstance(data, str) else data
+        if self.head:  # the response of a HEAD request has the headers (with Content-Length) without the body
+            if self.headEnded:
+                return
+            end = data.find(b'\r\n\r\n')
+            if end >= 0:
+                data = data[:end + 4]
+                self.headEnded = True
+        if not self.outQueue:
+            self.outBuffer.extend(data)
+        elif isinstance(self.outQueue[-1], bytearray):  # keeping the order after the streamed files
+            self.outQueue[-1].extend(data)
+        else:
+            self.outQueue.append(bytearray(data))
+
+    def sendfile(self, path: str):
+        """
+        queuing the file to be streamed from flash in chunks (after the data already sent), so the file is never
+        loaded fully in ram
+        :param path: the file path
+        :return: None
+        """
+        self.sendstream(open(path, 'rb'))
+
+    def sendstream(self, stream):
+        """
+        queuing the stream to be sent in chunks (after the data already sent), read only when the buffer is empty
+        :param stream: any object with read(size) (returning b'' at the end) and close()
+        :return: None
+        """
+        if self.head and self.headEnded:  # the body of a HEAD response isn't sent
+            stream.close()
+            return
+        self.outQueue.append(stream)
+
+    def fillBuffer(self, chunkSize: int = 512):
+        """
+        moving the next queued data to the output buffer until it has chunkSize bytes (reading the next chunks of the
+        streamed file), so the headers and the first chunk of a file are sent in one segment (a small second segment
+        waits for the client's delayed ack, nagle's algorithm)
+        :param chunkSize: the max number of bytes read from the file at once
+        :return: None
+        """
+        while self.outQueue and len(self.outBuffer) < chunkSize:
+            item = self.outQueue[0]
+            if isinstance(item, bytearray):
+                if self.outBuffer:
+                    self.outBuffer.extend(item)
+                else:
+                    self.outBuffer = item
+                self.outQueue.pop(0)
+                continue
+            chunk = item.read(chunkSize)
+            if chunk:
+                self.outBuffer.extend(chunk)
+            else:
+                item.close()
+                self.outQueue.pop(0)
+
+    def pending(self):
+        return bool(self.outBuffer or self.outQueue)
+
+    def close(self):
+        self.closing = True
+
+
+class chunkedStream:
+    def __init__(self, stream):
+        """
+        wrapping the stream in http chunked transfer encoding (for responses with unknown length)
+        every read chunk is sent as (hex length, data) and the end as the zero length chunk
+        :param stream: any object with read(size) (returning b'' at the end) and close()
+        """
+        self.stream = stream
+        self.ended = False
+
+    def read(self, size: int = 512):
+        if self.ended:
+            return b''
+        chunk = self.stream.read(size)
+        if not chunk:
+            self.ended = True
+            return b'0\r\n\r\n'
+        return ('%x\r\n' % len(chunk)).encode() + chunk + b'\r\n'
+
+    def close(self):
+        self.stream.close()
+
+
+class webServer:
+    def __init__(self, address, handler, backlog: int = 5, idleTimeout: int = 10000, bufferSize: int = 2048,
+                 maxBodySize: int = 512, maxRequests: int = 100, longPollTimeout: int = 20000, wakePort: int = 0,
+                 metrics=None):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class is an event driven http server using poll (select.poll on CPython, uselect.poll on micropython)
+        all the sockets are non-blocking, so one slow client (or a half sent request) doesn't stall other clients
+        every connection has its own fixed size read buffer (httpparser.requestParser), the request is passed to the
+        handler only if it's received fully (headers ended with an empty line + the body of length Content-Length)
+        every connection has its own write buffer, the buffer is sent in parts whenever the socket is writable
+        connections are persistent (HTTP/1.1 keep-alive) and pipelined requests are handled in order
+        the server pushes the published values of channels to the subscribed connections:
+            server sent events: the connection receives (data: value) every time the channel value changes
+            long poll: the connection is answered only when the channel value differs from the client's last value
+            websocket: the session of the upgraded connection pushes the value (websocket.webSocket.push)
+        the received bytes of an upgraded (websocket) connection are passed to its session as frames, not requests
+        publish can be called from other threads, it wakes the poller by sending one byte to a loopback udp socket
+        (so the server doesn't busy wait for changes)
+        if a metrics registry is passed then the time of receiving, parsing, handling (rendering) and sending is
+        measured (histograms) with the accepted connections, requests, errors and bytes (counters)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param address: the (host, port) the server will be bound to
+        :param handler: function(connection, request) called for every full request (httpparser.httpRequest)
+        :param backlog: the max number of connections waiting in queue before rejection
+        :param idleTimeout: the time in ms before dropping a connection that didn't send or receive anything
+        :param bufferSize: the read buffer size of every connection (the max size of request headers + body)
+        :param maxBodySize: the max size of request body in bytes
+        :param maxRequests: the max number of requests handled on one persistent connection before closing it
+        :param longPollTimeout: the max time in ms a long poll request waits before it's answered with the same value
+        :param wakePort: the loopback udp port used to wake the poller (0 => any free port)
+        :param metrics: the metrics registry (metrics.metricsRegistry) updated by the server thread (None => no metrics)
+        """
+        self.handler = handler
+        self.idleTimeout = idleTimeout
+        self.bufferSize = bufferSize
+        self.maxBodySize = maxBodySize
+        self.maxRequests = maxRequests
+        self.longPollTimeout = longPollTimeout
+        self.connections = dict()   # used to save the open connections by their poll key
+        self.channels = dict()      # used to save the last published value of every channel
+        self.changed = set()        # used to save the channels published since the last push
+        self.lock = _thread.allocate_lock()  # used to guard (channels, changed) as publish is called by other threads
+        self.wakePending = False    # set when a wake byte is sent and not received yet
+        self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.serverSocket.bind(socket.getaddrinfo(address[0] or '0.0.0.0', address[1])[0][-1])
+        self.serverSocket.listen(backlog)
+        self.serverSocket.setblocking(False)
+        self.serverKey = pollKey(self.serverSocket)
+        self.poller = select.poll()
+        self.poller.register(self.serverSocket, select.POLLIN)
+        self.wakeSocket, self.wakeAddress = createWakeSocket(wakePort)
+        self.wakeKey = None
+        if self.wakeSocket:
+            self.wakeKey = pollKey(self.wakeSocket)
+            self.poller.register(self.wakeSocket, select.POLLIN)
+        self.metrics = metrics
+        if metrics:
+            self.acceptedMetric = metrics.counter('http_connections_total', 'the accepted connections')
+            self.requestsMetric = metrics.counter('http_requests_total', 'the handled requests')
+            self.parseErrorsMetric = metrics.counter('http_parse_errors_total', 'the rejected bad or big requests')
+            self.handlerErrorsMetric = metrics.counter('http_handler_errors_total', 'the requests whose handler raised')
+            self.receivedMetric = metrics.counter('http_received_bytes_total', 'the received bytes')
+            self.sentMetric = metrics.counter('http_sent_bytes_total', 'the sent bytes')
+            self.recvMetric = metrics.histogram('http_recv_seconds', 'the time of one socket receive')
+            self.parseMetric = metrics.histogram('http_parse_seconds', 'the time of parsing one request')
+            self.handlerMetric = metrics.histogram('http_handler_seconds', 'the time of handling one request')
+            self.sendMetric = metrics.histogram('http_send_seconds', 'the time of one socket send (with the file read)')
+            metrics.gauge('http_connections', 'the open connections', lambda: len(self.connections))
+
+    def serveForever(self, timeout: int = 1000):
+        """
+        :param timeout: the max time in ms of waiting for an event before checking the idle connections
+        :return: None
+        """
+        if not self.wakeSocket:  # publish can't wake the poller, so checking the published changes every 50 ms
+            timeout = min(timeout, 50)
+        while True:
+            self.serveOnce(timeout)
+
+    def serveOnce(self, timeout: int = 0):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function waits for (socket events or timeout) then handles them one by one
+            server socket is readable => accepting all the waiting connections
+            client socket is readable => reading the available data and handling the full requests
+            client socket is writable => sending as much as possible from the output buffer
+            client socket hang up or error => dropping the connection
+            wake socket is readable => reading the wake bytes (the published changes are pushed next)
+        then pushing the published changes to the subscribed connections
+        then dropping the idle connections (and answering the timed out long poll requests)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param timeout: the max time in ms of waiting for an event
+        :return: None
+        """
+        for key, event in self.poller.poll(timeout):
+            if key == self.serverKey:
+                self.acceptConnections()
+                continue
+            if key == self.wakeKey:
+                self.readWakeSocket()
+                continue
+            connection = self.connections.get(key)
+            if connection is None:
+                continue
+            if event & (select.POLLHUP | select.POLLERR):
+                self.dropConnection(connection)
+                continue
+            if event & select.POLLIN:
+                self.readConnection(connection)
+            if event & select.POLLOUT:
+                self.writeConnection(connection)
+        self.pushChanges()
+        self.dropIdleConnections()
+
+    def acceptConnections(self):
+        while True:
+            try:
+                sock, address = self.serverSocket.accept()
+            except OSError as e:
+                if e.args[0] not in WOULD_BLOCK:
+                    raise
+                return
+            sock.setblocking(False)
+            self.metrics.count(self.acceptedMetric) if self.metrics else None
+            connection = clientConnection(sock, address, requestParser(self.bufferSize, self.maxBodySize))
+            self.connections[pollKey(sock)] = connection
+            self.poller.register(sock, select.POLLIN)
+
+    def readConnection(self, connection):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        receiving the available data from the client socket directly into the free part of the parser buffer
+        if the client closed the connection (0 bytes received) then the connection is dropped
+        then handling the full requests found in the parser buffer
+        =--------------------------------------------------------------------------------------------------------------=
+        :param connection: the client connection
+        :return: None
+        """
+        metrics = self.metrics
+        started = ticks_us() if metrics else 0
+        try:
+            received = receiveInto(connection.sock, connection.parser.free())
+        except OSError as e:
+            if e.args[0] not in WOULD_BLOCK:
+                self.dropConnection(connection)
+            return
+        if metrics and received:
+            metrics.observe(self.recvMetric, ticks_diff(ticks_us(), started))
+            metrics.count(self.receivedMetric, received)
+        if received is None:  # micropython readinto returns None if nothing is available
+            return
+        if not received:
+            self.dropConnection(connection)
+            return
+        connection.lastActive = ticks_ms()
+        if connection.closing:  # the response is already being sent, ignoring any extra data
+            connection.parser.reset()
+            return
+        connection.parser.received(received)
+        self.handleRequests(connection)
+        self.updateInterest(connection)
+
+    def handleRequests(self, connection):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        handling all the full requests found in the parser buffer (pipelined requests are handled in order, and their
+        responses are appended in the same order to the output buffer)
+        every full request is removed from the parser buffer and passed to the handler (httpparser.httpRequest)
+        a request that can't be parsed or is bigger than the limits is answered with its error status then the
+        connection is closed
+        deciding if the connection will be kept alive after the response:
+            HTTP/1.1 is persistent unless the client sent (Connection: close)
+            HTTP/1.0 is closed unless the client sent (Connection: keep-alive)
+            the connection is closed after (maxRequests) requests
+        the response of a HEAD request is sent without its body (clientConnection.head), so the pipelined responses
+        after it stay in sync
+        =--------------------------------------------------------------------------------------------------------------=
+        :param connection: the client connection
+        :return: None
+        """
+        if connection.websocket is not None:  # the upgraded connection receives websocket frames
+            connection.websocket.received(connection)
+            return
+        metrics = self.metrics
+        while not connection.closing and connection.stream is None and connection.waiting is None and \
+                connection.websocket is None:
+            started = ticks_us() if metrics else 0
+            try:
+                request = connection.parser.parse()
+            except parseError as e:
+                metrics.count(self.parseErrorsMetric) if metrics else None
+                connection.sendall('HTTP/1.1 %s %s\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+                                   % (e.statusCode, e.statusMsg))
+                connection.close()
+                return
+            if request is None:
+                return
+            if metrics:
+                metrics.observe(self.parseMetric, ticks_diff(ticks_us(), started))
+                metrics.count(self.requestsMetric)
+                started = ticks_us()
+
+            connection.requests += 1
+            connection.headers = request.headers
+            connection.head = request.method == 'HEAD'
+            connection.headEnded = False
+            connectionHeader = request.headers.get('connection', '').lower()
+            if request.version == 'HTTP/1.0':
+                connection.keepAlive = connectionHeader == 'keep-alive'
+            else:
+                connection.keepAlive = connectionHeader != 'close'
+            connection.keepAlive = connection.keepAlive and connection.requests < self.maxRequests
+            try:
+                self.handler(connection, request)
+            except Exception:
+                metrics.count(self.handlerErrorsMetric) if metrics else None
+                connection.close()
+            metrics.observe(self.handlerMetric, ticks_diff(ticks_us(), started)) if metrics else None
+
+    def writeConnection(self, connection):
+        """
+        sending as much as possible from the output buffer (the socket may accept only part of it)
+        then closing the connection if it was marked to be closed and the whole buffer was sent
+        :param connection: the client connection
+        :return: None
+        """
+        metrics = self.metrics
+        started = ticks_us() if metrics else 0
+        connection.fillBuffer()
+        if connection.outBuffer:
+            try:
+                sent = connection.sock.send(connection.outBuffer)
+            except OSError as e:
+                if e.args[0] not in WOULD_BLOCK:
+                    self.dropConnection(connection)
+                return
+            del connection.outBuffer[:sent]
+            if metrics:
+                metrics.observe(self.sendMetric, ticks_diff(ticks_us(), started))
+                metrics.count(self.sentMetric, sent)
+            connection.lastActive = ticks_ms()
+        self.updateInterest(connection)
+
+    def updateInterest(self, connection):
+        """
+        asking the poller to report the socket as writable only when there is data waiting to be sent
+        :param connection: the client connection
+        :return: None
+        """
+        if not connection.connected:
+            return
+        # not reading when the read buffer is full (the connection is waiting with a pipelined request in the buffer)
+        events = select.POLLIN if len(connection.parser.free()) else 0
+        if connection.pending():
+            self.poller.modify(connection.sock, events | select.POLLOUT)
+        elif connection.closing:
+            self.dropConnection(connection)
+        else:
+            self.poller.modify(connection.sock, events)
+
+    def dropIdleConnections(self):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        checking the time since every connection sent or received anything
+            long poll connections => answered with the current value after longPollTimeout
+            event stream connections => sending a comment after idleTimeout (to detect the disconnected clients)
+            websocket connections => sending a ping frame after idleTimeout
+            other connections => dropped after idleTimeout
+        =--------------------------------------------------------------------------------------------------------------=
+        :return: None
+        """
+        now = ticks_ms()
+        for connection in list(self.connections.values()):
+            idle = ticks_diff(now, connection.lastActive)
+            if connection.waiting is not None:
+                if idle > self.longPollTimeout:
+                    self.answerWaiting(connection, self.channels.get(connection.waiting[0], ''))
+            elif connection.stream is not None or connection.websocket is not None:
+                if idle > self.idleTimeout:
+                    if connection.websocket is not None:
+                        connection.websocket.ping(connection)
+                    else:
+                        connection.sendall(b': ping\n\n')
+                    connection.lastActive = now
+                    self.updateInterest(connection)
+            elif idle > self.idleTimeout:
+                self.dropConnection(connection)
+
+    def publish(self, channel: str, value: str):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function saves the new value of the channel to be pushed to the subscribed connections
+        it can be called from any thread, nothing is sent if the value didn't change
+        only one wake byte is sent until the server handles it (no matter how many channels changed)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param channel: the channel name
+        :param value: the new value of the channel
+        :return: None
+        """
+        with self.lock:
+            if self.channels.get(channel) == value:
+                return
+            self.channels[channel] = value
+            self.changed.add(channel)
+            wake = not self.wakePending
+            self.wakePending = True
+        if wake and self.wakeSocket:
+            try:
+                self.wakeSocket.sendto(b'\x00', self.wakeAddress)
+            except OSError:
+                pass
+
+    def subscribe(self, connection, channel: str):
+        """
+        sending the event stream headers and the current value of the channel to the connection
+        then every new value of the channel is sent to it as server sent event (data: value)
+        an upgraded (websocket) connection gets no headers, the values are pushed by its session
+        :param connection: the client connection
+        :param channel: the channel name
+        :return: None
+        """
+        if connection.head:  # the event stream has no length, so the headers of a HEAD response end the connection
+            connection.sendall(EVENT_STREAM_HEADERS)
+            connection.close()
+            return
+        connection.stream = channel
+        value = self.channels.get(channel)
+        if connection.websocket is not None:
+            if value is not None:
+                connection.websocket.push(connection, value)
+            return
+        connection.sendall(EVENT_STREAM_HEADERS)
+        if value is not None:
+            connection.sendall('data: %s\n\n' % value)
+
+    def waitChange(self, connection, channel: str, lastValue: str, respond):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this function answers the long poll request
+            if the current value of the channel differs from the client's last value => answering it now
+            else => the connection waits until the value changes or longPollTimeout passes
+        =--------------------------------------------------------------------------------------------------------------=
+        :param connection: the client connection
+        :param channel: the channel name
+        :param lastValue: the last value the client has
+        :param respond: function(connection, value) used to send the response
+        :return: None
+        """
+        value = self.channels.get(channel)
+        if connection.head:  # a HEAD request isn't held, it's answered with the headers of the current value
+            respond(connection, lastValue if value is None else value)
+            return
+        if value is not None and value != lastValue:
+            respond(connection, value)
+            return
+        connection.waiting = (channel, respond)
+        connection.lastActive = ticks_ms()
+
+    def answerWaiting(self, connection, value):
+        respond = connection.waiting[1]
+        connection.waiting = None
+        connection.lastActive = ticks_ms()
+        try:
+            respond(connection, value)
+        except Exception:
+            connection.close()
+        self.handleRequests(connection)  # handling the requests received while waiting
+        self.updateInterest(connection)
+
+    def pushChanges(self):
+        """
+        sending the new values of the changed channels to their event stream and long poll connections
+        :return: None
+        """
+        with self.lock:
+            if not self.changed:
+                return
+            changed = self.changed
+            self.changed = set()
+        for connection in list(self.connections.values()):
+            if connection.stream in changed:
+                if connection.websocket is not None:
+                    connection.websocket.push(connection, self.channels[connection.stream])
+                else:
+                    connection.sendall('data: %s\n\n' % self.channels[connection.stream])
+                self.updateInterest(connection)
+            elif connection.waiting is not None and connection.waiting[0] in changed:
+                self.answerWaiting(connection, self.channels[connection.waiting[0]])
+
+    def readWakeSocket(self):
+        with self.lock:
+            self.wakePending = False
+        try:
+            while self.wakeSocket.recv(16):
+                pass
+        except OSError:
+            pass
+
+    def dropConnection(self, connection):
+        key = pollKey(connection.sock)
+        if self.connections.pop(key, None) is None:
+            return
+        connection.connected = False
+        for item in connection.outQueue:
+            if not isinstance(item, bytearray):
+                item.close()
+        connection.outQueue = []
+        try:
+            self.poller.unregister(connection.sock)
+        except (OSError, KeyError, ValueError):
+            pass
+        connection.sock.close()
+
+
+def prebuildResponse(path: str, contentType: str, cacheControl: str = 'no-cache', contentEncoding: str = None):
+    """
+    =------------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+    this function builds the response headers of a static file once (at startup) to be sent with one sendall,
+    then the file itself is streamed from flash (connection.sendfile), so the file is never loaded fully in ram
+    the file is read once in chunks to know its length and its etag
+    the etag is a strong validator (crc32 of the file bytes), so the client sends it back in (If-None-Match)
+    the (304 not modified) response is prebuilt too, it has the same etag and cache control without body
+    no connection header is sent, HTTP/1.1 connections are persistent by default and the server closes the other
+    connections after sending the response
+    =------------------------------------------------------------------------------------------------------------------=
+    :param path: the file path
+    :param contentType: the http content type of the file
+    :param cacheControl: the http cache control of the file (no-cache => the client must revalidate it)
+    :param contentEncoding: the http content encoding of the file (gzip for the precompressed files)
+    :return: (etag, headers, notModified, path)
+    """
+    length, crc = 0, 0
+    with open(path, 'rb') as reader:
+        chunk = reader.read(512)
+        while chunk:
+            length += len(chunk)
+            crc = crc32(chunk, crc)
+            chunk = reader.read(512)
+    etag = '"%08x"' % (crc & 0xFFFFFFFF)
+    headers = 'ETag: %s\r\nCache-Control: %s\r\nVary: Accept-Encoding\r\n' % (etag, cacheControl)
+    response = ('HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %s\r\n%s%s\r\n'
+                % (contentType, length, 'Content-Encoding: %s\r\n' % contentEncoding if contentEncoding else '',
+                   headers)).encode()
+    notModified = ('HTTP/1.1 304 Not Modified\r\n%s\r\n' % headers).encode()
+    return etag, response, notModified, path
+
+
+def fileExists(path: str):
+    try:
+        open(path, 'rb').close()
+        return True
+    except OSError:
+        return False
+
+
+def createWakeSocket(port: int):
+    """
+    creating the non-blocking loopback udp socket used by other threads to wake the poller
+    :param port: the udp port (0 => any free port, needs getsockname to know the chosen port)
+    :return: (socket, address) or (None, None) if the socket can't be created
+    """
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        address = socket.getaddrinfo('127.0.0.1', port)[0][-1]
+        sock.bind(address)
+        if hasattr(sock, 'getsockname'):
+            address = sock.getsockname()
+        elif not port:
+            sock.close()
+            return None, None
+        sock.setblocking(False)
+        return sock, address
+    except OSError:
+        return None, None
+
+
+def receiveInto(sock, view):
+    """
+    :param sock: the non-blocking client socket
+    :param view: memoryview of the free part of the read buffer
+    :return: the number of received bytes (0 => the connection is closed, None => nothing available)
+    """
+    return sock.recv_into(view) if POLL_RETURNS_FD else sock.readinto(view)
+
+
+if __name__ == '__main__':  # running a loopback server on CPython to measure the throughput on a development machine
+    def echoPath(connection, request):
+        body = request.path.encode()
+        connection.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n'
+                           b'Connection: %s\r\n\r\n' % (len(body), b'keep-alive' if connection.keepAlive else b'close'))
+        connection.sendall(body)
+        if not connection.keepAlive:
+            connection.close()
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    print('serving on 127.0.0.1:%s' % port)
+    webServer(('127.0.0.1', port), echoPath).serveForever()
@@ -0,0 +1,214 @@
+from hal import sha1, b2a_base64
+
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'  # the magic string of the handshake (RFC 6455)
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+CLOSE_NORMAL, CLOSE_PROTOCOL_ERROR, CLOSE_POLICY, CLOSE_TOO_BIG = 1000, 1002, 1008, 1009
+
+
+def acceptKey(key: str):
+    """
+    :param key: the Sec-WebSocket-Key header sent by the client
+    :return: the Sec-WebSocket-Accept header value (base64 of the sha1 of the key + GUID)
+    """
+    return b2a_base64(sha1(key.encode() + GUID).digest()).strip().decode()
+
+
+def encodeFrame(opcode: int, payload: bytes = b''):
+    """
+    the server frames are never masked and never fragmented
+    :param opcode: the frame opcode (OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG)
+    :param payload: the frame payload
+    :return: the frame bytes
+    """
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 0x10000:
+        header = bytes((0x80 | opcode, 126, length >> 8, length & 0xFF))
+    else:
+        header = bytes((0x80 | opcode, 127, 0, 0, 0, 0, length >> 24, (length >> 16) & 0xFF, (length >> 8) & 0xFF,
+                        length & 0xFF))
+    return header + payload
+
+
+class webSocket:
+    def __init__(self, onMessage, onPush=None, maxMessage: int = 256):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        this class is the websocket session of one connection of the web server (webserver.clientConnection)
+        accept answers the upgrade request (the handshake) and attaches the session to the connection, then the
+        server passes the received bytes to the session instead of parsing them as http requests
+        the frames are parsed in the connection's read buffer (requestParser buffer, so no new buffer is allocated):
+            the client frames must be masked, the payload is unmasked to a new bytearray
+            fragmented messages are joined (up to maxMessage bytes)
+            ping => answered with pong, close => answered with close then the connection is closed
+            a control frame (close, ping, pong) must be final with a payload <= 125 bytes (RFC 6455 section 5.5),
+            else the connection is closed with 1002 (protocol error)
+            text, binary messages => onMessage(connection, session, message)
+        a frame or message bigger than the buffer (or maxMessage) closes the connection with 1009 (too big)
+        the server pushes the channel values the connection is subscribed to (webServer.subscribe) to push, which
+        calls onPush (or sends the value as a text message)
+        =--------------------------------------------------------------------------------------------------------------=
+        :param onMessage: function(connection, session, message) called for every text (str) or binary (bytes) message
+        :param onPush: function(connection, session, value) called for every pushed channel value (None => send it)
+        :param maxMessage: the max size in bytes of a received message
+        """
+        self.onMessage = onMessage
+        self.onPush = onPush
+        self.maxMessage = maxMessage
+        self.fragments = None   # used to save (opcode, bytearray) of the fragmented message being received
+        self.last = None        # used to save the last pushed value (the app can send only the changes from it)
+        self.closed = False     # set after the close frame is sent
+
+    def accept(self, connection, request):
+        """
+        =--------------------------------------------------------------------------------------------------------------=
+                                            *specifications and requirements*
+        answering the upgrade request with (101 switching protocols) and attaching the session to the connection
+        the request must be GET with (Upgrade: websocket), (Sec-WebSocket-Version: 13) and a Sec-WebSocket-Key,
+        else it's answered with (400 bad request) (with the supported version) and the connection is closed
+        =--------------------------------------------------------------------------------------------------------------=
+        :param connection: the client connection
+        :param request: the parsed upgrade request (httpparser.httpRequest)
+        :return: True if the connection is upgraded
+        """
+        headers = request.headers
+        key = headers.get('sec-websocket-key')
+        if request.method != 'GET' or headers.get('upgrade', '').lower() != 'websocket' or not key or \
+                headers.get('sec-websocket-version') != '13':
+            connection.sendall('HTTP/1.1 400 Bad Request\r\nSec-WebSocket-Version: 13\r\nContent-Length: 0\r\n'
+                               'Connection: close\r\n\r\n')
+            connection.close()
+            return False
+        connection.sendall('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                           'Sec-WebSocket-Accept: %s\r\n\r\n' % acceptKey(key))
+        connection.websocket = self
+        connection.keepAlive = True
+        return True
+
+    def send(self, connection, message):
+        """
+        nothing is sent after the session or the connection is closed
+        :param connection: the client connection
+        :param message: str => sent as a text message, bytes => sent as a binary message
+        :return: None
+        """
+        if self.closed or connection.closing or not connection.connected:
+            return
+        if isinstance(message, str):
+            connection.sendall(encodeFrame(OP_TEXT, message.encode()))
+        else:
+            connection.sendall(encodeFrame(OP_BINARY, message))
+
+    def push(self, connection, value):
+        if self.onPush:
+            self.onPush(connection, self, value)
+        else:
+            self.send(connection, value)
+
+    def ping(self, connection):
+        """
+        sending a ping frame (the keep alive of an idle session), nothing is sent after the session or the connection
+        is closed
+        :param connection: the client connection
+        :return: None
+        """
+        if self.closed or connection.closing or not connection.connected:
+            return
+        connection.sendall(encodeFrame(OP_PING))
+
+    def close(self, connection, code: int = CLOSE_NORMAL):
+        """
+        sending the close frame (once) then closing the connection after the output buffer is sent
+        :param connection: the client connection
+        :param code: the close status code
+        :return: None
+        """
+        if not self.closed:
+            connection.sendall(encodeFrame(OP_CLOSE, bytes((code >> 8, code & 0xFF))))
+            self.closed = True
+        connection.close()
+
+    def received(self, connection):
+        """
+        handling all the full frames in the connection's read buffer (the incomplete frame stays in the buffer)
+        :param connection: the client connection
+        :return: None
+        """
+        parser = connection.parser
+        while not self.closed:
+            frame = self.frame(parser.buffer, parser.filled)
+            if frame is None:
+                if parser.filled == len(parser.buffer):  # the frame can't fit the buffer
+                    self.close(connection, CLOSE_TOO_BIG)
+                return
+            if frame == CLOSE_PROTOCOL_ERROR or frame == CLOSE_TOO_BIG:
+                self.close(connection, frame)
+                return
+            end, final, opcode, payload = frame
+            parser.consume(end)
+            self.handleFrame(connection, final, opcode, payload)
+
+    def frame(self, buffer, filled: int):
+        """
+        :param buffer: the read buffer
+        :param filled: the number of received bytes in the buffer
+        :return: (frame end, final, opcode, unmasked payload), None if the frame is incomplete,
+                 CLOSE_PROTOCOL_ERROR if the frame isn't masked (or it's a fragmented or too long control frame),
+                 CLOSE_TOO_BIG if it can't fit the buffer
+        """
+        if filled < 2:
+            return None
+        final, opcode, masked, length = buffer[0] & 0x80, buffer[0] & 0x0F, buffer[1] & 0x80, buffer[1] & 0x7F
+        if not masked or buffer[0] & 0x70 or opcode & 0x08 and (not final or length > 125):
+            return CLOSE_PROTOCOL_ERROR
+        start = 2
+        if length == 126:
+            if filled < 4:
+                return None
+            length, start = (buffer[2] << 8) | buffer[3], 4
+        elif length == 127:
+            return CLOSE_TOO_BIG
+        end = start + 4 + length
+        if end > len(buffer):
+            return CLOSE_TOO_BIG
+        if filled < end:
+            return None
+        mask = buffer[start:start + 4]
+        payload = bytearray(buffer[start + 4:end])
+        for index in range(length):
+            payload[index] ^= mask[index & 3]
+        return end, final, opcode, payload
+
+    def handleFrame(self, connection, final: int, opcode: int, payload: bytearray):
+        if opcode == OP_PING:
+            connection.sendall(encodeFrame(OP_PONG, payload))
+            return
+        if opcode == OP_PONG:
+            return
+        if opcode == OP_CLOSE:
+            code = (payload[0] << 8) | payload[1] if len(payload) >= 2 else CLOSE_NORMAL
+            self.close(connection, code)
+            return
+        if opcode == OP_CONTINUATION:
+            if self.fragments is None:
+                self.close(connection, CLOSE_PROTOCOL_ERROR)
+                return
+            self.fragments[1].extend(payload)
+            opcode, payload = self.fragments
+        elif opcode in (OP_TEXT, OP_BINARY):
+            if self.fragments is not None:
+                self.close(connection, CLOSE_PROTOCOL_ERROR)
+                return
+        else:
+            self.close(connection, CLOSE_PROTOCOL_ERROR)
+            return
+        if len(payload) > self.maxMessage:
+            self.close(connection, CLOSE_TOO_BIG)
+            return
+        if not final:
+            self.fragments = (opcode, payload)
+            return
+        self.fragments = None
+        self.onMessage(connection, self, payload.decode('utf-8', 'ignore') if opcode == OP_TEXT else bytes(payload))